@@ -0,0 +1,110 @@
+"""Benchmark parsing download links out of game pages
+
+Builds pages with lots of releases, in the same layout as the pages
+in tests/data, and times get_dl_dict on each HTML parser backend.
+With the package installed, run with
+
+    python benchmarks/bench_dl_dict.py
+"""
+
+import argparse
+import os
+import time
+
+import nxbrew_dl
+from nxbrew_dl.util import load_yml, parse_html, get_dl_dict
+from nxbrew_dl.util.html_tools import HTML_PARSERS
+
+REGIONS = [
+    "USA [En,Fr-CA,Es-XL]",
+    "Europe [En,Fr,De,It,Es]",
+    "Japan",
+    "Asia [Zh-Hant, Ko]",
+]
+
+
+def get_page(n_releases, n_parts=3):
+    """Build a game page with a number of releases
+
+    Args:
+        n_releases (int): Number of releases
+        n_parts (int): Number of links per download site. Defaults to 3
+    """
+
+    paragraphs = [
+        "<p><strong>Language:</strong> English, Japanese</p>",
+        "<p><strong>Download Links</strong></p>",
+    ]
+
+    for i in range(n_releases):
+        paragraphs.append(f"<p><strong>{REGIONS[i % len(REGIONS)]}</strong></p>")
+
+        # Links split out after the site name
+        paragraphs.append(f"<p>Base Game NSP {i} (Size: 5 GB)</p>")
+        for site in ["1Fichier", "DataNodes", "GoFile"]:
+            links = " | ".join(
+                [
+                    f'<a href="https://{site.lower()}.test/{i}-{j}">Part {j}</a>'
+                    for j in range(n_parts)
+                ]
+            )
+            paragraphs.append(f"<p>{site}: {links}</p>")
+
+        # Links named after the site
+        paragraphs.append(f"<p>Update v1.{i}.0 (Size: 800 MB)</p>")
+        paragraphs.append(
+            f'<p>Download: <a href="https://1fichier.test/u{i}">1Fichier</a> | '
+            f'<a href="https://freedl.test/u{i}">FreeDL</a></p>'
+        )
+
+    paragraphs.append("<p>Screenshots</p>")
+
+    page = (
+        '<html><head><meta property="og:image" content="https://nxbrew.test/t.jpg">'
+        f'</head><body><div class="entry-content">{"".join(paragraphs)}</div>'
+        "</body></html>"
+    )
+
+    return page.encode("utf-8")
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=20, help="Number of pages")
+    parser.add_argument(
+        "--releases", type=int, default=40, help="Number of releases per page"
+    )
+    args = parser.parse_args()
+
+    general_config = load_yml(
+        os.path.join(os.path.dirname(nxbrew_dl.__file__), "configs", "general.yml")
+    )
+    dl_kwargs = {
+        "dl_sites": general_config["dl_sites"],
+        "dl_mappings": general_config["dl_mappings"],
+        "regions": general_config["regions"],
+        "languages": general_config["languages"],
+        "regionless_titles": general_config["regionless_titles"],
+        "implied_languages": general_config["implied_languages"],
+    }
+
+    pages = [get_page(args.releases) for _ in range(args.pages)]
+
+    print(f"{args.pages} pages, {args.releases} releases each")
+
+    for html_parser in HTML_PARSERS:
+        soups = [parse_html(page, parser=html_parser) for page in pages]
+
+        start_time = time.perf_counter()
+        for soup in soups:
+            dl_dict = get_dl_dict(soup, **dl_kwargs)
+        elapsed_time = time.perf_counter() - start_time
+
+        assert len(dl_dict) == args.releases
+
+        print(f"  {html_parser:<12} {elapsed_time:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Benchmark the language and region matchers against the original loops
+
+The original code ran one re.match per language (or one substring
+check per region) for every string. The matchers do a single regex
+match, and memoize the results. With the package installed, run with
+
+    python benchmarks/bench_matchers.py
+"""
+
+import argparse
+import os
+import random
+import re
+import time
+
+import nxbrew_dl
+from nxbrew_dl.util import load_yml
+from nxbrew_dl.util.regex_tools import LanguageMatcher, RegionMatcher
+
+LANGUAGE_STRINGS = [
+    "English, Japanese",
+    "En,Fr-CA,Es-XL",
+    "En,Fr,De,It,Es",
+    "Zh-Hant, Ko",
+    "English, French, German, Italian, Spanish, Japanese, Chinese, Korean",
+    "En-GB, Fr-FR, Es-ES, Pt-BR, Pt-PT",
+    "Ja",
+]
+
+REGION_STRINGS = [
+    "USA [En,Fr-CA,Es-XL]",
+    "Europe [En,Fr,De,It,Es]",
+    "Japan",
+    "Asia [Zh-Hant, Ko]",
+    "Base Game NSP (Size: 5 GB)",
+    "1Fichier: Part 1 | Part 2",
+    "Update v1.0.2 (Size: 150 MB)",
+]
+
+
+def old_parse_languages(f, lang_dict):
+    """The original per-language loop"""
+
+    long_langs = list(lang_dict.keys())
+    short_langs = [lang_dict[l] for l in long_langs]
+
+    langs = []
+    for fs in f.split(","):
+        fs = fs.strip()
+        for i, short_lang in enumerate(short_langs):
+            if re.match(short_lang, fs):
+                langs.append(long_langs[i])
+                continue
+            if re.match(long_langs[i], fs):
+                langs.append(long_langs[i])
+
+    return langs
+
+
+def old_parse_regions(t, regions):
+    """The original per-region loop"""
+
+    return [region for region in regions if region.lower() in t.lower()]
+
+
+def time_parse(parse, strings):
+    """Time parsing every string, checking we get something back
+
+    Args:
+        parse (callable): Function to parse a string
+        strings (list): Strings to parse
+    """
+
+    start_time = time.perf_counter()
+    results = [parse(s) for s in strings]
+    elapsed_time = time.perf_counter() - start_time
+
+    return elapsed_time, results
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--strings", type=int, default=50000, help="Number of strings to parse"
+    )
+    args = parser.parse_args()
+
+    general_config = load_yml(
+        os.path.join(os.path.dirname(nxbrew_dl.__file__), "configs", "general.yml")
+    )
+    lang_dict = general_config["languages"]
+    regions = list(general_config["regions"])
+
+    # The same few strings turn up on most pages, so draw from a small set
+    rng = random.Random(0)
+    lang_strings = [rng.choice(LANGUAGE_STRINGS) for _ in range(args.strings)]
+    region_strings = [rng.choice(REGION_STRINGS) for _ in range(args.strings)]
+
+    print(f"{args.strings} strings each")
+
+    old_time, old_results = time_parse(
+        lambda s: old_parse_languages(s, lang_dict), lang_strings
+    )
+    new_time, new_results = time_parse(LanguageMatcher(lang_dict).parse, lang_strings)
+    no_memo_time, _ = time_parse(
+        LanguageMatcher(lang_dict, memo_size=0).parse, lang_strings
+    )
+    assert new_results == old_results
+    print(
+        f"  languages: loop {old_time:.3f}s, matcher {new_time:.3f}s, "
+        f"matcher without memo {no_memo_time:.3f}s"
+    )
+
+    old_time, old_results = time_parse(
+        lambda s: old_parse_regions(s, regions), region_strings
+    )
+    new_time, new_results = time_parse(RegionMatcher(regions).parse, region_strings)
+    no_memo_time, _ = time_parse(
+        RegionMatcher(regions, memo_size=0).parse, region_strings
+    )
+    assert new_results == old_results
+    print(
+        f"  regions:   loop {old_time:.3f}s, matcher {new_time:.3f}s, "
+        f"matcher without memo {no_memo_time:.3f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Benchmark classifying the titles in the game index
+
+Compares a TitleClassifier, which compiles its regexes once, against
+calling get_game_name and check_has_filetype for every title, as the
+index parsing used to. Titles come from a saved game index page, by
+default the one in tests/data. A saved copy of the full index from
+the site can be passed with --index. With the package installed, run
+with
+
+    python benchmarks/bench_title_classifier.py
+"""
+
+import argparse
+import os
+import time
+
+import nxbrew_dl
+from nxbrew_dl.util import load_yml, parse_html
+from nxbrew_dl.util.regex_tools import (
+    TitleClassifier,
+    get_game_name,
+    check_has_filetype,
+)
+
+DEFAULT_INDEX = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "tests",
+    "data",
+    "game_index.html",
+)
+
+
+def classify_per_title(long_names, regex_config):
+    """Classify titles one at a time, rebuilding the regexes for each
+
+    Args:
+        long_names (list): List of full titles
+        regex_config (dict): Regex configuration
+    """
+
+    nsp_xci_variations = regex_config["nsp_variations"] + regex_config["xci_variations"]
+
+    title_dicts = []
+    for long_name in long_names:
+        short_name = get_game_name(long_name, nsp_xci_variations)
+        remaining_name = long_name.replace(short_name, "")
+
+        title_dicts.append(
+            {
+                "short_name": short_name,
+                "has_nsp": check_has_filetype(
+                    remaining_name, regex_config["nsp_variations"]
+                ),
+                "has_xci": check_has_filetype(
+                    remaining_name, regex_config["xci_variations"]
+                ),
+                "has_update": check_has_filetype(
+                    remaining_name, regex_config["update_variations"]
+                ),
+                "has_dlc": check_has_filetype(
+                    remaining_name, regex_config["dlc_variations"]
+                ),
+            }
+        )
+
+    return title_dicts
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--index",
+        default=DEFAULT_INDEX,
+        help="Saved game index page. Defaults to the one in tests/data",
+    )
+    parser.add_argument(
+        "--titles",
+        type=int,
+        default=6000,
+        help="Number of titles to classify, cycling through those in the index",
+    )
+    args = parser.parse_args()
+
+    regex_config = load_yml(
+        os.path.join(os.path.dirname(nxbrew_dl.__file__), "configs", "regex.yml")
+    )
+
+    with open(args.index, "rb") as f:
+        soup = parse_html(f.read(), parser="lxml-xpath")
+    index_names = [
+        str(li.text_content())
+        for li in soup.xpath("//div[@id='easyindex-index']//li")
+    ]
+
+    long_names = [index_names[i % len(index_names)] for i in range(args.titles)]
+
+    print(f"{len(long_names)} titles, from {len(index_names)} in {args.index}")
+
+    start_time = time.perf_counter()
+    old_title_dicts = classify_per_title(long_names, regex_config)
+    old_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    new_title_dicts = TitleClassifier(regex_config).classify_all(long_names)
+    new_time = time.perf_counter() - start_time
+
+    assert new_title_dicts == old_title_dicts
+
+    print(f"  per title:  {old_time:.3f}s")
+    print(f"  classifier: {new_time:.3f}s ({old_time / new_time:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
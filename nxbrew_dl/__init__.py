@@ -1,12 +1,13 @@
 import sys
 from importlib.metadata import version
 
-from PySide6.QtWidgets import QApplication
 
-from .gui import MainWindow
+def run_nxbrew_gui():
+    # Qt is only pulled in when we actually want the GUI
+    from PySide6.QtWidgets import QApplication
 
+    from .gui import MainWindow
 
-def run_nxbrew_gui():
     app = QApplication(sys.argv)
 
     window = MainWindow()
@@ -14,12 +15,30 @@ def run_nxbrew_gui():
 
     app.exec()
 
+
+def run_nxbrew_cli():
+    from .cli import run_cli
+
+    sys.exit(run_cli())
+
+
+def __getattr__(name):
+    # Keep nxbrew_dl.MainWindow working, without importing the GUI up front
+    if name == "MainWindow":
+        from .gui import MainWindow
+
+        return MainWindow
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 # Get the version
 __version__ = version(__name__)
 
 __all__ = [
     "MainWindow",
     "run_nxbrew_gui",
+    "run_nxbrew_cli",
 ]
 
 if __name__ == "__main__":
@@ -0,0 +1,126 @@
+import argparse
+import os
+
+import nxbrew_dl
+from .util import (
+    NXBrewLogger,
+    load_yml,
+    save_json,
+)
+
+
+def get_parser():
+    """Get the argument parser for the CLI"""
+
+    parser = argparse.ArgumentParser(
+        prog="nxbrew-dl-cli",
+        description="Run NXBrew-dl without the GUI, using the config.yml and "
+        "cache.json set up there",
+    )
+    parser.add_argument(
+        "-d",
+        "--directory",
+        default=None,
+        help="Directory with config.yml and cache.json. Defaults to the "
+        "current directory",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Find what would be downloaded, but don't download anything",
+    )
+    parser.add_argument(
+        "--plan",
+        default=None,
+        metavar="FILE",
+        help="Write out what would be downloaded for each game (release, files and "
+        "mirrors) as JSON, without downloading anything or connecting to "
+        "JDownloader",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Keep running, and sync on a schedule. Only games whose pages "
+        "have changed are processed after the first sync",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=None,
+        help="Time to wait between syncs in daemon mode (in seconds). "
+        "Defaults to the value in the general config",
+    )
+    parser.add_argument(
+        "--log-level",
+        default="INFO",
+        choices=["DEBUG", "INFO"],
+        help="Logging level. Defaults to INFO",
+    )
+    parser.add_argument(
+        "--version",
+        action="version",
+        version=f"%(prog)s {nxbrew_dl.__version__}",
+    )
+
+    return parser
+
+
+def run_cli(args=None):
+    """Run NXBrew-dl from the command line. Returns an exit code
+
+    Args:
+        args (list): Command line arguments. Defaults to None, which
+            will use sys.argv
+    """
+
+    parser = get_parser()
+    args = parser.parse_args(args)
+
+    if args.plan is not None and args.daemon:
+        parser.error("--plan can't be used with --daemon")
+
+    # Everything (config, cache, logs) lives in the working directory
+    if args.directory is not None:
+        os.chdir(args.directory)
+
+    logger = NXBrewLogger(log_level=args.log_level)
+
+    user_config_file = os.path.join(os.getcwd(), "config.yml")
+    if not os.path.exists(user_config_file):
+        logger.warning(f"No config.yml found in {os.getcwd()}. Set one up in the GUI!")
+        return 1
+    user_config = load_yml(user_config_file)
+
+    if "nxbrew" not in user_config.get("nxbrew_url", ""):
+        logger.warning("NXBrew URL not found. Add one to config.yml!")
+        return 1
+
+    # Planning never downloads anything
+    if args.dry_run or args.plan is not None:
+        user_config["dry_run"] = True
+
+    # Only pull in the parsing and download machinery once we've got something to do
+    from .nxbrew_dl import SyncDaemon
+
+    daemon = SyncDaemon(
+        user_config=user_config,
+        logger=logger,
+    )
+
+    try:
+        if args.plan is not None:
+            nx = daemon.get_nxbrew()
+            nx.to_download = daemon.get_selected_games()
+            game_plans = nx.plan(max_workers=daemon.sync_config["max_workers"])
+            save_json(game_plans, args.plan)
+            logger.info(f"Plan written to {args.plan}")
+        elif args.daemon:
+            daemon.run(interval=args.interval)
+        else:
+            daemon.sync()
+    except KeyboardInterrupt:
+        logger.info("Stopping")
+    finally:
+        daemon.user_cache.close()
+
+    return 0
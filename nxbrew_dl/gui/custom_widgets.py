@@ -1,6 +1,14 @@
-from PySide6.QtCore import Qt
+from array import array
+
+from PySide6.QtCore import (
+    Qt,
+    QAbstractTableModel,
+    QModelIndex,
+    QSortFilterProxyModel,
+)
 from PySide6.QtGui import QBrush, QColor
-from PySide6.QtWidgets import QTableWidgetItem, QHeaderView
+
+from ..util import SearchIndex, get_url_path
 
 COLOURS = {
     "green": QColor(0, 175, 0, 255),
@@ -8,164 +16,563 @@ COLOURS = {
     "red": QColor(175, 0, 0, 255),
 }
 
+# Column names and tooltips
+COLUMNS = [
+    ("Name", "Game Name (double-click to open URL)"),
+    ("DL?", "Download Game?"),
+    ("NSP", "Game has NSP"),
+    ("XCI", "Game has XCI"),
+    ("Updates", "Game has Updates"),
+    ("DLC", "Game has DLC"),
+]
+
+# Each game's flags are packed into a single byte
+FLAG_NSP = 1
+FLAG_XCI = 2
+FLAG_UPDATE = 4
+FLAG_DLC = 8
+FLAG_CHECKED = 16
+FLAG_NEW = 32
+
+FLAG_KEYS = {
+    "has_nsp": FLAG_NSP,
+    "has_xci": FLAG_XCI,
+    "has_update": FLAG_UPDATE,
+    "has_dlc": FLAG_DLC,
+}
 
-def set_dl(
-    table,
-    row_position,
-):
-    """Set downloaded state for each row
+# Which flag goes in which column
+FLAG_COLUMNS = {
+    2: FLAG_NSP,
+    3: FLAG_XCI,
+    4: FLAG_UPDATE,
+    5: FLAG_DLC,
+}
 
-    Args:
-        table (QTableWidget): QTableWidget
-        row_position (int): Row position
-    """
+NAME_COLUMN = 0
+DL_COLUMN = 1
 
-    dl = SortableCheckboxTableWidgetItem()
-    dl.setTextAlignment(Qt.AlignmentFlag.AlignHCenter)
-    dl.setCheckState(Qt.CheckState.Unchecked)
+SORT_ROLE = Qt.ItemDataRole.UserRole
 
-    table.setItem(row_position, 1, dl)
 
+class GameTableModel(QAbstractTableModel):
 
-class TableRowWidget(QTableWidgetItem):
+    def __init__(
+        self,
+        row_name_key="long_name",
+        parent=None,
+    ):
+        """Table model for the game list
 
-    def __init__(self, row_dict, row_name_key="long_name"):
-        """Custom table rows, that include pretty colour and useful columns
+        Rather than an item per cell, games are kept as columns of
+        names, URLs and packed flags, and the view only asks for what
+        it's actually showing
 
         Args:
-            row_dict (dict): Dictionary of row details
-            row_name_key (str): Column name to define the name for the row
+            row_name_key (str): Key used to identify the name for the row.
+                Defaults to "long_name"
+            parent (QObject): Parent object. Defaults to None
         """
-        super(TableRowWidget, self).__init__()
 
-        self.name = row_dict[row_name_key]
-        self.url = row_dict["url"]
+        super().__init__(parent)
 
-        # If we've parsed neither an NSP or XCI, mark as undefined
-        if not row_dict["has_nsp"] and not row_dict["has_xci"]:
-            row_dict["has_nsp"] = "UNDEF"
-            row_dict["has_xci"] = "UNDEF"
-
-        self.row_dict = row_dict
         self.row_name_key = row_name_key
 
-    def setup_row(self, table, row_position):
-        """Create a row for a ROM with all the relevant info
+        self.names = []
+        self.urls = []
+        self.url_paths = []
+        self.game_flags = array("B")
+
+        # Searching goes through an index of the names, by URL path
+        self.search_index = SearchIndex()
+
+        # Row for each URL path
+        self.rows = {}
+
+        # Sorting is done here, on the columns, rather than in the proxy
+        self.sort_column = -1
+        self.sort_order = Qt.SortOrder.AscendingOrder
+
+        self.brushes = {}
+        for colour in COLOURS:
+            brush = QBrush(COLOURS[colour])
+            brush.setStyle(Qt.BrushStyle.SolidPattern)
+            self.brushes[colour] = brush
+
+    def set_games(
+        self,
+        games,
+        checked_paths=None,
+    ):
+        """Replace all the games in the table
 
         Args:
-            table (QTableWidget): QTableWidget
-            row_position (int): Row position
+            games (list): List of game dictionaries
+            checked_paths (set): URL paths for games that should be
+                checked. Defaults to None
         """
 
-        self.set_name(
-            table=table,
-            row_position=row_position,
-        )
+        self.beginResetModel()
 
-        set_dl(
-            table=table,
-            row_position=row_position,
-        )
+        self.names = []
+        self.urls = []
+        self.url_paths = []
+        self.game_flags = array("B")
+        self.rows = {}
+        self.search_index.clear()
 
-        # Set NSP/XCI
-        self.set_filetype(
-            table=table,
-            key="has_nsp",
-            row_position=row_position,
-            column_position=2,
-        )
-        self.set_filetype(
-            table=table,
-            key="has_xci",
-            row_position=row_position,
-            column_position=3,
-        )
-        self.set_filetype(
-            table=table,
-            key="has_update",
-            row_position=row_position,
-            column_position=4,
-        )
-        self.set_filetype(
-            table=table,
-            key="has_dlc",
-            row_position=row_position,
-            column_position=5,
+        for game in games:
+            self.append_game(game, checked_paths=checked_paths)
+
+        self.sort_rows()
+
+        self.endResetModel()
+
+        return True
+
+    def add_games(
+        self,
+        games,
+        checked_paths=None,
+    ):
+        """Add games to the bottom of the table
+
+        Args:
+            games (list): List of game dictionaries
+            checked_paths (set): URL paths for games that should be
+                checked. Defaults to None
+        """
+
+        if len(games) == 0:
+            return True
+
+        n_rows = len(self.names)
+
+        self.beginInsertRows(QModelIndex(), n_rows, n_rows + len(games) - 1)
+        for game in games:
+            self.append_game(game, checked_paths=checked_paths)
+        self.endInsertRows()
+
+        return True
+
+    def remove_games(
+        self,
+        urls,
+    ):
+        """Remove games from the table
+
+        Rows are removed in runs, from the bottom up, so the view only
+        loses the rows that have gone
+
+        Args:
+            urls (list): URLs for the games to remove
+        """
+
+        rows = sorted(
+            [
+                self.rows[get_url_path(url)]
+                for url in urls
+                if get_url_path(url) in self.rows
+            ],
+            reverse=True,
         )
 
-        # Finally, resize the table. Shrink everything but title to minimum
-        header = table.horizontalHeader()
-        header.setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        if len(rows) == 0:
+            return True
+
+        # Group into runs of neighbouring rows
+        runs = []
+        for row in rows:
+            if len(runs) > 0 and runs[-1][0] == row + 1:
+                runs[-1][0] = row
+            else:
+                runs.append([row, row])
 
-        # And stretch out the title to fill the rest
-        header.setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        for first, last in runs:
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self.names[first : last + 1]
+            del self.urls[first : last + 1]
+            del self.url_paths[first : last + 1]
+            del self.game_flags[first : last + 1]
+            self.endRemoveRows()
 
-    def set_name(
+        self.rows = {url_path: row for row, url_path in enumerate(self.url_paths)}
+        self.update_search_index()
+
+        return True
+
+    def update_games(
         self,
-        table,
-        row_position,
+        games,
     ):
-        """Set the name for the row
+        """Update games already in the table, keeping whether they're checked or new
 
         Args:
-            table (QTableWidget): Table widget
-            row_position (int): Position of the row to set name for
+            games (list): List of game dictionaries
         """
 
-        item = QTableWidgetItem(self.name)
-        item.setToolTip(self.url)
+        for game in games:
+
+            row = self.rows.get(get_url_path(game["url"]), None)
+            if row is None:
+                continue
+
+            flags = self.game_flags[row] & (FLAG_CHECKED | FLAG_NEW)
+            for key, flag in FLAG_KEYS.items():
+                if game[key]:
+                    flags |= flag
 
-        table.setItem(row_position, 0, item)
+            self.names[row] = game[self.row_name_key]
+            self.urls[row] = game["url"]
+            self.game_flags[row] = flags
 
-    def set_filetype(
+            self.dataChanged.emit(
+                self.index(row, 0),
+                self.index(row, len(COLUMNS) - 1),
+            )
+
+        if len(games) > 0:
+            self.update_search_index()
+
+        return True
+
+    def apply_changes(
         self,
-        table,
-        key,
-        row_position,
-        column_position,
+        added,
+        removed,
+        changed,
+        checked_paths=None,
     ):
-        """Set the status of a filetype
+        """Apply changes to the games, leaving the rest of the table alone
 
-        If a key evaluates to true in the row_dict, it will set
-        a text box that says "Yes" and is green. Otherwise, will
-        be a red "No"
+        Removed games are taken out, changed games are updated in place,
+        and new games go on the bottom. The table is then re-sorted, if
+        it's sorted, so the view keeps its scroll position and selection
 
         Args:
-            table (QTableWidget): Table widget
-            key (str): Key to check
-            row_position (int): Row position
-            column_position (int): Column position for the key
+            added (list): Game dictionaries for the new games
+            removed (list): URLs for the games that have gone
+            changed (list): Game dictionaries for the games that have changed
+            checked_paths (set): URL paths for new games that should be
+                checked. Defaults to None
         """
 
-        has_filetype = QTableWidgetItem()
-        has_filetype.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.remove_games(removed)
+        self.update_games(changed)
+        self.add_games(added, checked_paths=checked_paths)
 
-        # Set text and colour
-        if self.row_dict[key] == "UNDEF":
-            has_filetype.setText("???")
-            colour = QBrush(COLOURS["orange"])
-        elif self.row_dict[key]:
-            has_filetype.setText("Yes")
-            colour = QBrush(COLOURS["green"])
-        else:
-            has_filetype.setText("No")
-            colour = QBrush(COLOURS["red"])
+        if self.sort_column >= 0:
+            self.sort(self.sort_column, self.sort_order)
+
+        return True
+
+    def update_search_index(self):
+        """Rebuild the search index from the names in the table"""
+
+        self.search_index.clear()
+        for url_path, name in zip(self.url_paths, self.names):
+            self.search_index.add(url_path, name)
+
+        return True
+
+    def append_game(
+        self,
+        game,
+        checked_paths=None,
+    ):
+        """Append a game to the columns, without telling any views
+
+        Args:
+            game (dict): Dictionary for the game
+            checked_paths (set): URL paths for games that should be
+                checked. Defaults to None
+        """
+
+        url_path = get_url_path(game["url"])
+
+        flags = 0
+        for key, flag in FLAG_KEYS.items():
+            if game[key]:
+                flags |= flag
+        if checked_paths is not None and url_path in checked_paths:
+            flags |= FLAG_CHECKED
+
+        self.rows[url_path] = len(self.names)
+
+        name = game[self.row_name_key]
+        self.names.append(name)
+        self.search_index.add(url_path, name)
+        self.urls.append(game["url"])
+        self.url_paths.append(url_path)
+        self.game_flags.append(flags)
+
+        return True
+
+    def get_sort_key(self, row, column):
+        """Get the value to sort a row on, for a column
+
+        Args:
+            row (int): Row
+            column (int): Column
+        """
+
+        if column == NAME_COLUMN:
+            return self.names[row]
 
-        colour.setStyle(Qt.BrushStyle.SolidPattern)
-        has_filetype.setBackground(colour)
+        return self.data(self.index(row, column), SORT_ROLE)
 
-        has_filetype.setFlags(Qt.ItemFlag.ItemIsEnabled)
+    def sort_rows(self):
+        """Reorder the columns for the current sort, without telling any views"""
 
-        table.setItem(row_position, column_position, has_filetype)
+        if self.sort_column < 0:
+            return list(range(len(self.names)))
 
-class SortableCheckboxTableWidgetItem(QTableWidgetItem):
-    """Modified checkbox that allows for sorting"""
+        rows = sorted(
+            range(len(self.names)),
+            key=lambda row: self.get_sort_key(row, self.sort_column),
+            reverse=self.sort_order == Qt.SortOrder.DescendingOrder,
+        )
+
+        self.names = [self.names[row] for row in rows]
+        self.urls = [self.urls[row] for row in rows]
+        self.url_paths = [self.url_paths[row] for row in rows]
+        self.game_flags = array("B", [self.game_flags[row] for row in rows])
+        self.rows = {url_path: row for row, url_path in enumerate(self.url_paths)}
+
+        return rows
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+
+        self.sort_column = column
+        self.sort_order = order
+
+        self.layoutAboutToBeChanged.emit()
+
+        old_rows = self.sort_rows()
+
+        # Keep track of anything that's holding on to an index
+        new_rows = {old_row: row for row, old_row in enumerate(old_rows)}
+        old_indices = self.persistentIndexList()
+        new_indices = [
+            self.index(new_rows[index.row()], index.column()) for index in old_indices
+        ]
+        self.changePersistentIndexList(old_indices, new_indices)
+
+        self.layoutChanged.emit()
+
+    def set_new_paths(self, new_paths):
+        """Mark which games are new
+
+        Args:
+            new_paths (set): URL paths for new games
+        """
+
+        for row, url_path in enumerate(self.url_paths):
+            if url_path in new_paths:
+                self.game_flags[row] |= FLAG_NEW
+            else:
+                self.game_flags[row] &= ~FLAG_NEW
+
+        return True
+
+    def get_checked_paths(self):
+        """Get URL paths for all the checked games"""
+
+        return set(
+            url_path
+            for url_path, flags in zip(self.url_paths, self.game_flags)
+            if flags & FLAG_CHECKED
+        )
 
-    def __lt__(self, other):
-        """Edit the less than operator"""
+    def get_checked_urls(self):
+        """Get URLs for all the checked games, in table order"""
+
+        return [
+            url for url, flags in zip(self.urls, self.game_flags) if flags & FLAG_CHECKED
+        ]
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.names)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(COLUMNS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+
+        if not index.isValid():
+            return None
+
+        row = index.row()
+        column = index.column()
+        flags = self.game_flags[row]
+
+        if column == NAME_COLUMN:
+            if role in [Qt.ItemDataRole.DisplayRole, SORT_ROLE]:
+                return self.names[row]
+            if role == Qt.ItemDataRole.ToolTipRole:
+                return self.urls[row]
+            return None
+
+        if column == DL_COLUMN:
+            if role == Qt.ItemDataRole.CheckStateRole:
+                if flags & FLAG_CHECKED:
+                    return Qt.CheckState.Checked
+                return Qt.CheckState.Unchecked
+            if role == SORT_ROLE:
+                return int(bool(flags & FLAG_CHECKED))
+            if role == Qt.ItemDataRole.TextAlignmentRole:
+                return Qt.AlignmentFlag.AlignHCenter
+            return None
 
-        if self.checkState() == other.checkState():
+        # If we've parsed neither an NSP or XCI, mark as undefined
+        undefined = column in [2, 3] and not flags & (FLAG_NSP | FLAG_XCI)
+
+        if role in [Qt.ItemDataRole.DisplayRole, SORT_ROLE]:
+            if undefined:
+                return "???"
+            elif flags & FLAG_COLUMNS[column]:
+                return "Yes"
+            return "No"
+
+        if role == Qt.ItemDataRole.BackgroundRole:
+            if undefined:
+                return self.brushes["orange"]
+            elif flags & FLAG_COLUMNS[column]:
+                return self.brushes["green"]
+            return self.brushes["red"]
+
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            return Qt.AlignmentFlag.AlignCenter
+
+        return None
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+
+        if not index.isValid() or index.column() != DL_COLUMN:
             return False
-        elif self.checkState() == Qt.CheckState.Checked:
+        if role != Qt.ItemDataRole.CheckStateRole:
             return False
+
+        row = index.row()
+        if Qt.CheckState(value) == Qt.CheckState.Checked:
+            self.game_flags[row] |= FLAG_CHECKED
+        else:
+            self.game_flags[row] &= ~FLAG_CHECKED
+
+        self.dataChanged.emit(index, index, [role])
+
+        return True
+
+    def flags(self, index):
+
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+
+        if index.column() == NAME_COLUMN:
+            return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+        if index.column() == DL_COLUMN:
+            return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsUserCheckable
+
+        return Qt.ItemFlag.ItemIsEnabled
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+
+        if orientation != Qt.Orientation.Horizontal:
+            return super().headerData(section, orientation, role)
+
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.tr(COLUMNS[section][0])
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return self.tr(COLUMNS[section][1])
+
+        return None
+
+
+class GameFilterProxyModel(QSortFilterProxyModel):
+
+    def __init__(
+        self,
+        parent=None,
+    ):
+        """Sorts and filters the game table
+
+        Args:
+            parent (QObject): Parent object. Defaults to None
+        """
+
+        super().__init__(parent)
+
+        self.setSortRole(SORT_ROLE)
+
+        self.search_text = ""
+        self.new_only = False
+
+        # URL paths matching the search, and the version of the index
+        # they came from. None means everything matches
+        self.matches = None
+        self.matches_version = -1
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+
+        # Sorting the underlying columns is much quicker than sorting here, and
+        # the filter keeps the source order
+        self.sourceModel().sort(column, order)
+
+    def set_filter(
+        self,
+        text,
+        new_only=False,
+    ):
+        """Set what to filter on
+
+        Args:
+            text (str): Text to search for in the game names
+            new_only (bool): Whether to only show new games. Defaults
+                to False
+        """
+
+        self.search_text = text
+        self.new_only = new_only
+        self.matches_version = -1
+
+        # Everything gets shown or hidden in one go
+        self.invalidate()
+
         return True
+
+    def update_matches(self):
+        """Update the URL paths matching the search, if the index has changed"""
+
+        search_index = self.sourceModel().search_index
+
+        if self.matches_version == search_index.version:
+            return True
+
+        if len(self.search_text) == 0:
+            self.matches = None
+        else:
+            self.matches = search_index.search(self.search_text)
+        self.matches_version = search_index.version
+
+        return True
+
+    def filterAcceptsRow(self, source_row, source_parent):
+
+        model = self.sourceModel()
+
+        if self.new_only and not model.game_flags[source_row] & FLAG_NEW:
+            return False
+
+        # This is called for every row, so only check the index when
+        # something's changed
+        if self.matches_version != model.search_index.version:
+            self.update_matches()
+
+        if self.matches is None:
+            return True
+
+        return model.url_paths[source_row] in self.matches
@@ -1,9 +1,9 @@
 import os
 import sys
+import threading
 import time
 import traceback
 from functools import partial
-from urllib.parse import urlparse
 
 import requests
 from PySide6.QtCore import (
@@ -13,47 +13,60 @@ from PySide6.QtCore import (
     QThread,
     QSize,
     Qt,
+    QTimer,
 )
 from PySide6.QtGui import QIcon
 from PySide6.QtWidgets import (
     QMessageBox,
     QMainWindow,
     QFileDialog,
+    QHeaderView,
 )
 from myjdapi.exception import MYJDException
 from packaging.version import Version
 
 import nxbrew_dl
+from .custom_widgets import GameTableModel, GameFilterProxyModel
 from .gui_about import AboutWindow
 from .gui_regions_languages import RegionLanguageWindow
 from .gui_utils import (
     open_url,
-    add_row_to_table,
     get_ordered_list,
 )
 from .layout_nxbrew_dl import Ui_nxbrew_dl
 from ..nxbrew_dl import NXBrew
 from ..util import (
     check_github_version,
-    get_game_dict,
+    abort_response,
+    get_http_client,
+    get_http_cache,
+    get_config_hash,
+    get_content_hash,
+    open_game_index,
+    iter_game_index,
+    get_game_dict_delta,
+    get_url_path,
     NXBrewLogger,
+    IndexSnapshot,
+    UserCache,
+    save_index_snapshot,
     load_yml,
     save_yml,
     load_json,
 )
 
 
-def open_game_url(item):
+def open_game_url(index):
     """If a row title is clicked, open the associated URL"""
 
-    column = item.column()
+    column = index.column()
 
     # If we're not clicking the name, don't do anything
     if column != 0:
         return
 
     # Search by URL, so pull that out here
-    url = item.toolTip()
+    url = index.data(Qt.ItemDataRole.ToolTipRole)
     open_url(url)
 
 
@@ -104,6 +117,9 @@ class MainWindow(QMainWindow):
         general_config_filename = os.path.join(self.mod_dir, "configs", "general.yml")
         self.general_config = load_yml(general_config_filename)
 
+        # Set up the shared HTTP client
+        get_http_client(self.general_config.get("http", None))
+
         regex_config_filename = os.path.join(self.mod_dir, "configs", "regex.yml")
         self.regex_config = load_yml(regex_config_filename)
 
@@ -122,12 +138,8 @@ class MainWindow(QMainWindow):
         reg_lang_button = self.ui.pushButtonRegionLanguage
         reg_lang_button.clicked.connect(lambda: self.regions_languages.show())
 
-        # Read in user cache, keeping the filename around so we can save it out later
-        self.user_cache_file = os.path.join(os.getcwd(), "cache.json")
-        if os.path.exists(self.user_cache_file):
-            self.user_cache = load_json(self.user_cache_file)
-        else:
-            self.user_cache = {}
+        # Read in user cache. This is shared with the download thread
+        self.user_cache = UserCache()
 
         # Do an initial load of the config
         self.load_config()
@@ -136,6 +148,12 @@ class MainWindow(QMainWindow):
         self.nxbrew_thread = None
         self.nxbrew_worker = None
 
+        # Each index load gets an ID, so we know which one results are from.
+        # Threads are kept around until they've finished, even if cancelled
+        self.index_load_id = 0
+        self.index_loading = False
+        self.index_loads = {}
+
         # Help menu buttons
         documentation = self.ui.actionDocumentation
         documentation.triggered.connect(
@@ -162,21 +180,74 @@ class MainWindow(QMainWindow):
             partial(self.set_directory_name, line_edit=self.ui.lineEditDownloadDir)
         )
 
-        self.game_table = self.ui.tableGames
         self.game_dict = {}
 
+        # The games live in a model, with sorting and filtering on top
+        self.game_model = GameTableModel(parent=self)
+        self.game_proxy = GameFilterProxyModel(parent=self)
+        self.game_proxy.setSourceModel(self.game_model)
+
+        self.game_table = self.ui.tableGames
+        self.game_table.setModel(self.game_proxy)
+
+        # Shrink everything but title to minimum, and stretch out the title to fill the rest
+        header = self.game_table.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        header.setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+
+        # Columns all look alike, so only size to what's on screen
+        header.setResizeContentsPrecision(0)
+
+        # Keep track of newly added games by URL path
+        self.new_games = set()
+
+        # Keep the game index around between runs, so we only need to apply changes.
+        # Older versions saved this as JSON, so pick that up if it's all we have
+        self.game_index_file = os.path.join(os.getcwd(), "game_index.bin")
+        self.game_index_json_file = os.path.join(os.getcwd(), "game_index.json")
+
+        # Hash of the index page we last parsed, so an unchanged index can be skipped.
+        # Parsing depends on the code and the config, so keep track of those too
+        self.game_index_hash = None
+        self.game_index_config_hash = get_config_hash(
+            {
+                "version": nxbrew_dl.__version__,
+                "regex_config": self.regex_config,
+                "forbidden_titles": self.general_config["forbidden_titles"],
+            }
+        )
+
+        # Number of rows to add to the table before redrawing
+        self.table_batch_size = 100
+
+        # How long to wait for the index load to stop when closing (in ms)
+        self.index_cancel_timeout = 5000
+
+        # How long to wait after typing before searching (in ms)
+        self.search_delay = 150
+
         # Add in refresh option
         refresh_button = self.ui.pushButtonRefresh
         refresh_button.clicked.connect(self.load_table)
 
         # Set up the table so links will open the webpages
-        self.game_table.itemDoubleClicked.connect(open_game_url)
+        self.game_table.doubleClicked.connect(open_game_url)
 
-        # Set up the search bar
+        # Set up the search bar. Wait for a pause in typing before searching
         self.search_bar = self.ui.lineEditSearch
-        self.search_bar.textChanged.connect(self.update_display)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.search_delay)
+        self.search_timer.timeout.connect(lambda: self.update_display())
+        self.search_bar.textChanged.connect(self.search_timer.start)
 
-        self.load_table()
+        # And the new games filter
+        self.ui.checkBoxNewOnly.toggled.connect(lambda: self.update_display())
+
+        # Show what we had last time straight away, and then get the fresh index
+        # in the background. Filling the table before the window's up means Qt
+        # sizes every row, so wait until then
+        QTimer.singleShot(0, self.load_startup_table)
 
     def setup_update_notification(
         self,
@@ -204,96 +275,307 @@ class MainWindow(QMainWindow):
 
         return update_box
 
-    def get_game_dict(self):
-        """Get game dictionary from NXBrew A-Z page"""
+    def update_display(self, text=None):
+        """When using the search bar or new filter, show/hide rows
 
-        if "nxbrew" not in self.user_config.get("nxbrew_url", ""):
-            self.logger.warning(
-                "NXBrew URL not found. Enter one and refresh the game list!"
-            )
+        Args:
+            text (str): Text to filter out rows. Defaults to None,
+                which will use the text in the search bar
+        """
+
+        if text is None:
+            text = self.search_bar.text()
+        new_only = self.ui.checkBoxNewOnly.isChecked()
+
+        self.game_model.set_new_paths(self.new_games)
+        self.game_proxy.set_filter(text, new_only=new_only)
+
+    def update_progressbar_value(self, value):
+        self.nxbrew_worker.progress_bar.setValue(value)
+
+    def load_startup_table(self):
+        """Show the game index from last time, then get a fresh one in the background"""
+
+        self.load_cached_table()
+        self.load_table()
+
+        return True
+
+    def load_cached_table(self):
+        """Fill the table from the game index we saved last time, if we have one"""
+
+        if os.path.exists(self.game_index_file):
+            try:
+                with IndexSnapshot(self.game_index_file) as snapshot:
+                    game_dict = snapshot.get_game_dict()
+
+                    # If we parsed things differently, we can't trust the snapshot
+                    # to be up-to-date, so don't skip the next parse
+                    game_index_hash = None
+                    if snapshot.config_hash == self.game_index_config_hash:
+                        game_index_hash = snapshot.index_hash
+            except Exception:
+                # Whatever's wrong with it, throw it away and get a fresh one
+                self.logger.warning("Saved game list is corrupted, will get a fresh one")
+                os.remove(self.game_index_file)
+                return False
+
+            self.game_dict = game_dict
+            self.game_index_hash = game_index_hash
+        elif os.path.exists(self.game_index_json_file):
+            self.game_dict = load_json(self.game_index_json_file)
+        else:
             return False
 
-        try:
-            _ = requests.get(self.user_config["nxbrew_url"])
-        except (requests.exceptions.SSLError, requests.exceptions.MissingSchema) as e:
-            self.logger.warning(
-                "Error found in NXBrew URL! Enter one that works and refresh the game list!"
-            )
+        self.game_model.set_games(
+            self.game_dict.values(),
+            checked_paths=self.user_cache.get_url_paths(),
+        )
+
+        self.game_table.setSortingEnabled(True)
+        self.update_display()
+
+        return True
+
+    def load_table(self):
+        """Get a fresh game index in the background
+
+        The table stays usable while this happens. If we've already got
+        games in the table, only the changes are applied once the full
+        index is in. Otherwise, the table is filled in as the index is
+        parsed. If we're already loading, that gets cancelled and we
+        start again
+        """
+
+        self.cancel_index_load()
+
+        # Save and load the config
+        self.save_config()
+        self.load_config()
+
+        # Keep track of what's in the cache, so we can check rows as they're added
+        self.user_cache_paths = self.user_cache.get_url_paths()
+
+        # Sorting as we go moves rows around under us, so turn off until we're done
+        if len(self.game_dict) == 0:
+            self.game_table.setSortingEnabled(False)
+
+        # Don't run until we've got the fresh index
+        self.ui.pushButtonRun.setEnabled(False)
+        self.ui.labelProgressBar.setText("Loading game list")
+
+        self.index_load_id += 1
+
+        index_thread = QThread()
+        index_worker = GameIndexWorker(
+            load_id=self.index_load_id,
+            general_config=self.general_config,
+            regex_config=self.regex_config,
+            user_config=self.user_config,
+            game_index_file=self.game_index_file,
+            index_hash=self.game_index_hash,
+            config_hash=self.game_index_config_hash,
+            batch_size=self.table_batch_size,
+            logger=self.logger,
+        )
+
+        index_worker.moveToThread(index_thread)
+        index_thread.started.connect(index_worker.run)
+
+        index_worker.games_found.connect(self.add_index_games)
+        index_worker.progress.connect(self.update_index_progress)
+        index_worker.index_loaded.connect(self.finish_index_load)
+        index_worker.index_unchanged.connect(self.keep_cached_index)
+
+        # Stop the thread once we're done
+        index_worker.finished.connect(index_thread.quit)
+
+        self.index_loads[self.index_load_id] = (index_thread, index_worker)
+        self.index_loading = True
+
+        index_thread.start()
+
+        return True
+
+    def cancel_index_load(self, wait=False):
+        """Stop any index load that's going on
+
+        Args:
+            wait (bool): Whether to wait for the thread to finish up.
+                Defaults to False
+        """
+
+        # Cancelling aborts the index request, so the worker isn't stuck
+        # waiting on the network while we wait for it
+        for index_thread, index_worker in self.index_loads.values():
+            index_worker.cancel()
+
+            if wait:
+                index_thread.quit()
+                index_thread.wait(self.index_cancel_timeout)
+
+        self.index_loading = False
+
+        # Let go of anything that's finished
+        self.index_loads = {
+            load_id: (index_thread, index_worker)
+            for load_id, (index_thread, index_worker) in self.index_loads.items()
+            if not index_thread.isFinished()
+        }
+
+        return True
+
+    def is_current_index_load(self, load_id):
+        """Check results are from the index load we're waiting on
+
+        Results from a cancelled load can still turn up after we've
+        moved on, so they're ignored
+
+        Args:
+            load_id (int): ID of the index load
+        """
+
+        return self.index_loading and load_id == self.index_load_id
+
+    @Slot(int, object)
+    def add_index_games(self, load_id, games):
+        """Add games to the table as they come in, if the table started empty
+
+        Args:
+            load_id (int): ID of the index load
+            games (list): List of game dictionaries
+        """
+
+        if not self.is_current_index_load(load_id):
             return False
 
-        try:
-            self.game_dict = get_game_dict(
-                general_config=self.general_config,
-                regex_config=self.regex_config,
-                nxbrew_url=self.user_config["nxbrew_url"],
-            )
-        except Exception as e:
-            self.logger.warning(
-                "Error found retreiving game list, try another URL"
-            )
+        # If we're going to apply changes at the end, wait until then
+        if len(self.game_dict) > 0:
+            return False
+
+        self.game_model.add_games(games, checked_paths=self.user_cache_paths)
+
+        return True
+
+    @Slot(int, int)
+    def update_index_progress(self, load_id, n_games):
+        """Show how far through the index we are
+
+        Args:
+            load_id (int): ID of the index load
+            n_games (int): Number of games parsed so far
+        """
+
+        if not self.is_current_index_load(load_id):
             return False
 
-    def update_display(self, text):
-        """When using the search bar, show/hide rows
+        self.ui.labelProgressBar.setText(f"Loading game list ({n_games} games)")
+
+        return True
+
+    @Slot(int)
+    def keep_cached_index(self, load_id):
+        """The index hasn't changed since we last parsed it, so keep what we've got
 
         Args:
-            text (str): Text to filter out rows
+            load_id (int): ID of the index load
         """
 
-        for r in range(self.game_table.rowCount()):
-            r_text = self.game_table.item(r, 0).text()
-            if text.lower() in r_text.lower():
-                self.game_table.showRow(r)
-            else:
-                self.game_table.hideRow(r)
+        if not self.is_current_index_load(load_id):
+            return False
 
-    def update_progressbar_value(self, value):
-        self.nxbrew_worker.progress_bar.setValue(value)
+        self.logger.info("Game list is up-to-date")
 
-    def load_table(self):
-        """Load the game table, disable things until we're done"""
+        return self.end_index_load()
 
-        self.ui.centralwidget.setEnabled(False)
+    @Slot(int, object, str, bool)
+    def finish_index_load(
+        self,
+        load_id,
+        new_game_dict,
+        index_hash,
+        complete,
+    ):
+        """Put the fresh index into the table
 
-        # Save and load the config
-        self.save_config()
-        self.load_config()
+        Args:
+            load_id (int): ID of the index load
+            new_game_dict (dict): Game dictionary from the fresh index
+            index_hash (str): Hash of the index page
+            complete (bool): Whether we got the full index
+        """
 
-        self.game_dict = {}
-        self.get_game_dict()
-
-        # Clear out the old table and search bar
-        self.search_bar.clear()
-        self.game_table.setRowCount(0)
-
-        # Add rows to the game dict
-        for name in self.game_dict:
-            row = add_row_to_table(self.game_table, self.game_dict[name])
-            self.game_dict[name].update(
-                {
-                    "row": row,
-                }
-            )
+        if not self.is_current_index_load(load_id):
+            return False
+
+        if len(self.game_dict) == 0:
+            self.game_dict = new_game_dict
+            self.new_games = set()
 
-        # If in cache, check the row here
-        for cache_item in self.user_cache:
-            found_cache_item = False
+        # Only apply the changes if we've got the full index, else
+        # we'd remove everything we didn't manage to get
+        elif complete:
+            delta = get_game_dict_delta(self.game_dict, new_game_dict)
+            self.apply_game_dict_delta(new_game_dict, delta)
 
-            cache_item_path = urlparse(cache_item).path
+        if complete:
+            self.game_index_hash = index_hash
 
-            for r in range(self.game_table.rowCount()):
+        return self.end_index_load()
 
-                table_item_path = urlparse(self.game_table.item(r, 0).toolTip()).path
+    def end_index_load(self):
+        """Tidy up the table once the index load is done"""
 
-                if table_item_path == cache_item_path:
-                    self.game_table.item(r, 1).setCheckState(Qt.CheckState.Checked)
-                    found_cache_item = True
-                    break
+        self.game_table.setSortingEnabled(True)
+        self.update_display()
 
-            if found_cache_item:
-                continue
+        self.ui.labelProgressBar.setText("")
+        self.ui.pushButtonRun.setEnabled(True)
 
-        self.ui.centralwidget.setEnabled(True)
+        self.index_loading = False
+
+        return True
+
+    def apply_game_dict_delta(
+        self,
+        new_game_dict,
+        delta,
+    ):
+        """Apply changes in the game index to the table
+
+        Args:
+            new_game_dict (dict): New game dictionary
+            delta (dict): Changes between the current and new game
+                dictionaries, from get_game_dict_delta
+        """
+
+        n_changes = len(delta["added"]) + len(delta["removed"]) + len(delta["changed"])
+        self.logger.info(
+            f"Game list refreshed: {len(delta['added'])} added, "
+            f"{len(delta['removed'])} removed, "
+            f"{len(delta['changed'])} changed"
+        )
+
+        # If nothing's changed, leave the table as it is
+        if n_changes == 0:
+            self.game_dict = new_game_dict
+            return True
+
+        # Only touch the rows that have changed. Games we already had keep their
+        # DL state, and new ones are checked if they're in the cache
+        self.game_model.apply_changes(
+            added=[new_game_dict[url] for url in delta["added"]],
+            removed=delta["removed"],
+            changed=[new_game_dict[url] for _, url in delta["changed"]],
+            checked_paths=self.user_cache_paths,
+        )
+
+        self.game_dict = new_game_dict
+
+        # We've got new things, so keep track of them here
+        self.new_games = set(get_url_path(url) for url in delta["added"])
+
+        return True
 
     def load_config(
         self,
@@ -429,15 +711,10 @@ class MainWindow(QMainWindow):
         # Get a list of things to download
         to_download = {}
 
-        for r in range(self.game_table.rowCount()):
-            if self.game_table.item(r, 1).checkState() == Qt.CheckState.Checked:
-
-                url = self.game_table.item(r, 0).toolTip()
-
-                for g in self.game_dict:
-                    if self.game_dict[g]["url"] == url:
-                        n = self.game_dict[g]["short_name"]
-                        to_download.update({n: url})
+        for url in self.game_model.get_checked_urls():
+            game = self.game_dict.get(url, None)
+            if game is not None:
+                to_download.update({game["short_name"]: url})
 
         # Set up everything so the GUI doesn't hang
         self.nxbrew_thread = QThread()
@@ -482,6 +759,11 @@ class MainWindow(QMainWindow):
             self.logger.info("Closing down. Will save config")
             self.save_config()
 
+        self.cancel_index_load(wait=True)
+
+        # Write out anything the HTTP cache has been holding on to
+        get_http_cache().flush()
+
         event.accept()
 
     def enable_disable_ui(self, mode="disable"):
@@ -526,6 +808,188 @@ class MainWindow(QMainWindow):
         return True
 
 
+class GameIndexWorker(QObject):
+    """Gets the game index in the background, so the GUI doesn't hang"""
+
+    games_found = Signal(int, object)
+    progress = Signal(int, int)
+    index_loaded = Signal(int, object, str, bool)
+    index_unchanged = Signal(int)
+    finished = Signal()
+
+    def __init__(
+        self,
+        load_id,
+        general_config,
+        regex_config,
+        user_config,
+        game_index_file=None,
+        index_hash=None,
+        config_hash="",
+        batch_size=100,
+        logger=None,
+    ):
+        """Initialise the game index loader
+
+        Args:
+            load_id (int): ID for this load, sent back with the results
+            general_config (dict): Dictionary of general configuration
+            regex_config (dict): Dictionary of regex configuration
+            user_config (dict): Dictionary of user configuration
+            game_index_file (str): If set, will save a snapshot of the
+                full index here once it's in. Defaults to None
+            index_hash (str): Hash of the index page we already have.
+                If the page comes back from the HTTP cache with this
+                hash, it isn't parsed again. Defaults to None
+            config_hash (str): Hash of the config used to parse the
+                index, saved in the snapshot. Defaults to ""
+            batch_size (int): Number of games to send back to the GUI at
+                once. Defaults to 100
+            logger (logging.Logger): Logger instance. Defaults to None
+        """
+        super().__init__()
+
+        self.load_id = load_id
+        self.general_config = general_config
+        self.regex_config = regex_config
+        self.nxbrew_url = user_config.get("nxbrew_url", "")
+        self.game_index_file = game_index_file
+        self.index_hash = index_hash
+        self.config_hash = config_hash
+        self.batch_size = batch_size
+        self.logger = logger
+
+        # Set from the GUI thread, and checked between games
+        self.cancelled = threading.Event()
+
+        # Response for the index, so it can be aborted when cancelling
+        self.response = None
+        self.response_lock = threading.Lock()
+
+        self.game_dict_complete = False
+        self.index_changed = True
+
+    def cancel(self):
+        """Stop loading, and don't send anything else back
+
+        If we're part way through reading the index, the request is
+        aborted so the read returns straight away rather than when it
+        times out
+        """
+
+        with self.response_lock:
+            self.cancelled.set()
+            if self.response is not None:
+                abort_response(self.response)
+
+    def get_game_dict(self):
+        """Get game dictionary from NXBrew A-Z page
+
+        This streams the index, so games are yielded as they're parsed.
+        If everything is parsed successfully, will set game_dict_complete
+        to True. If the index hasn't changed since we last parsed it,
+        nothing is yielded and index_changed is set to False
+        """
+
+        self.game_dict_complete = False
+        self.index_changed = True
+
+        if "nxbrew" not in self.nxbrew_url:
+            self.logger.warning(
+                "NXBrew URL not found. Enter one and refresh the game list!"
+            )
+            return
+
+        # Problems with the URL itself will show up as soon as we ask for the index
+        try:
+            response = open_game_index(self.nxbrew_url, cache=True)
+
+            # If we've been cancelled while waiting for the response, stop here
+            with self.response_lock:
+                if self.cancelled.is_set():
+                    response.close()
+                    return
+                self.response = response
+
+            # If the index has been revalidated against the cache and we've already
+            # parsed it, then we're done
+            if response.from_cache and self.index_hash is not None:
+                if get_content_hash(response.content) == self.index_hash:
+                    response.close()
+                    self.index_changed = False
+                    self.game_dict_complete = True
+                    return
+
+            for game in iter_game_index(
+                general_config=self.general_config,
+                regex_config=self.regex_config,
+                nxbrew_url=self.nxbrew_url,
+                response=response,
+            ):
+                yield game
+
+            self.index_hash = get_content_hash(response.content)
+        except (requests.exceptions.SSLError, requests.exceptions.MissingSchema) as e:
+            self.logger.warning(
+                "Error found in NXBrew URL! Enter one that works and refresh the game list!"
+            )
+            return
+        except Exception as e:
+            # Aborting the request on cancel will end up here, but that's expected
+            if not self.cancelled.is_set():
+                self.logger.warning(
+                    "Error found retreiving game list, try another URL"
+                )
+            return
+
+        self.game_dict_complete = True
+
+    def run(self):
+        """Get the game index, sending games back in batches"""
+
+        new_game_dict = {}
+        games = []
+
+        game_iter = self.get_game_dict()
+        for game in game_iter:
+            if self.cancelled.is_set():
+                game_iter.close()
+                break
+
+            new_game_dict[game["url"]] = game
+            games.append(game)
+
+            if len(games) == self.batch_size:
+                self.games_found.emit(self.load_id, games)
+                self.progress.emit(self.load_id, len(new_game_dict))
+                games = []
+
+        if not self.cancelled.is_set() and not self.index_changed:
+            self.index_unchanged.emit(self.load_id)
+
+        elif not self.cancelled.is_set():
+            if len(games) > 0:
+                self.games_found.emit(self.load_id, games)
+                self.progress.emit(self.load_id, len(new_game_dict))
+
+            if self.game_dict_complete and self.game_index_file is not None:
+                save_index_snapshot(
+                    new_game_dict,
+                    self.game_index_file,
+                    index_hash=self.index_hash,
+                    config_hash=self.config_hash,
+                )
+
+            self.index_loaded.emit(
+                self.load_id,
+                new_game_dict,
+                self.index_hash or "",
+                self.game_dict_complete,
+            )
+
+        self.finished.emit()
+
+
 class NXBrewWorker(QObject):
     """Handles running NXBrew so GUI doesn't hang"""
 
@@ -559,7 +1023,7 @@ class NXBrewWorker(QObject):
                 Defaults to None, which will load in from expected path
             user_config (dict): Dictionary of user configuration.
                 Defaults to None, which will load in from expected path
-            user_cache (dict): Dictionary of user cache configuration.
+            user_cache (UserCache): User cache, shared with the GUI.
                 Defaults to None, which will load in from expected path
             logger (logging.Logger): Logger instance. Defaults to None,
                 which will set up its own logger
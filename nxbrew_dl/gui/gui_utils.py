@@ -2,8 +2,6 @@ from PySide6.QtCore import Slot, Qt
 from PySide6.QtGui import QDesktopServices
 from PySide6.QtWidgets import QListWidgetItem
 
-from ..gui.custom_widgets import TableRowWidget
-
 
 @Slot()
 def open_url(url):
@@ -12,36 +10,6 @@ def open_url(url):
     QDesktopServices.openUrl(url)
 
 
-def add_row_to_table(
-        table,
-        row_dict,
-        row_name_key="long_name",
-):
-    """Add row to table, using a dictionary of important info
-
-    Args:
-        table (QTableWidget): Table to add row to
-        row_dict (dict): Dictionary of data for the row
-        row_name_key (str): Key used to identify the name for the row.
-            Defaults to "long_name"
-    """
-
-    row_position = table.rowCount()
-
-    table.insertRow(row_position)
-
-    row = TableRowWidget(
-        row_dict,
-        row_name_key=row_name_key,
-    )
-    row.setup_row(
-        table=table,
-        row_position=row_position,
-    )
-
-    return row
-
-
 def add_item_to_list(item_list, item_name, check_state=None):
     """Add item to list widget, optionally setting a check state
 
@@ -20,8 +20,8 @@ from PySide6.QtWidgets import (QAbstractItemView, QAbstractScrollArea, QApplicat
     QCheckBox, QFrame, QHBoxLayout, QHeaderView,
     QLabel, QLineEdit, QMainWindow, QMenu,
     QMenuBar, QProgressBar, QPushButton, QRadioButton,
-    QSizePolicy, QSpacerItem, QStatusBar, QTableWidget,
-    QTableWidgetItem, QVBoxLayout, QWidget)
+    QSizePolicy, QSpacerItem, QStatusBar, QTableView,
+    QVBoxLayout, QWidget)
 
 class Ui_nxbrew_dl(object):
     def setupUi(self, nxbrew_dl):
@@ -273,6 +273,12 @@ class Ui_nxbrew_dl(object):
 
         self.horizontalLayoutSearch.addItem(self.horizontalSpacer_2)
 
+        self.checkBoxNewOnly = QCheckBox(self.centralwidget)
+        self.checkBoxNewOnly.setObjectName(u"checkBoxNewOnly")
+        self.checkBoxNewOnly.setChecked(False)
+
+        self.horizontalLayoutSearch.addWidget(self.checkBoxNewOnly)
+
         self.pushButtonRefresh = QPushButton(self.centralwidget)
         self.pushButtonRefresh.setObjectName(u"pushButtonRefresh")
         icon3 = QIcon(QIcon.fromTheme(u"view-refresh"))
@@ -283,21 +289,7 @@ class Ui_nxbrew_dl(object):
 
         self.verticalLayoutGames.addLayout(self.horizontalLayoutSearch)
 
-        self.tableGames = QTableWidget(self.centralwidget)
-        if (self.tableGames.columnCount() < 6):
-            self.tableGames.setColumnCount(6)
-        __qtablewidgetitem = QTableWidgetItem()
-        self.tableGames.setHorizontalHeaderItem(0, __qtablewidgetitem)
-        __qtablewidgetitem1 = QTableWidgetItem()
-        self.tableGames.setHorizontalHeaderItem(1, __qtablewidgetitem1)
-        __qtablewidgetitem2 = QTableWidgetItem()
-        self.tableGames.setHorizontalHeaderItem(2, __qtablewidgetitem2)
-        __qtablewidgetitem3 = QTableWidgetItem()
-        self.tableGames.setHorizontalHeaderItem(3, __qtablewidgetitem3)
-        __qtablewidgetitem4 = QTableWidgetItem()
-        self.tableGames.setHorizontalHeaderItem(4, __qtablewidgetitem4)
-        __qtablewidgetitem5 = QTableWidgetItem()
-        self.tableGames.setHorizontalHeaderItem(5, __qtablewidgetitem5)
+        self.tableGames = QTableView(self.centralwidget)
         self.tableGames.setObjectName(u"tableGames")
         sizePolicy3 = QSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
         sizePolicy3.setHorizontalStretch(0)
@@ -469,37 +461,11 @@ class Ui_nxbrew_dl(object):
 #endif // QT_CONFIG(statustip)
         self.lineEditDiscordURL.setText("")
         self.labelSearch.setText(QCoreApplication.translate("nxbrew_dl", u"Search:", None))
+#if QT_CONFIG(statustip)
+        self.checkBoxNewOnly.setStatusTip(QCoreApplication.translate("nxbrew_dl", u"If checked, will only show games added since the last refresh", None))
+#endif // QT_CONFIG(statustip)
+        self.checkBoxNewOnly.setText(QCoreApplication.translate("nxbrew_dl", u"New Only", None))
         self.pushButtonRefresh.setText(QCoreApplication.translate("nxbrew_dl", u"Refresh", None))
-        ___qtablewidgetitem = self.tableGames.horizontalHeaderItem(0)
-        ___qtablewidgetitem.setText(QCoreApplication.translate("nxbrew_dl", u"Name", None));
-#if QT_CONFIG(tooltip)
-        ___qtablewidgetitem.setToolTip(QCoreApplication.translate("nxbrew_dl", u"Game Name (double-click to open URL)", None));
-#endif // QT_CONFIG(tooltip)
-        ___qtablewidgetitem1 = self.tableGames.horizontalHeaderItem(1)
-        ___qtablewidgetitem1.setText(QCoreApplication.translate("nxbrew_dl", u"DL?", None));
-#if QT_CONFIG(tooltip)
-        ___qtablewidgetitem1.setToolTip(QCoreApplication.translate("nxbrew_dl", u"Download Game?", None));
-#endif // QT_CONFIG(tooltip)
-        ___qtablewidgetitem2 = self.tableGames.horizontalHeaderItem(2)
-        ___qtablewidgetitem2.setText(QCoreApplication.translate("nxbrew_dl", u"NSP", None));
-#if QT_CONFIG(tooltip)
-        ___qtablewidgetitem2.setToolTip(QCoreApplication.translate("nxbrew_dl", u"Game has NSP", None));
-#endif // QT_CONFIG(tooltip)
-        ___qtablewidgetitem3 = self.tableGames.horizontalHeaderItem(3)
-        ___qtablewidgetitem3.setText(QCoreApplication.translate("nxbrew_dl", u"XCI", None));
-#if QT_CONFIG(tooltip)
-        ___qtablewidgetitem3.setToolTip(QCoreApplication.translate("nxbrew_dl", u"Game has XCI", None));
-#endif // QT_CONFIG(tooltip)
-        ___qtablewidgetitem4 = self.tableGames.horizontalHeaderItem(4)
-        ___qtablewidgetitem4.setText(QCoreApplication.translate("nxbrew_dl", u"Updates", None));
-#if QT_CONFIG(tooltip)
-        ___qtablewidgetitem4.setToolTip(QCoreApplication.translate("nxbrew_dl", u"Game has Updates", None));
-#endif // QT_CONFIG(tooltip)
-        ___qtablewidgetitem5 = self.tableGames.horizontalHeaderItem(5)
-        ___qtablewidgetitem5.setText(QCoreApplication.translate("nxbrew_dl", u"DLC", None));
-#if QT_CONFIG(tooltip)
-        ___qtablewidgetitem5.setToolTip(QCoreApplication.translate("nxbrew_dl", u"Game has DLC", None));
-#endif // QT_CONFIG(tooltip)
         self.labelProgressBar.setText("")
         self.progressBar.setFormat(QCoreApplication.translate("nxbrew_dl", u"%p%", None))
 #if QT_CONFIG(statustip)
@@ -1,5 +1,26 @@
-from .nxbrew import NXBrew
+import importlib
 
-__all__ = [
-    "NXBrew",
-]
+# The downloader pulls in numpy and friends, so only import things as they're used
+MODULES = {
+    "NXBrew": "nxbrew",
+    "SyncDaemon": "sync_daemon",
+}
+
+__all__ = list(MODULES)
+
+
+def __getattr__(name):
+
+    if name not in MODULES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    module = importlib.import_module(f".{MODULES[name]}", __name__)
+    value = getattr(module, name)
+
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -1,26 +1,28 @@
-import copy
 import os
 import shutil
-import time
-from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
-import myjdapi
 import numpy as np
 from pathvalidate import sanitize_filename
 
 import nxbrew_dl
 from ..util import (
     NXBrewLogger,
+    BufferedLogger,
+    JDScheduler,
+    UserCache,
     discord_push,
     load_yml,
-    load_json,
-    save_json,
-    get_html_page,
+    get_http_cache,
+    get_http_client,
+    get_content_hash,
+    get_config_hash,
+    get_html_content,
+    parse_html,
     get_languages,
     get_thumb_url,
     get_dl_dict,
-    bypass_ouo,
-    bypass_1link,
 )
 
 
@@ -67,6 +69,7 @@ class NXBrew:
         user_config=None,
         user_cache=None,
         logger=None,
+        jd_device=None,
     ):
         """Handles downloading files
 
@@ -85,8 +88,14 @@ class NXBrew:
             general_config (dict): Dictionary for default configuration
             regex_config (dict): Dictionary for regex configuration
             user_config (dict): Dictionary for user configuration
-            user_cache (dict): Cache dictionary
+            user_cache (UserCache): User cache. If None, will open the
+                one in the current directory
             logger (logging.logger): Logger instance. If None, will set up a new one
+            jd_device: JDownloader device to send downloads to. Defaults to
+                None, which will connect to MyJDownloader using the details
+                in the user config, once the first package is queued. Anything with the same linkgrabber and
+                downloads calls can be used here, e.g. the FakeJDDevice in
+                the tests for running without JDownloader
         """
 
         # Load in various config files, if they're not already loaded
@@ -103,6 +112,25 @@ class NXBrew:
             regex_config = load_yml(regex_config_filename)
         self.regex_config = regex_config
 
+        # Shared, pooled client for all the site requests
+        self.http_client = get_http_client(self.general_config.get("http", None))
+
+        # Cache for pages and parsed pages. Parsing depends on the code as well
+        # as the config, so include the version in the hash
+        self.http_cache = get_http_cache()
+        self.parse_config_hash = get_config_hash(
+            {
+                "version": nxbrew_dl.__version__,
+                "html_parser": self.general_config.get("html_parser", "html.parser"),
+                "dl_sites": self.general_config["dl_sites"],
+                "dl_mappings": self.dl_mappings,
+                "regions": self.general_config["regions"],
+                "regionless_titles": self.general_config["regionless_titles"],
+                "languages": self.general_config["languages"],
+                "implied_languages": self.general_config["implied_languages"],
+            }
+        )
+
         # Read in the user config
         user_config_file = os.path.join(os.getcwd(), "config.yml")
         if user_config is None:
@@ -119,21 +147,58 @@ class NXBrew:
         self.region_prefs.insert(0, "All")
         self.language_prefs.insert(0, "All")
 
-        # Read in user cache, keeping the filename around so we can save it out later
-        user_cache_file = os.path.join(os.getcwd(), "cache.json")
+        # Read in user cache
         if user_cache is None:
-            if os.path.exists(user_cache_file):
-                user_cache = load_json(user_cache_file)
-            else:
-                user_cache = {}
+            user_cache = UserCache()
         self.user_cache = user_cache
-        self.user_cache_file = user_cache_file
 
         if logger is None:
             logger = NXBrewLogger(log_level="INFO")
         self.logger = logger
 
-        # Set up JDownloader
+        # JDownloader is only connected to once there's something to download
+        self.jd_device = jd_device
+        self.jd_scheduler = None
+
+        # Discord stuff
+        discord_url = self.user_config.get("discord_url", "")
+        if discord_url == "":
+            discord_url = None
+        self.discord_url = discord_url
+
+        self.to_download = to_download
+        self.progress_bar = progress_bar
+        self.progress_bar_label = progress_bar_label
+        self.update_progressBar = update_progressBar
+
+        self.dry_run = self.user_config.get("dry_run", False)
+
+        # Anything that changes which files we'd pick for a game
+        self.prefs_hash = get_config_hash(
+            {
+                "regions": self.region_prefs,
+                "languages": self.language_prefs,
+                "prefer_filetype": self.user_config.get("prefer_filetype", None),
+                "download_update": self.user_config.get("download_update", None),
+                "download_dlc": self.user_config.get("download_dlc", None),
+            }
+        )
+
+        # How many games ahead to fetch and resolve while downloading
+        self.prefetch_window = self.general_config.get("prefetch_window", 0)
+
+        # Game pages we've already got, by URL, so they aren't fetched again
+        self.page_contents = {}
+
+        # Packages sent off to JDownloader for each game, by name
+        self.game_packages = {}
+
+    def connect_jdownloader(self):
+        """Connect to JDownloader, through MyJDownloader"""
+
+        # Only pull this in if we're actually talking to JDownloader
+        import myjdapi
+
         self.logger.info("Connecting to JDownloader")
         jd = myjdapi.Myjdapi()
         jd.set_app_key("nxbrewdl")
@@ -146,25 +211,58 @@ class NXBrew:
         self.logger.update_redact_filter(jd_device_name)
 
         self.logger.info(f"Connecting to device {jd_device_name}")
-        self.jd_device = jd.get_device(jd_device_name)
+        jd_device = jd.get_device(jd_device_name)
 
-        # Discord stuff
-        discord_url = self.user_config.get("discord_url", "")
-        if discord_url == "":
-            discord_url = None
-        self.discord_url = discord_url
+        return jd_device
 
-        self.to_download = to_download
-        self.progress_bar = progress_bar
-        self.progress_bar_label = progress_bar_label
-        self.update_progressBar = update_progressBar
+    def get_jd_scheduler(self):
+        """Get the JDownloader scheduler, connecting to JDownloader the first time"""
 
-        self.dry_run = self.user_config.get("dry_run", False)
+        if self.jd_scheduler is None:
+            if self.jd_device is None:
+                self.jd_device = self.connect_jdownloader()
 
-    def run(self):
-        """Run NXBrew-dl"""
+            # Keep a number of packages going through JDownloader at once
+            self.jd_scheduler = JDScheduler(
+                jd_device=self.jd_device,
+                general_config=self.general_config,
+                logger=self.logger,
+            )
 
-        n_downloads = len(self.to_download)
+        return self.jd_scheduler
+
+    def run(
+        self,
+        names=None,
+        page_contents=None,
+        remove_games=True,
+    ):
+        """Run NXBrew-dl
+
+        Returns the names of any games that had a download fail or get
+        stuck, since these aren't finished and need another go
+
+        Args:
+            names (list): Names of the games to process. Everything in
+                to_download still counts as selected when cleaning up the
+                cache. Defaults to None, which will process everything in
+                to_download
+            page_contents (dict): Game pages we've already got, by URL,
+                so they don't need to be fetched again. Defaults to None
+            remove_games (bool): Whether to remove games that are no
+                longer selected from the cache and disk. Defaults to True
+        """
+
+        if names is None:
+            names = list(self.to_download.keys())
+
+        if page_contents is not None:
+            self.page_contents.update(page_contents)
+
+        # Packages sent off to JDownloader for each game, by name
+        self.game_packages = {}
+
+        n_downloads = len(names)
 
         if self.progress_bar is not None:
             # Reset progress bar to 0
@@ -175,45 +273,240 @@ class NXBrew:
         self.logger.info(f"{' ' * 30}STARTING NXBREW-DL{' ' * 30}")
         self.logger.info(f"=" * 80)
 
-        for i_name, name in enumerate(self.to_download):
+        # Pages for the next few games are fetched and resolved in the background,
+        # while the current one downloads
+        prefetch_pool = None
+        prefetched = {}
+        if self.prefetch_window > 0:
+            prefetch_pool = ThreadPoolExecutor(max_workers=self.prefetch_window)
 
-            progress_val = 100 * (i_name + 1) / n_downloads
+        try:
+            for i_name, name in enumerate(names):
 
-            url = self.to_download[name]
+                progress_val = 100 * (i_name + 1) / n_downloads
 
-            if self.progress_bar is not None:
-                self.progress_bar_label.setText(f"{i_name + 1}/{n_downloads}: {name}")
+                url = self.to_download[name]
 
+                if prefetch_pool is not None:
+                    for j_name in range(i_name, i_name + self.prefetch_window + 1):
+                        if j_name >= n_downloads or j_name in prefetched:
+                            continue
+                        prefetched[j_name] = prefetch_pool.submit(
+                            self.prefetch_game,
+                            url=self.to_download[names[j_name]],
+                        )
+
+                if self.progress_bar is not None:
+                    self.progress_bar_label.setText(
+                        f"{i_name + 1}/{n_downloads}: {name}"
+                    )
+
+                self.logger.info("")
+                self.logger.info(f"=" * 80)
+                self.logger.info(f"Starting download for: {name}")
+                self.logger.info("")
+                self.download_game(
+                    name=name,
+                    url=url,
+                    prefetched=prefetched.pop(i_name, None),
+                )
+                self.logger.info(f"=" * 80)
+                self.logger.info("")
+
+                if self.progress_bar is not None:
+                    # Reset progress bar to 0
+                    self.update_progressBar.emit(progress_val)
+
+        finally:
+            # Don't start on anything new if we've bailed out
+            if prefetch_pool is not None:
+                prefetch_pool.shutdown(wait=True, cancel_futures=True)
+
+            # Don't hold on to pages we didn't get to
+            self.page_contents = {}
+
+        # Wait for anything still downloading. If nothing was queued, we never
+        # connected to JDownloader and there's nothing to wait for
+        unfinished_games = []
+        if self.jd_scheduler is not None:
+            self.logger.info("Waiting for remaining downloads to finish")
+            self.jd_scheduler.wait_all()
             self.logger.info("")
-            self.logger.info(f"=" * 80)
-            self.logger.info(f"Starting download for: {name}")
-            self.logger.info("")
-            self.download_game(
-                name=name,
-                url=url,
+
+            # Flag up anything that couldn't be downloaded. These will be tried
+            # again next time
+            if len(self.jd_scheduler.failed_packages) > 0:
+                self.logger.warning("Some downloads failed, and will be retried:")
+                for package in self.jd_scheduler.failed_packages:
+                    self.logger.warning(f"\t{package.package_name}")
+                self.logger.info("")
+
+            # Flag up anything that got stuck, so it can be sorted out by hand
+            if len(self.jd_scheduler.stuck_packages) > 0:
+                self.logger.warning(
+                    "Some downloads got stuck, and were left in JDownloader:"
+                )
+                for package in self.jd_scheduler.stuck_packages:
+                    self.logger.warning(f"\t{package.package_name} ({package.state})")
+                self.logger.info("")
+
+            unfinished_packages = (
+                self.jd_scheduler.failed_packages + self.jd_scheduler.stuck_packages
             )
-            self.logger.info(f"=" * 80)
-            self.logger.info("")
+            for name, packages in self.game_packages.items():
+                if any([p in unfinished_packages for p in packages]):
+                    unfinished_games.append(name)
 
-            if self.progress_bar is not None:
-                # Reset progress bar to 0
-                self.update_progressBar.emit(progress_val)
+            # The scheduler can be kept between runs, so only report these once
+            self.jd_scheduler.failed_packages = []
+            self.jd_scheduler.stuck_packages = []
 
         # Clean up
         self.logger.info("Performing final cache/disk clean up")
         self.logger.info("")
 
-        self.clean_up_cache()
+        self.clean_up_cache(remove_games=remove_games)
 
         self.logger.info("All done!")
         self.logger.info("")
 
-        return True
+        return unfinished_games
+
+    def plan(
+        self,
+        max_workers=None,
+    ):
+        """Work out what would be downloaded for every game, without downloading anything
+
+        This is just fetching and parsing the game pages, so nothing is
+        sent to (or connects to) JDownloader. Every game is resolved in
+        full, even if it's already been downloaded, and each file is
+        flagged with whether it's already in the cache. Returns a
+        dictionary of the plan for each game, by name
+
+        Args:
+            max_workers (int): Number of game pages to fetch at once.
+                Defaults to None, which will use the prefetch window
+        """
+
+        if max_workers is None:
+            max_workers = max(self.prefetch_window, 1)
+
+        names = list(self.to_download.keys())
+
+        self.logger.info("")
+        self.logger.info(f"=" * 80)
+        self.logger.info(f"{' ' * 30}PLANNING NXBREW-DL{' ' * 30}")
+        self.logger.info(f"=" * 80)
+
+        game_plans = {}
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            prefetched = [
+                pool.submit(
+                    self.prefetch_game,
+                    url=self.to_download[name],
+                    check_fingerprint=False,
+                )
+                for name in names
+            ]
+
+            for name, future in zip(names, prefetched):
+
+                url = self.to_download[name]
+
+                self.logger.info("")
+                self.logger.info(f"=" * 80)
+                self.logger.info(f"Planning download for: {name}")
+                self.logger.info("")
+
+                # One bad page shouldn't stop us planning everything else
+                try:
+                    resolved = self.get_prefetched_game(future)
+                except Exception as e:
+                    self.logger.warning(f"Could not plan {name}: {e}")
+                    game_plans[name] = {"url": url, "error": str(e)}
+                    continue
+
+                game_plans[name] = self.get_game_plan(
+                    url=url,
+                    resolved=resolved,
+                )
+
+                self.logger.info(f"=" * 80)
+
+        self.logger.info("")
+        self.logger.info("All done!")
+        self.logger.info("")
+
+        return game_plans
+
+    def get_game_plan(
+        self,
+        url,
+        resolved,
+    ):
+        """Get the plan for a single resolved game
+
+        Args:
+            url (str): URL for the game
+            resolved (tuple): Output from resolve_game. If None, there's
+                no suitable release
+        """
+
+        game_plan = {
+            "url": url,
+            "release": None,
+            "files": [],
+        }
+
+        if resolved is None:
+            return game_plan
+        thumb_url, dl_dict, fingerprint = resolved
+
+        game_plan["release"] = {
+            "regions": dl_dict["regions"],
+            "languages": dl_dict["languages"],
+        }
+
+        cache_entry = self.get_cache_entry(url)
+        if cache_entry is None:
+            cache_entry = {}
+
+        for dl_mapping in self.dl_mappings:
+            for dl_key in self.dl_mappings[dl_mapping]["dl_tags"]:
+
+                dl_key_clean = self.dl_mappings[dl_mapping]["dl_tags"][dl_key][
+                    "dl_name_mapping"
+                ]
+
+                for dl_info in dl_dict.get(dl_key, []):
+                    mirrors = {
+                        dl_site: dl_info[dl_site]
+                        for dl_site in self.general_config["dl_sites"]
+                        if dl_site in dl_info
+                    }
+
+                    game_plan["files"].append(
+                        {
+                            "type": dl_key_clean,
+                            "full_name": dl_info["full_name"],
+                            "directory": self.dl_mappings[dl_mapping][
+                                "directory_name"
+                            ],
+                            "downloaded": dl_info["full_name"]
+                            in cache_entry.get(dl_key, []),
+                            "mirrors": mirrors,
+                        }
+                    )
+
+        return game_plan
 
     def download_game(
         self,
         name,
         url,
+        prefetched=None,
     ):
         """Download game given URL
 
@@ -225,30 +518,177 @@ class NXBrew:
         Args:
             name (str): Name of game to download
             url (str): URL to download
+            prefetched (concurrent.futures.Future): If the game has
+                been resolved in the background, the future for that.
+                Defaults to None, which will resolve it here
         """
 
-        # Get the soup
-        soup = get_html_page(
-            url,
-            cache_filename="game.html",
-        )
+        # Find the release we want, unless that's already been done in the background
+        if prefetched is None:
+            resolved = self.resolve_game(
+                url=url,
+            )
+        else:
+            resolved = self.get_prefetched_game(prefetched)
 
-        # Get thumbnail URL
-        thumb_url = get_thumb_url(
-            soup,
-        )
+        if resolved is None:
+            return False
+        thumb_url, dl_dict, fingerprint = resolved
 
-        # Get languages
-        langs = get_languages(
-            soup,
-            lang_dict=self.general_config["languages"],
-        )
+        if self.dry_run:
+            self.logger.info("Dry run, will not download anything")
+            return True
+
+        # If we've updated URLs, check for that here and update as appropriate
+        if url not in self.user_cache:
+            cache_url = self.user_cache.find_url(url)
+            if cache_url is not None:
+                self.user_cache.move(cache_url, url)
+
+        def update_cache_entry(entry):
+
+            # Add unique URL to cache if it's not already there
+            if entry is None:
+                self.logger.debug(f"Adding {name} to cache")
+                entry = {"name": name}
+
+            # Add thumbnail URL to cache if it's not already there, or potentially update
+            if "thumb_url" not in entry:
+                self.logger.debug("Adding thumbnail URL to cache")
+                entry["thumb_url"] = thumb_url
+            if entry["thumb_url"] != thumb_url:
+                self.logger.debug("Updating thumbnail URL")
+                entry["thumb_url"] = thumb_url
+
+            # Make sure there's somewhere to record downloads
+            for dl_mapping in self.dl_mappings:
+                for dl_key in self.dl_mappings[dl_mapping]["dl_tags"]:
+                    if dl_key in dl_dict and dl_key not in entry:
+                        entry[dl_key] = []
+
+            return entry
+
+        cache_entry = self.user_cache.update(url, update_cache_entry)
+
+        # Hooray! We're finally ready to start downloading. Map things to folder and let's get going
+        self.logger.info("Beginning download process:")
+
+        # Downloads finish in the background, so keep track of what's already queued
+        queued = []
+
+        # Everything we want for this game. Once it's all downloaded, we can skip
+        # the game until something changes
+        wanted = []
+        for dl_mapping in self.dl_mappings:
+            for dl_key in self.dl_mappings[dl_mapping]["dl_tags"]:
+                for dl_info in dl_dict.get(dl_key, []):
+                    wanted.append((dl_key, dl_info["full_name"]))
+
+        for dl_mapping in self.dl_mappings:
+            dl_dir = self.dl_mappings[dl_mapping]["directory_name"]
+
+            for dl_key in self.dl_mappings[dl_mapping]["dl_tags"]:
+
+                # If we don't have anything to download, skip
+                if dl_key not in dl_dict:
+                    continue
+
+                dl_key_clean = self.dl_mappings[dl_mapping]["dl_tags"][dl_key][
+                    "dl_name_mapping"
+                ]
+
+                # Loop over items in the list
+                for dl_info in dl_dict[dl_key]:
+
+                    if dl_info["full_name"] in cache_entry[dl_key]:
+                        self.logger.info(
+                            f"\t{dl_key_clean}: {dl_info['full_name']} already downloaded. Will skip"
+                        )
+                    elif (dl_key, dl_info["full_name"]) in queued:
+                        self.logger.info(
+                            f"\t{dl_key_clean}: {dl_info['full_name']} already queued. Will skip"
+                        )
+                    else:
+                        self.logger.info(
+                            f"\tDownloading {dl_key_clean}: {dl_info['full_name']}"
+                        )
+                        out_dir = os.path.join(self.user_config["download_dir"], dl_dir)
+
+                        # Sanitize the package name so we're safe here
+                        package_name = sanitize_filename(name)
+
+                        # The cache and Discord get updated once this finishes
+                        package = self.get_jd_scheduler().submit(
+                            dl_dict=dl_info,
+                            out_dir=out_dir,
+                            package_name=package_name,
+                            on_complete=partial(
+                                self.complete_download,
+                                name=name,
+                                url=url,
+                                dl_key=dl_key,
+                                dl_key_clean=dl_key_clean,
+                                full_name=dl_info["full_name"],
+                                thumb_url=thumb_url,
+                                wanted=wanted,
+                                fingerprint=fingerprint,
+                            ),
+                        )
+                        if package is not None:
+                            self.game_packages.setdefault(name, []).append(package)
+                        queued.append((dl_key, dl_info["full_name"]))
+                        self.logger.info("")
+
+        self.logger.info("")
+        self.logger.info("All downloads queued")
+
+        # If we already had everything, the game's up-to-date now
+        self.update_fingerprint(url, wanted, fingerprint)
+
+        return True
+
+    def resolve_game(
+        self,
+        url,
+        logger=None,
+        check_fingerprint=True,
+    ):
+        """Get the page for a game and pick out the release to download
+
+        Will grab the HTML page, parse out files, then remove
+        based on region/language preferences. If we don't
+        want DLC/Updates it'll also remove them. Returns the
+        thumbnail URL, the chosen release and the fingerprint
+        for the game, or None if there's nothing suitable.
+
+        If everything was downloaded last time, and neither the
+        releases on the page nor our preferences have changed
+        since, then there's nothing to do and this returns None
+
+        Args:
+            url (str): URL for the game
+            logger (logging.logger): Logger to use. Defaults to None,
+                which will use the NXBrew logger
+            check_fingerprint (bool): Whether to skip the game if nothing
+                has changed since it was last downloaded. Defaults to True
+        """
+
+        if logger is None:
+            logger = self.logger
+
+        # Get the languages, thumbnail, and releases from the page
+        thumb_url, langs, dl_dict = self.parse_game_page(url, logger=logger)
         langs.sort()
 
-        self.logger.info(f"Found languages across all releases:")
+        fingerprint = self.get_fingerprint(langs, dl_dict)
+        if check_fingerprint and fingerprint == self.get_cached_fingerprint(url):
+            logger.info("Nothing has changed since this was last checked. Will skip")
+            return None
+
+        logger.info(f"Found languages across all releases:")
         for l in langs:
-            self.logger.info(f"\t{l}")
-        self.logger.info("")
+            logger.info(f"\t{l}")
+        logger.info("")
 
         # If the language we want isn't in here, then skip
         found_language = False
@@ -261,43 +701,32 @@ class NXBrew:
                 break
 
         if not found_language:
-            self.logger.warning(f"Did not find any requested language:")
+            logger.warning(f"Did not find any requested language:")
             for l in self.language_prefs:
-                self.logger.warning(f"\t{l}")
-            self.logger.warning("")
-            return False
+                logger.warning(f"\t{l}")
+            logger.warning("")
+
+            # There's nothing for us here until something changes
+            self.update_fingerprint(url, [], fingerprint)
+            return None
 
-        # Pull out useful things from the config
-        regions = list(self.general_config["regions"].keys())
-        regionless_titles = self.general_config["regionless_titles"]
-        languages = self.general_config["languages"]
-        implied_languages = self.general_config["implied_languages"]
         dl_sites = self.general_config["dl_sites"]
 
-        dl_dict = get_dl_dict(
-            soup,
-            regions=regions,
-            regionless_titles=regionless_titles,
-            languages=languages,
-            implied_languages=implied_languages,
-            dl_sites=dl_sites,
-            dl_mappings=self.dl_mappings,
-        )
         n_releases = len(dl_dict)
 
         if n_releases == 0:
             raise ValueError("No releases found")
 
-        self.logger.info(f"Found {n_releases} release(s):")
+        logger.info(f"Found {n_releases} release(s):")
 
         for release in dl_dict:
-            self.logger.info(f"\tRegion(s):")
+            logger.info(f"\tRegion(s):")
             for r in dl_dict[release]["regions"]:
-                self.logger.info(f"\t\t{r}")
+                logger.info(f"\t\t{r}")
 
-            self.logger.info(f"\tLanguages(s):")
+            logger.info(f"\tLanguages(s):")
             for l in dl_dict[release]["languages"]:
-                self.logger.info(f"\t\t{l}")
+                logger.info(f"\t\t{l}")
 
             # Loop over the various file types, and print out the links and associated
             # sites
@@ -310,20 +739,20 @@ class NXBrew:
                     ]
 
                     if any([key == dl_tag for key in dl_dict[release]]):
-                        self.logger.info(f"\t{clean_dl_name}:")
+                        logger.info(f"\t{clean_dl_name}:")
                         for release_dl in dl_dict[release][dl_tag]:
-                            self.logger.info(f"\t\t{release_dl['full_name']}:")
+                            logger.info(f"\t\t{release_dl['full_name']}:")
 
                             for dl_site in dl_sites:
                                 if dl_site in release_dl:
-                                    self.logger.info(f"\t\t\t{dl_site}:")
+                                    logger.info(f"\t\t\t{dl_site}:")
                                     for dl_link in release_dl[dl_site]:
                                         # Redact the DL link
-                                        self.logger.update_redact_filter(dl_link)
+                                        logger.update_redact_filter(dl_link)
 
-                                        self.logger.info(f"\t\t\t- {dl_link}")
+                                        logger.info(f"\t\t\t- {dl_link}")
 
-            self.logger.info("")
+            logger.info("")
 
         # Remove if it's not a region or language we want
 
@@ -354,14 +783,14 @@ class NXBrew:
                     releases_to_remove.append(release)
 
             if len(releases_to_remove) > 0:
-                self.logger.info(f"Removing unwanted release(s) based on {key}:")
+                logger.info(f"Removing unwanted release(s) based on {key}:")
                 for release in releases_to_remove:
-                    self.logger.info(f"\t{'/'.join(dl_dict[release]['regions'])}")
+                    logger.info(f"\t{'/'.join(dl_dict[release]['regions'])}")
                     dl_dict.pop(release)
-                self.logger.info("")
+                logger.info("")
 
         if len(dl_dict) > 1:
-            self.logger.info(
+            logger.info(
                 "Multiple suitable releases found. Will score to find most suitable"
             )
             best_release = self.get_dl_dict_score(dl_dict=dl_dict)
@@ -373,11 +802,11 @@ class NXBrew:
                     releases_to_remove.append(r)
 
             if len(releases_to_remove) > 0:
-                self.logger.info("Removing lower scored release(s):")
+                logger.info("Removing lower scored release(s):")
                 for release in releases_to_remove:
-                    self.logger.info(f"\t{'/'.join(dl_dict[release]['regions'])}")
+                    logger.info(f"\t{'/'.join(dl_dict[release]['regions'])}")
                     dl_dict.pop(release)
-                self.logger.info("")
+                logger.info("")
 
             # If we're still too long, then bug out
             if len(dl_dict) > 1:
@@ -386,145 +815,289 @@ class NXBrew:
                 )
 
         if len(dl_dict) == 0:
-            self.logger.warning(
+            logger.warning(
                 "No suitable releases found (consider changing language/region preferences). "
                 "Will skip"
             )
-            return False
+            self.update_fingerprint(url, [], fingerprint)
+            return None
 
         # Trim down to just one ROM
         release = list(dl_dict.keys())[0]
         dl_dict = dl_dict[release]
 
         if "base_game_nsp" in dl_dict and "base_game_xci" in dl_dict:
-            self.logger.info("Found both NSP and XCI:")
+            logger.info("Found both NSP and XCI:")
 
             if self.user_config["prefer_filetype"] == "NSP":
-                self.logger.info(f"\tRemoving XCI")
+                logger.info(f"\tRemoving XCI")
                 dl_dict.pop("base_game_xci")
             elif self.user_config["prefer_filetype"] == "XCI":
-                self.logger.info(f"\tRemoving NSP")
+                logger.info(f"\tRemoving NSP")
                 dl_dict.pop("base_game_nsp")
             else:
                 raise ValueError("Expecting preferred filetype to be one of NSP, XCI")
-            self.logger.info("")
+            logger.info("")
 
         if not self.user_config["download_dlc"]:
-            self.logger.info("Removing DLC")
+            logger.info("Removing DLC")
             removed_dict = dl_dict.pop("dlc", [])
 
             # If we've removed anything, say so here
             if len(removed_dict) > 0:
                 for r in removed_dict:
-                    self.logger.info(f"\t- {r['full_name']}")
+                    logger.info(f"\t- {r['full_name']}")
 
-            self.logger.info("")
+            logger.info("")
 
         if not self.user_config["download_update"]:
-            self.logger.info("Removing updates")
+            logger.info("Removing updates")
             removed_dict = dl_dict.pop("update", [])
 
             # If we've removed anything, say so here
             if len(removed_dict) > 0:
                 for r in removed_dict:
-                    self.logger.info(f"\t- {r['full_name']}")
+                    logger.info(f"\t- {r['full_name']}")
 
-            self.logger.info("")
+            logger.info("")
+
+        return thumb_url, dl_dict, fingerprint
+
+    def get_fingerprint(
+        self,
+        langs,
+        dl_dict,
+    ):
+        """Get a fingerprint for the download-links section of a game page
+
+        This only looks at what would change the files we pick, i.e.
+        the releases, their regions and languages, and the names of
+        the files in each, along with our preferences. Links themselves
+        don't count, so links being swapped around doesn't mean
+        redoing the game
+
+        Args:
+            langs (list): Languages found across all the releases
+            dl_dict (dict): Dictionary of releases, from parse_game_page
+        """
+
+        releases = {}
+        for release, release_dict in dl_dict.items():
+            releases[release] = {}
+            for key, val in release_dict.items():
+                if key in ["regions", "languages"]:
+                    releases[release][key] = val
+                else:
+                    releases[release][key] = [dl_info["full_name"] for dl_info in val]
+
+        fingerprint = get_config_hash(
+            {
+                "languages": langs,
+                "releases": releases,
+                "prefs": self.prefs_hash,
+            }
+        )
+
+        return fingerprint
+
+    def get_cached_fingerprint(
+        self,
+        url,
+    ):
+        """Get the fingerprint for a game from the user cache, if it has one
+
+        Args:
+            url (str): URL for the game
+        """
+
+        entry = self.get_cache_entry(url)
+
+        if entry is None:
+            return None
+
+        return entry.get("fingerprint", None)
+
+    def get_cache_entry(
+        self,
+        url,
+    ):
+        """Get the user cache entry for a game, if there is one
+
+        Args:
+            url (str): URL for the game
+        """
+
+        entry = self.user_cache.get(url, None)
+
+        # The game might have been cached under a different domain
+        if entry is None:
+            cache_url = self.user_cache.find_url(url)
+            if cache_url is not None:
+                entry = self.user_cache.get(cache_url, None)
+
+        return entry
+
+    def update_fingerprint(
+        self,
+        url,
+        wanted,
+        fingerprint,
+    ):
+        """Store the fingerprint for a game, but only if everything we want has been downloaded
+
+        Nothing is stored on a dry run, since nothing's been downloaded
+
+        Args:
+            url (str): URL for the game
+            wanted (list): List of (dl_key, full_name) for every file we want
+            fingerprint (str): Fingerprint for the game
+        """
 
         if self.dry_run:
-            self.logger.info("Dry run, will not download anything")
-            return True
+            return None
 
-        # If we've updated URLs, check for that here and update as appropriate
+        # The game might have been cached under a different domain
         if url not in self.user_cache:
-            url_path = urlparse(url).path
-            for cache_url in self.user_cache:
-                cache_url_path = urlparse(cache_url).path
-
-                # If we match, rename and delete
-                if url_path == cache_url_path:
-                    self.user_cache[url] = self.user_cache[cache_url]
-                    del self.user_cache[cache_url]
-                    break
+            url = self.user_cache.find_url(url)
+            if url is None:
+                return None
 
-        # Add unique URL to cache if it's not already there
-        if url not in self.user_cache:
-            self.logger.debug(f"Adding {name} to cache")
-            self.user_cache[url] = {}
-            self.user_cache[url]["name"] = name
-
-        # Add thumbnail URL to cache if it's not already there, or potentially update
-        if "thumb_url" not in self.user_cache[url]:
-            self.logger.debug("Adding thumbnail URL to cache")
-            self.user_cache[url]["thumb_url"] = thumb_url
-        if self.user_cache[url]["thumb_url"] != thumb_url:
-            self.logger.debug("Updating thumbnail URL")
-            self.user_cache[url]["thumb_url"] = thumb_url
+        def update(entry):
 
-        # Hooray! We're finally ready to start downloading. Map things to folder and let's get going
-        self.logger.info("Beginning download process:")
+            if entry is None:
+                return None
 
-        for dl_mapping in self.dl_mappings:
-            dl_dir = self.dl_mappings[dl_mapping]["directory_name"]
+            for dl_key, full_name in wanted:
+                if full_name not in entry.get(dl_key, []):
+                    return None
 
-            for dl_key in self.dl_mappings[dl_mapping]["dl_tags"]:
+            entry["fingerprint"] = fingerprint
+            return entry
 
-                # If we don't have anything to download, skip
-                if dl_key not in dl_dict:
-                    continue
+        return self.user_cache.update(url, update)
 
-                dl_key_clean = self.dl_mappings[dl_mapping]["dl_tags"][dl_key][
-                    "dl_name_mapping"
-                ]
+    def prefetch_game(
+        self,
+        url,
+        check_fingerprint=True,
+    ):
+        """Resolve a game in the background
 
-                if dl_key not in self.user_cache[url]:
-                    self.user_cache[url][dl_key] = []
+        Logging is held back, so it can be replayed in order once
+        this game is actually up. Any errors are also held on to
+        until then
 
-                # Loop over items in the list
-                for dl_info in dl_dict[dl_key]:
+        Args:
+            url (str): URL for the game
+            check_fingerprint (bool): Whether to skip the game if nothing
+                has changed since it was last downloaded. Defaults to True
+        """
 
-                    if dl_info["full_name"] in self.user_cache[url][dl_key]:
-                        self.logger.info(
-                            f"\t{dl_key_clean}: {dl_info['full_name']} already downloaded. Will skip"
-                        )
-                    else:
-                        self.logger.info(
-                            f"\tDownloading {dl_key_clean}: {dl_info['full_name']}"
-                        )
-                        out_dir = os.path.join(self.user_config["download_dir"], dl_dir)
+        logger = BufferedLogger()
 
-                        # Sanitize the package name so we're safe here
-                        package_name = sanitize_filename(name)
+        try:
+            resolved = self.resolve_game(
+                url=url,
+                logger=logger,
+                check_fingerprint=check_fingerprint,
+            )
+        except Exception as e:
+            return logger, None, e
 
-                        self.run_jdownloader(
-                            dl_dict=dl_info,
-                            out_dir=out_dir,
-                            package_name=package_name,
-                        )
-                        self.logger.info("")
+        return logger, resolved, None
 
-                        # Update and save out cache
-                        self.user_cache[url][dl_key].append(dl_info["full_name"])
-                        save_json(
-                            self.user_cache,
-                            self.user_cache_file,
-                            sort_key="name",
-                        )
+    def get_prefetched_game(
+        self,
+        prefetched,
+    ):
+        """Get the result of a game resolved in the background
 
-                        # Post to discord
-                        if self.discord_url is not None:
-                            self.post_to_discord(
-                                name=name,
-                                url=url,
-                                added_type=dl_key_clean,
-                                description=dl_info["full_name"],
-                                thumb_url=thumb_url,
-                            )
+        Args:
+            prefetched (concurrent.futures.Future): Future from
+                prefetch_game
+        """
 
-        self.logger.info("")
-        self.logger.info("All downloads complete")
+        logger, resolved, error = prefetched.result()
 
-        return True
+        logger.replay(self.logger)
+
+        if error is not None:
+            raise error
+
+        return resolved
+
+    def parse_game_page(
+        self,
+        url,
+        logger=None,
+    ):
+        """Get the thumbnail URL, languages and releases from a game page
+
+        Parsing is cached on disk against a hash of the page and of the
+        parsing config, so we only do the full parse when either of those
+        actually changes
+
+        Args:
+            url (str): URL for the game page
+            logger (logging.logger): Logger to use. Defaults to None,
+                which will use the NXBrew logger
+        """
+
+        if logger is None:
+            logger = self.logger
+
+        # We might already have the page, e.g. from checking it for changes
+        content = self.page_contents.pop(url, None)
+        if content is None:
+            content = get_html_content(
+                url,
+                cache=True,
+            )
+
+        page_hash = get_content_hash(content)
+        parsed = self.http_cache.get_parsed(page_hash, self.parse_config_hash)
+
+        if parsed is not None:
+            logger.debug("Using cached parse of page")
+            return parsed["thumb_url"], parsed["languages"], parsed["dl_dict"]
+
+        soup = parse_html(
+            content,
+            parser=self.general_config.get("html_parser", "html.parser"),
+        )
+
+        # Get thumbnail URL
+        thumb_url = get_thumb_url(
+            soup,
+        )
+
+        # Get languages
+        langs = get_languages(
+            soup,
+            lang_dict=self.general_config["languages"],
+        )
+
+        dl_dict = get_dl_dict(
+            soup,
+            regions=list(self.general_config["regions"].keys()),
+            regionless_titles=self.general_config["regionless_titles"],
+            languages=self.general_config["languages"],
+            implied_languages=self.general_config["implied_languages"],
+            dl_sites=self.general_config["dl_sites"],
+            dl_mappings=self.dl_mappings,
+        )
+
+        self.http_cache.store_parsed(
+            page_hash,
+            self.parse_config_hash,
+            {
+                "thumb_url": thumb_url,
+                "languages": langs,
+                "dl_dict": dl_dict,
+            },
+        )
+
+        return thumb_url, langs, dl_dict
 
     def get_dl_dict_score(
         self,
@@ -568,228 +1141,50 @@ class NXBrew:
 
         return releases
 
-    def run_jdownloader(
+    def complete_download(
         self,
-        dl_dict,
-        out_dir,
-        package_name,
+        name,
+        url,
+        dl_key,
+        dl_key_clean,
+        full_name,
+        thumb_url,
+        wanted=None,
+        fingerprint=None,
     ):
-        """Grab links and download through JDownloader
-
-        Will look through download sites in priority order,
-        bypassing shortened links if required and checking
-        everything's online. Then, will download, extract,
-        and clean up at the end
+        """Update the cache and post to Discord once a download is done
 
         Args:
-            dl_dict (dict): Dictionary of download files
-            out_dir: Directory to save downloaded files
-            package_name (str): Name of package to define subdirectories
-                and keep track of links
+            name (str): Name of game
+            url (str): URL for the game
+            dl_key (str): Download key, e.g. base_game_nsp
+            dl_key_clean (str): Clean name for the download key
+            full_name (str): Full name of the downloaded file
+            thumb_url (str): Thumbnail URL
+            wanted (list): List of (dl_key, full_name) for every file
+                we want for the game. Defaults to None
+            fingerprint (str): Fingerprint for the game, to store once
+                everything in wanted has been downloaded. Defaults to None
         """
 
-        package_id = None
-        dl_site = None
-
-        # Loop over download sites, hit the first one we find
-        for dl_site in self.general_config["dl_sites"]:
-
-            if dl_site in self.general_config["dl_sites_no_jdownload"]:
-                self.logger.info(f"JDownloader does not support {dl_site}, skipping")
-                continue
-
-            if dl_site in dl_dict:
-                dl_links = dl_dict[dl_site]
-                self.logger.info(f"\t\tTrying {dl_site}:")
-
-                for d in dl_links:
-
-                    # Redact the link
-                    self.logger.update_redact_filter(d)
-
-                    self.logger.info(f"\t\t\tLink: {d}")
-                    if "ouo" in d:
-                        self.logger.info(
-                            f"\t\t\t\t{d} detected as OUO shortened link. Will bypass"
-                        )
-                        d_final = bypass_ouo(d, logger=self.logger)
-                    elif "1link" in d:
-                        self.logger.info(
-                            f"\t\t\t\t{d} detected as 1link shortened link. Will bypass"
-                        )
-                        d_final = bypass_1link(d, logger=self.logger)
-                    else:
-                        d_final = copy.deepcopy(d)
-
-                    # Redact the link
-                    self.logger.update_redact_filter(d_final)
-
-                    self.logger.info(f"\t\t\t\tAdding {d_final} to JDownloader")
-                    self.jd_device.linkgrabber.add_links(
-                        [
-                            {
-                                "autostart": False,
-                                "links": d_final,
-                                "destinationFolder": out_dir,
-                                "packageName": package_name,
-                            }
-                        ]
-                    )
-
-                # Check that the package has been added
-                package_added = False
-                while not package_added:
-                    time.sleep(1)
-
-                    package_list = self.jd_device.linkgrabber.query_packages()
-
-                    for p in package_list:
-
-                        if package_added:
-                            continue
-
-                        if p["name"] == package_name:
-                            package_added = True
-
-                # Check that all links have been added
-                all_added = False
-                while not all_added:
-                    time.sleep(1)
-                    package_list = self.jd_device.linkgrabber.query_packages()
-
-                    found_package = False
-                    child_count = None
-
-                    for p in package_list:
-
-                        if found_package:
-                            continue
-
-                        if p["name"] == package_name:
-                            child_count = p["childCount"]
-                            found_package = True
-
-                    if child_count == len(dl_links):
-                        all_added = True
-
-                # Next up, we want to do a check that all the files are online and happy
-                package_list = self.jd_device.linkgrabber.query_packages()
-                for p in package_list:
-                    if p["name"] == package_name:
-                        package_id = p["uuid"]
-                        break
-
-                if package_id is None:
-                    raise ValueError(
-                        f"Did not find associated package with name {package_name}"
-                    )
-
-                file_list = self.jd_device.linkgrabber.query_links()
-                any_offline = False
-                for f in file_list:
-                    if f["packageUUID"] == package_id:
-                        if not f["availability"] == "ONLINE":
-                            self.logger.warning(
-                                "\t\t\tLink(s) offline, will remove and try with another download client"
-                            )
-                            any_offline = True
-                            break
-
-                if any_offline:
-                    self.jd_device.linkgrabber.remove_links(package_ids=[package_id])
-                    continue
-
-                break
-
-        if dl_site is None:
-            raise ValueError("Expecting dl_site to be defined")
-
-        if package_id is None:
-            raise ValueError("Expecting the package_id to be defined")
-
-        # Finally, we need to pull the links out as well to move them
-        # to the download list
-        link_list = self.jd_device.linkgrabber.query_links()
-        link_ids = []
-        for l in link_list:
-            if l["packageUUID"] == package_id:
-                link_ids.append(l["uuid"])
-
-        # Hooray! We've got stuff online. Start downloading
-        self.logger.info(f"\t\t\tSuccess! Will download from {dl_site}")
-        self.logger.info(f"\t\tStarting download")
-        self.jd_device.linkgrabber.move_to_downloadlist(
-            link_ids=link_ids, package_ids=[package_id]
-        )
-
-        # The package ID changes when it moves to downloads so find it again
-        package_id = None
+        self.logger.info(f"Download complete for {name}: {full_name}")
 
-        package_list = self.jd_device.downloads.query_packages()
-        for p in package_list:
-            if p["name"] == package_name:
-                package_id = p["uuid"]
-                break
+        # Update the cache
+        self.user_cache.add_download(url, dl_key, full_name)
 
-        # If everything's offline, then we'll fail here, so warn and return
-        if package_id is None:
-            self.logger.warning(
-                f"Did not find associated package with name {package_name}"
-            )
-            return True
+        # If that was the last thing we were waiting on, the game's up-to-date
+        if fingerprint is not None:
+            self.update_fingerprint(url, wanted, fingerprint)
 
-        # Query status occasionally, to make sure the download is complete and
-        # extraction is done
-        finished = False
-        while not finished:
-            time.sleep(1)
-            dl_status = self.jd_device.downloads.query_packages(
-                [
-                    {
-                        "packageUUIDs": [package_id],
-                        "status": True,
-                        "finished": True,
-                    }
-                ]
+        # Post to discord
+        if self.discord_url is not None:
+            self.post_to_discord(
+                name=name,
+                url=url,
+                added_type=dl_key_clean,
+                description=full_name,
+                thumb_url=thumb_url,
             )
-            if "finished" not in dl_status[0]:
-                finished = False
-            else:
-                finished = dl_status[0]["finished"]
-
-            # Hunt through to make sure extraction is also complete,
-            # only once everything is downloaded
-            if finished:
-                dl_status = self.jd_device.downloads.query_links(
-                    [
-                        {
-                            "packageUUIDs": [package_id],
-                            "status": True,
-                            "extractionStatus": True,
-                            "finished": True,
-                        }
-                    ]
-                )
-                for status in dl_status:
-                    if "extractionStatus" in status:
-                        if status["extractionStatus"] != "SUCCESSFUL":
-                            finished = False
-                            break
-
-        # Wait for a bit, just to ensure everything is good
-        time.sleep(5)
-
-        self.logger.info("\t\tFiles successfully downloaded")
-
-        # And finally, cleanup
-        self.jd_device.downloads.cleanup(
-            action="DELETE_FINISHED",
-            mode="REMOVE_LINKS_ONLY",
-            selection_type="SELECTED",
-            package_ids=[package_id],
-        )
-
-        self.logger.info("\t\tLinks removed from JDownloader")
 
         return True
 
@@ -825,17 +1220,26 @@ class NXBrew:
 
         return True
 
-    def clean_up_cache(self):
-        """Remove items from the cache and on disk, if needed, and do a final save"""
+    def clean_up_cache(
+        self,
+        remove_games=True,
+    ):
+        """Remove items from the cache and on disk, if needed, and do a final save
+
+        Args:
+            remove_games (bool): Whether to remove games that are no longer
+                selected. Defaults to True
+        """
 
         # First, scan through for any games that are no longer check
         games = [g for g in self.to_download]
         games_to_delete = []
         keys_to_delete = []
 
-        for d in self.user_cache:
-            cache_game = self.user_cache[d]["name"]
-            if cache_game not in games:
+        user_cache = self.user_cache.snapshot()
+        for d in user_cache:
+            cache_game = user_cache[d]["name"]
+            if remove_games and cache_game not in games:
                 games_to_delete.append(cache_game)
                 keys_to_delete.append(d)
 
@@ -859,7 +1263,7 @@ class NXBrew:
                         shutil.rmtree(g_dir)
 
                 # And remove from the cache
-                self.user_cache.pop(keys_to_delete[i])
+                self.user_cache.remove(keys_to_delete[i])
 
             self.logger.info("")
 
@@ -885,14 +1289,12 @@ class NXBrew:
                 if os.path.exists(out_dir):
                     shutil.rmtree(out_dir)
 
-                for d in self.user_cache:
-                    self.user_cache[d].pop(key, [])
+                self.user_cache.remove_dl_key(key)
 
-        # Save out the cache
-        save_json(
-            self.user_cache,
-            self.user_cache_file,
-            sort_key="name",
-        )
+        # Export the cache, for anything still reading the JSON
+        self.user_cache.export_json()
+
+        # And write out anything the HTTP cache has been holding on to
+        self.http_cache.flush()
 
         return True
@@ -0,0 +1,375 @@
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import nxbrew_dl
+from ..util import (
+    NXBrewLogger,
+    IndexSnapshot,
+    UserCache,
+    load_yml,
+    get_http_client,
+    get_http_cache,
+    get_content_hash,
+    get_html_content,
+    get_url_path,
+    open_game_index,
+    iter_game_index,
+)
+
+# Check for changes every hour by default, looking at a few game pages at once.
+# Games are only removed if the index is at least this fraction of the size of
+# the last good one
+DEFAULT_SYNC_CONFIG = {
+    "interval": 3600,
+    "max_workers": 8,
+    "min_index_fraction": 0.9,
+}
+
+
+class SyncDaemon:
+
+    def __init__(
+        self,
+        general_config=None,
+        regex_config=None,
+        user_config=None,
+        user_cache=None,
+        logger=None,
+        jd_device=None,
+    ):
+        """Keeps downloads in sync with NXBrew, on a schedule
+
+        Each sync revalidates the game index, and then the page for
+        each selected game (anything in the game index that's also in
+        the user cache). Pages go through the HTTP cache, so an
+        unchanged page is a conditional request that comes back 304.
+        Only games whose page has changed since they were last processed
+        are passed on to NXBrew, along with the pages themselves so they
+        aren't fetched again. The first sync processes everything.
+
+        Anything no longer in the index counts as deselected, and is
+        removed from the cache and disk. Since this runs unattended,
+        games are only removed if the index looks complete, i.e. it's not
+        much smaller than the last good one
+
+        The NXBrew instance is kept between syncs, so the HTTP pool,
+        parsed config and JDownloader session stay warm
+
+        Args:
+            general_config (dict): Dictionary for general configuration.
+                Defaults to None, which will load in from expected path
+            regex_config (dict): Dictionary for regex configuration.
+                Defaults to None, which will load in from expected path
+            user_config (dict): Dictionary for user configuration.
+                Defaults to None, which will load in from config.yml in
+                the current directory
+            user_cache (UserCache): User cache. Defaults to None, which
+                will open the one in the current directory
+            logger (logging.logger): Logger instance. Defaults to None,
+                which will set up a new one
+            jd_device: JDownloader device to send downloads to. Defaults
+                to None, which will have NXBrew connect to MyJDownloader
+        """
+
+        # Load in various config files, if they're not already loaded
+        mod_dir = os.path.dirname(nxbrew_dl.__file__)
+
+        general_config_filename = os.path.join(mod_dir, "configs", "general.yml")
+        if general_config is None:
+            general_config = load_yml(general_config_filename)
+        self.general_config = general_config
+
+        regex_config_filename = os.path.join(mod_dir, "configs", "regex.yml")
+        if regex_config is None:
+            regex_config = load_yml(regex_config_filename)
+        self.regex_config = regex_config
+
+        user_config_file = os.path.join(os.getcwd(), "config.yml")
+        if user_config is None:
+            if os.path.exists(user_config_file):
+                user_config = load_yml(user_config_file)
+            else:
+                user_config = {}
+        self.user_config = user_config
+
+        self.sync_config = dict(DEFAULT_SYNC_CONFIG)
+        self.sync_config.update(self.general_config.get("sync_daemon", {}))
+
+        # Shared, pooled client for all the site requests
+        get_http_client(self.general_config.get("http", None))
+
+        if user_cache is None:
+            user_cache = UserCache()
+        self.user_cache = user_cache
+
+        if logger is None:
+            logger = NXBrewLogger(log_level="INFO")
+        self.logger = logger
+
+        self.jd_device = jd_device
+
+        # Set up when there's first something to download
+        self.nxbrew = None
+
+        # Games in the index, by URL path, and the hash of the index they came from
+        self.index_games = None
+        self.index_hash = None
+
+        # Whether the index looks complete enough to remove games that aren't in
+        # it, and the size of the last one that did. Until we've got one, go off
+        # the game list saved by the GUI
+        self.index_trusted = False
+        self.trusted_index_size = self.get_saved_index_size()
+
+        # Hash of each game's page when it was last processed, by URL path
+        self.page_hashes = {}
+
+        self.stopped = threading.Event()
+
+    def get_saved_index_size(self):
+        """Get the number of games in the game list saved by the GUI, if there is one"""
+
+        game_index_file = os.path.join(os.getcwd(), "game_index.bin")
+        if not os.path.exists(game_index_file):
+            return None
+
+        try:
+            with IndexSnapshot(game_index_file) as snapshot:
+                n_games = len(snapshot)
+        except Exception:
+            return None
+
+        return n_games
+
+    def check_index_games(self, index_games):
+        """Check whether the index looks complete enough to remove games that aren't in it
+
+        A page that's cut short will fail to parse, but one that comes
+        back with far fewer games than usual won't, so check against the
+        size of the last good index
+
+        Args:
+            index_games (dict): Games in the index, by URL path
+        """
+
+        n_games = len(index_games)
+
+        min_games = 1
+        if self.trusted_index_size is not None:
+            min_games = max(
+                self.sync_config["min_index_fraction"] * self.trusted_index_size,
+                1,
+            )
+
+        if n_games < min_games:
+            self.logger.warning(
+                f"Game list looks incomplete ({n_games} games, expected around "
+                f"{self.trusted_index_size}). Won't remove any games this sync"
+            )
+            return False
+
+        self.trusted_index_size = n_games
+
+        return True
+
+    def get_index_games(self):
+        """Get the games in the index, by URL path
+
+        If the index hasn't changed since last time, we keep what we
+        already have rather than parsing it again
+        """
+
+        response = open_game_index(self.user_config["nxbrew_url"], cache=True)
+
+        if response.from_cache and self.index_games is not None:
+            if get_content_hash(response.content) == self.index_hash:
+                response.close()
+                self.logger.info("Game list is up-to-date")
+                return self.index_games
+
+        index_games = {}
+        for game in iter_game_index(
+            general_config=self.general_config,
+            regex_config=self.regex_config,
+            nxbrew_url=self.user_config["nxbrew_url"],
+            response=response,
+        ):
+            index_games[get_url_path(game["url"])] = game
+
+        self.index_games = index_games
+        self.index_hash = get_content_hash(response.content)
+        self.index_trusted = self.check_index_games(index_games)
+
+        self.logger.info(f"Game list refreshed: {len(index_games)} games")
+
+        return self.index_games
+
+    def get_selected_games(self):
+        """Get the selected games, i.e. those in the index that are also in the user cache"""
+
+        index_games = self.get_index_games()
+
+        # Pick up anything that's been selected elsewhere, e.g. in the GUI
+        self.user_cache.sync_json()
+        cache_paths = self.user_cache.get_url_paths()
+
+        to_download = {}
+        for url_path, game in index_games.items():
+            if url_path in cache_paths:
+                to_download.update({game["short_name"]: game["url"]})
+
+        return to_download
+
+    def check_page(self, url):
+        """Check a game page, revalidating it against the HTTP cache
+
+        Returns the hash of the page and, if it's changed since it was
+        last processed, the page itself so it doesn't need fetching
+        again. If anything goes wrong, the hash is None so the game gets
+        processed (and the problem shows up) in the usual way
+
+        Args:
+            url (str): URL for the game page
+        """
+
+        try:
+            content = get_html_content(url, cache=True)
+        except Exception:
+            return None, None
+
+        page_hash = get_content_hash(content)
+        if page_hash == self.page_hashes.get(get_url_path(url), None):
+            return page_hash, None
+
+        return page_hash, content
+
+    def check_pages(self, to_download):
+        """Check each game page, a few at once
+
+        Returns the hash for each page by URL path, and the pages that
+        have changed by URL
+
+        Args:
+            to_download (dict): Dictionary of games to check
+        """
+
+        urls = list(to_download.values())
+
+        with ThreadPoolExecutor(max_workers=self.sync_config["max_workers"]) as pool:
+            results = list(pool.map(self.check_page, urls))
+
+        page_hashes = {}
+        page_contents = {}
+        for url, (page_hash, content) in zip(urls, results):
+            page_hashes[get_url_path(url)] = page_hash
+            if content is not None:
+                page_contents[url] = content
+
+        return page_hashes, page_contents
+
+    def get_nxbrew(self):
+        """Get the NXBrew instance, setting it up the first time"""
+
+        if self.nxbrew is None:
+            from .nxbrew import NXBrew
+
+            self.nxbrew = NXBrew(
+                to_download={},
+                general_config=self.general_config,
+                regex_config=self.regex_config,
+                user_config=self.user_config,
+                user_cache=self.user_cache,
+                logger=self.logger,
+                jd_device=self.jd_device,
+            )
+
+        return self.nxbrew
+
+    def sync(self):
+        """Do one sync, processing only the games that have changed
+
+        Returns the number of games processed
+        """
+
+        self.logger.info("Checking for changes")
+
+        to_download = self.get_selected_games()
+        page_hashes, page_contents = self.check_pages(to_download)
+
+        # Revalidating only touches timestamps, so write those out in one go
+        get_http_cache().flush()
+
+        changed = {}
+        for name, url in to_download.items():
+            url_path = get_url_path(url)
+            if page_hashes[url_path] is None:
+                changed.update({name: url})
+            elif page_hashes[url_path] != self.page_hashes.get(url_path, None):
+                changed.update({name: url})
+
+        self.logger.info(
+            f"{len(changed)} of {len(to_download)} selected game(s) have changed"
+        )
+
+        if len(changed) == 0:
+            return 0
+
+        # Everything selected is passed through, so the clean up at the end
+        # doesn't remove the games that haven't changed. If the index doesn't
+        # look right, don't remove anything at all
+        nx = self.get_nxbrew()
+        nx.to_download = to_download
+        unfinished_games = nx.run(
+            names=list(changed),
+            page_contents=page_contents,
+            remove_games=self.index_trusted,
+        )
+
+        # Only remember pages once they've been dealt with, so anything that
+        # failed or got stuck gets another go next time
+        for name, url in changed.items():
+            if name in unfinished_games:
+                continue
+            page_hash = page_hashes[get_url_path(url)]
+            if page_hash is not None:
+                self.page_hashes[get_url_path(url)] = page_hash
+
+        return len(changed)
+
+    def run(self, interval=None):
+        """Sync on a schedule, until stopped
+
+        Args:
+            interval (float): Time to wait between syncs (in seconds).
+                Defaults to None, which will use the value in the general
+                config
+        """
+
+        if interval is None:
+            interval = self.sync_config["interval"]
+
+        while not self.stopped.is_set():
+
+            try:
+                self.sync()
+            except Exception:
+                tb = traceback.format_exc()
+                for line in tb.splitlines():
+                    self.logger.warning(line)
+
+            if self.stopped.is_set():
+                break
+
+            self.logger.info(f"Next sync in {interval}s")
+            self.stopped.wait(interval)
+
+        return True
+
+    def stop(self):
+        """Stop syncing, once the current sync is done"""
+
+        self.stopped.set()
+
+        return True
@@ -1,26 +1,63 @@
-from .discord_tools import discord_push
-from .download_tools import get_dl_dict, bypass_ouo, bypass_1link
-from .github_tools import check_github_version
-from .html_tools import get_html_page, get_game_dict, get_languages, get_thumb_url
-from .io_tools import load_yml, save_yml, load_json, save_json
-from .log_utils import NXBrewLogger
-from .regex_tools import check_has_filetype, get_game_name
-
-__all__ = [
-    "NXBrewLogger",
-    "discord_push",
-    "get_dl_dict",
-    "bypass_ouo",
-    "bypass_1link",
-    "check_github_version",
-    "get_html_page",
-    "get_game_dict",
-    "check_has_filetype",
-    "get_game_name",
-    "get_languages",
-    "get_thumb_url",
-    "load_yml",
-    "save_yml",
-    "load_json",
-    "save_json",
-]
+import importlib
+
+# Where each utility lives. Modules are only imported when something from them is
+# first used, so e.g. the CLI doesn't pay for Discord or link bypassing
+# unless it needs them
+UTILS = {
+    "NXBrewLogger": "log_utils",
+    "BufferedLogger": "log_utils",
+    "HTTPCache": "cache_tools",
+    "get_http_cache": "cache_tools",
+    "get_content_hash": "cache_tools",
+    "get_config_hash": "cache_tools",
+    "UserCache": "user_cache_tools",
+    "TitleClassifier": "regex_tools",
+    "SearchIndex": "search_tools",
+    "discord_push": "discord_tools",
+    "get_dl_dict": "download_tools",
+    "bypass_ouo": "download_tools",
+    "bypass_1link": "download_tools",
+    "check_github_version": "github_tools",
+    "JDScheduler": "jdownloader_tools",
+    "HTTPClient": "http_tools",
+    "get_http_client": "http_tools",
+    "abort_response": "http_tools",
+    "parse_html": "html_tools",
+    "get_html_content": "html_tools",
+    "get_html_page": "html_tools",
+    "get_game_dict": "html_tools",
+    "get_game_dict_delta": "html_tools",
+    "get_url_path": "html_tools",
+    "open_game_index": "html_tools",
+    "iter_game_index": "html_tools",
+    "check_has_filetype": "regex_tools",
+    "get_game_name": "regex_tools",
+    "get_languages": "html_tools",
+    "get_thumb_url": "html_tools",
+    "IndexSnapshot": "index_snapshot_tools",
+    "save_index_snapshot": "index_snapshot_tools",
+    "load_yml": "io_tools",
+    "save_yml": "io_tools",
+    "load_json": "io_tools",
+    "save_json": "io_tools",
+}
+
+__all__ = list(UTILS)
+
+
+def __getattr__(name):
+
+    if name not in UTILS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    module = importlib.import_module(f".{UTILS[name]}", __name__)
+    value = getattr(module, name)
+
+    # Keep it around, so we only come through here once
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,513 @@
+import glob
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+import requests
+
+from .http_tools import get_http_client
+from .io_tools import load_json, save_json
+
+# Default to keeping things for 30 days, and up to 100MB of (compressed) pages
+DEFAULT_CACHE_DIR = "http_cache"
+DEFAULT_TTL = 30 * 24 * 60 * 60
+DEFAULT_MAX_SIZE = 100 * 1024 * 1024
+
+# Rather than rewriting the whole index for every page we store or touch,
+# only write it out every so often (in seconds), and on flush
+TOUCH_SAVE_INTERVAL = 10
+
+HTTP_CACHES = {}
+HTTP_CACHES_LOCK = threading.Lock()
+
+
+class CachedResponse:
+
+    def __init__(
+        self,
+        status_code,
+        headers,
+        response=None,
+        content=None,
+        from_cache=False,
+        on_complete=None,
+    ):
+        """Response from the HTTP cache
+
+        This looks enough like a requests.Response that it can be
+        streamed in the same way. Content either comes from the cache,
+        or streams from the live response and is stored once complete
+
+        Args:
+            status_code (int): HTTP status code
+            headers (dict): Response headers
+            response (requests.Response): Live response to stream from.
+                Defaults to None
+            content (bytes): Content, if already read in. Defaults to None
+            from_cache (bool): Whether this came from the cache. Defaults
+                to False
+            on_complete (callable): Function to call with the full content
+                once the live response has been read. Defaults to None
+        """
+
+        self.status_code = status_code
+        self.headers = requests.structures.CaseInsensitiveDict(headers)
+        self.encoding = requests.utils.get_encoding_from_headers(self.headers)
+        self.from_cache = from_cache
+
+        self.response = response
+        self._content = content
+        self.on_complete = on_complete
+
+    def iter_content(self, chunk_size=65536):
+        """Iterate over the content in chunks
+
+        Args:
+            chunk_size (int): Size of chunks. Defaults to 65536
+        """
+
+        if self._content is not None:
+            for i in range(0, len(self._content), chunk_size):
+                yield self._content[i : i + chunk_size]
+            return
+
+        chunks = []
+        for chunk in self.response.iter_content(chunk_size=chunk_size):
+            chunks.append(chunk)
+            yield chunk
+
+        self._content = b"".join(chunks)
+        if self.on_complete is not None:
+            self.on_complete(self._content)
+
+    @property
+    def content(self):
+        """Full content of the response"""
+
+        if self._content is None:
+            for _ in self.iter_content():
+                pass
+
+        return self._content
+
+    def close(self):
+        """Close the underlying response, if there is one"""
+
+        if self.response is not None:
+            self.response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class HTTPCache:
+
+    def __init__(
+        self,
+        cache_dir=None,
+        ttl=DEFAULT_TTL,
+        max_size=DEFAULT_MAX_SIZE,
+    ):
+        """On-disk HTTP cache, keyed by URL
+
+        Pages are revalidated with conditional GETs (using ETag and
+        Last-Modified), so an unchanged page costs a 304 rather than
+        a full download. Bodies are stored gzipped and named by their
+        hash, so identical pages are only stored once. Entries are
+        evicted if they haven't been validated within the TTL, and
+        then least recently used first if the store is too big
+
+        Args:
+            cache_dir (str): Directory for the cache. Defaults to None,
+                which will use "http_cache" in the current directory
+            ttl (float): Time (in seconds) before an entry is evicted.
+                Defaults to 30 days
+            max_size (int): Maximum total size (in bytes) of stored
+                bodies. Defaults to 100MB
+        """
+
+        if cache_dir is None:
+            cache_dir = os.path.join(os.getcwd(), DEFAULT_CACHE_DIR)
+
+        self.cache_dir = cache_dir
+        self.body_dir = os.path.join(cache_dir, "bodies")
+        self.parsed_dir = os.path.join(cache_dir, "parsed")
+        self.index_file = os.path.join(cache_dir, "index.json")
+
+        self.ttl = ttl
+        self.max_size = max_size
+
+        for d in [self.body_dir, self.parsed_dir]:
+            if not os.path.exists(d):
+                os.makedirs(d)
+
+        self.lock = threading.RLock()
+
+        # Whether there are changes that haven't been written out, and when
+        # we last did
+        self.dirty = False
+        self.last_saved = time.time()
+
+        if os.path.exists(self.index_file):
+            self.index = load_json(self.index_file)
+        else:
+            self.index = {}
+
+        # Total size of stored bodies. This is worked out properly on eviction,
+        # and added to as bodies are stored
+        self.total_size = 0
+
+        self.flush()
+
+    def open(self, url):
+        """Get a URL, revalidating against the cache if we can
+
+        Args:
+            url (str): URL to get
+        """
+
+        with self.lock:
+            entry = self.index.get(url, None)
+            if entry is not None:
+                entry = dict(entry)
+
+        # Only revalidate if we actually still have the body
+        headers = {}
+        if entry is not None and os.path.exists(self.get_body_path(entry["hash"])):
+            if entry.get("etag", None) is not None:
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified", None) is not None:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        else:
+            entry = None
+
+        client = get_http_client()
+        r = client.get(url, headers=headers, stream=True)
+
+        if r.status_code == 304 and entry is not None:
+            r.close()
+
+            content = None
+            with self.lock:
+                if os.path.exists(self.get_body_path(entry["hash"])):
+                    content = self.read_body(entry["hash"])
+                    self.touch(url, validated=True)
+
+            if content is not None:
+                return CachedResponse(
+                    status_code=200,
+                    headers={"content-type": entry.get("content_type", "")},
+                    content=content,
+                    from_cache=True,
+                )
+
+            # The body has been evicted in the meantime, so get it again in full
+            r = client.get(url, stream=True)
+
+        # Only store successful responses
+        on_complete = None
+        if r.status_code == 200:
+            response_headers = dict(r.headers)
+            on_complete = lambda content: self.store(url, response_headers, content)
+
+        return CachedResponse(
+            status_code=r.status_code,
+            headers=r.headers,
+            response=r,
+            on_complete=on_complete,
+        )
+
+    def get(self, url):
+        """Get the content for a URL, revalidating against the cache if we can
+
+        Args:
+            url (str): URL to get
+        """
+
+        with self.open(url) as r:
+            content = r.content
+
+        return content
+
+    def get_parsed_path(self, body_hash, config_hash):
+        """Get the path for a stored parse result
+
+        Args:
+            body_hash (str): Hash of the parsed body
+            config_hash (str): Hash of the config used to parse it
+        """
+
+        return os.path.join(self.parsed_dir, f"{body_hash}_{config_hash}.json")
+
+    def get_parsed(self, body_hash, config_hash):
+        """Get a stored parse result, if we have it
+
+        Args:
+            body_hash (str): Hash of the parsed body
+            config_hash (str): Hash of the config used to parse it
+        """
+
+        parsed_path = self.get_parsed_path(body_hash, config_hash)
+
+        with self.lock:
+            if not os.path.exists(parsed_path):
+                return None
+            parsed = load_json(parsed_path)
+
+        return parsed
+
+    def store_parsed(self, body_hash, config_hash, parsed):
+        """Store a parse result
+
+        Args:
+            body_hash (str): Hash of the parsed body
+            config_hash (str): Hash of the config used to parse it
+            parsed (dict): Parse result. Should be JSON serializable
+        """
+
+        parsed_path = self.get_parsed_path(body_hash, config_hash)
+
+        with self.lock:
+            tmp_path = f"{parsed_path}.tmp"
+            save_json(parsed, tmp_path)
+            os.replace(tmp_path, parsed_path)
+
+        return True
+
+    def get_body_path(self, body_hash):
+        """Get the path for a stored body
+
+        Args:
+            body_hash (str): Hash of the body
+        """
+
+        return os.path.join(self.body_dir, f"{body_hash}.gz")
+
+    def read_body(self, body_hash):
+        """Read a stored body
+
+        Args:
+            body_hash (str): Hash of the body
+        """
+
+        with gzip.open(self.get_body_path(body_hash), "rb") as f:
+            content = f.read()
+
+        return content
+
+    def store(self, url, headers, content):
+        """Store a response in the cache
+
+        Args:
+            url (str): URL for the response
+            headers (dict): Response headers
+            content (bytes): Response body
+        """
+
+        headers = requests.structures.CaseInsensitiveDict(headers)
+        body_hash = get_content_hash(content)
+        body_path = self.get_body_path(body_hash)
+
+        now = time.time()
+
+        with self.lock:
+
+            # Only write out the body if we don't already have it
+            if not os.path.exists(body_path):
+                tmp_path = f"{body_path}.tmp"
+                with gzip.open(tmp_path, "wb") as f:
+                    f.write(content)
+                os.replace(tmp_path, body_path)
+                self.total_size += os.path.getsize(body_path)
+
+            old_entry = self.index.get(url, None)
+
+            self.index[url] = {
+                "hash": body_hash,
+                "size": os.path.getsize(body_path),
+                "etag": headers.get("etag", None),
+                "last_modified": headers.get("last-modified", None),
+                "content_type": headers.get("content-type", ""),
+                "validated": now,
+                "last_used": now,
+            }
+
+            # If the page has changed, we might not need the old body anymore
+            if old_entry is not None and old_entry["hash"] != body_hash:
+                self.remove_bodies([old_entry["hash"]])
+
+            self.dirty = True
+
+            # Only do a full eviction pass once we're too big. Otherwise,
+            # that's left for flush
+            if self.total_size > self.max_size:
+                self.evict()
+
+            if now - self.last_saved > TOUCH_SAVE_INTERVAL:
+                self.save()
+
+        return True
+
+    def touch(self, url, validated=False):
+        """Mark an entry as recently used
+
+        Args:
+            url (str): URL for the entry
+            validated (bool): Whether the entry has also been
+                revalidated. Defaults to False
+        """
+
+        now = time.time()
+
+        with self.lock:
+            if url not in self.index:
+                return False
+
+            self.index[url]["last_used"] = now
+            if validated:
+                self.index[url]["validated"] = now
+
+            self.dirty = True
+            if now - self.last_saved > TOUCH_SAVE_INTERVAL:
+                self.save()
+
+        return True
+
+    def evict(self):
+        """Evict expired entries, then least recently used ones until we're under the size cap
+
+        This doesn't write out the index, which is left to flush
+        """
+
+        now = time.time()
+
+        with self.lock:
+
+            removed_hashes = set()
+
+            # First, remove anything that's not been validated within the TTL
+            for url in list(self.index.keys()):
+                if now - self.index[url]["validated"] > self.ttl:
+                    removed_hashes.add(self.index.pop(url)["hash"])
+
+            # Then remove least recently used until we're small enough. Bodies can be
+            # shared between URLs, so only count each once
+            body_refs = Counter(e["hash"] for e in self.index.values())
+            body_sizes = {e["hash"]: e["size"] for e in self.index.values()}
+            total_size = sum(body_sizes.values())
+
+            if total_size > self.max_size:
+                lru_urls = sorted(self.index, key=lambda u: self.index[u]["last_used"])
+                for url in lru_urls:
+                    if total_size <= self.max_size:
+                        break
+
+                    body_hash = self.index.pop(url)["hash"]
+                    removed_hashes.add(body_hash)
+
+                    body_refs[body_hash] -= 1
+                    if body_refs[body_hash] == 0:
+                        total_size -= body_sizes[body_hash]
+
+            self.total_size = total_size
+
+            if len(removed_hashes) > 0:
+                self.remove_bodies(removed_hashes)
+                self.dirty = True
+
+        return True
+
+    def remove_bodies(self, body_hashes):
+        """Remove stored bodies, if they're no longer referenced by any entry
+
+        Args:
+            body_hashes (list): Hashes of bodies to remove
+        """
+
+        with self.lock:
+            referenced_hashes = set(e["hash"] for e in self.index.values())
+
+            for body_hash in body_hashes:
+                if body_hash in referenced_hashes:
+                    continue
+                body_path = self.get_body_path(body_hash)
+                if os.path.exists(body_path):
+                    os.remove(body_path)
+
+                # Also remove any parse results for this body
+                parsed_pattern = os.path.join(self.parsed_dir, f"{body_hash}_*.json")
+                for parsed_path in glob.glob(parsed_pattern):
+                    os.remove(parsed_path)
+
+        return True
+
+    def save(self):
+        """Save the index out, atomically"""
+
+        with self.lock:
+            tmp_file = f"{self.index_file}.tmp"
+            save_json(self.index, tmp_file)
+            os.replace(tmp_file, self.index_file)
+
+            self.dirty = False
+            self.last_saved = time.time()
+
+        return True
+
+    def flush(self):
+        """Evict anything that needs it, and save the index out if anything's changed since we last did"""
+
+        with self.lock:
+            self.evict()
+            if self.dirty:
+                self.save()
+
+        return True
+
+
+def get_content_hash(content):
+    """Get the hash for some content
+
+    Args:
+        content (bytes): Content to hash
+    """
+
+    return hashlib.sha256(content).hexdigest()
+
+
+def get_config_hash(config):
+    """Get a hash for a configuration
+
+    Args:
+        config (dict): Configuration. Should be JSON serializable
+    """
+
+    config_str = json.dumps(config, sort_keys=True, ensure_ascii=False)
+
+    return get_content_hash(config_str.encode("utf-8"))
+
+
+def get_http_cache(cache_dir=None):
+    """Get the shared HTTP cache for a directory
+
+    Args:
+        cache_dir (str): Directory for the cache. Defaults to None,
+            which will use "http_cache" in the current directory
+    """
+
+    if cache_dir is None:
+        cache_dir = os.path.join(os.getcwd(), DEFAULT_CACHE_DIR)
+    cache_dir = os.path.abspath(cache_dir)
+
+    with HTTP_CACHES_LOCK:
+        if cache_dir not in HTTP_CACHES:
+            HTTP_CACHES[cache_dir] = HTTPCache(cache_dir=cache_dir)
+
+    return HTTP_CACHES[cache_dir]
@@ -1,6 +1,3 @@
-from discordwebhook import Discord
-
-
 def discord_push(
     url,
     embeds,
@@ -12,6 +9,8 @@ def discord_push(
         embeds (list): List of dictionaries of embeds
     """
 
+    from discordwebhook import Discord
+
     discord = Discord(url=url)
     discord.post(
         embeds=embeds,
@@ -1,4 +1,3 @@
-import copy
 import random
 import re
 import time
@@ -6,9 +5,9 @@ from urllib.parse import urlparse
 
 import requests
 from bs4 import BeautifulSoup
-from curl_cffi import requests as cffi_requests
 
-from .regex_tools import parse_languages
+from .html_tools import find_all_tags, get_tag_text, get_tag_links, is_lxml_tree
+from .regex_tools import get_language_matcher, get_region_matcher
 
 ANCHOR_URL = (
     "https://www.google.com/recaptcha/api2/anchor?"
@@ -37,7 +36,7 @@ def get_dl_dict(
     add them to a dictionary
 
     Args:
-        soup (bs4.BeautifulSoup): soup object to parse
+        soup (bs4.BeautifulSoup or lxml.html.HtmlElement): soup object to parse
         dl_sites (list): List of download sites in preference order
         dl_mappings (dict): Dictionary of mappings for download types
         regions (list): list of regions potentially parse. Defaults
@@ -51,311 +50,388 @@ def get_dl_dict(
             an empty dict
     """
 
-    if regions is None:
-        regions = []
+    scanner = ReleaseScanner(
+        dl_sites=dl_sites,
+        dl_mappings=dl_mappings,
+        regions=regions,
+        languages=languages,
+        regionless_titles=regionless_titles,
+        implied_languages=implied_languages,
+    )
 
-    if regionless_titles is None:
-        regionless_titles = []
+    dl_dict = scanner.scan(get_dl_paragraphs(soup))
 
-    if implied_languages is None:
-        implied_languages = {}
+    return dl_dict
 
-    dl_dict = {}
 
-    # Find the strong tags, then start hunting
+def get_dl_paragraphs(soup):
+    """Flatten the download links section of a page into paragraph records
+
+    Yields the text and links for each paragraph after the
+    "Download Links" tag, in document order
+
+    Args:
+        soup (bs4.BeautifulSoup or lxml.html.HtmlElement): soup object to parse
+    """
 
-    strong_tag = soup.findAll("strong")
+    # Find the strong tags, then start hunting
+    strong_tag = find_all_tags(soup, "strong")
 
     # Find the tag
     found_tag = None
     for s in strong_tag:
-        if "download links" in s.text.lower():
+        if "download links" in get_tag_text(s).lower():
             found_tag = s
             break
 
     if found_tag is None:
         raise ValueError("No download links found")
 
-    tag = found_tag.find_next("p")
+    if is_lxml_tree(found_tag):
+        paragraphs = found_tag.xpath("descendant::p | following::p")
+    else:
+        paragraphs = found_tag.find_all_next("p")
 
-    # Keep looping over to keep finding regions
-    still_hunting = True
-    release_number = 1
+    for p in paragraphs:
+        yield get_tag_text(p), get_tag_links(p)
 
-    while still_hunting:
 
-        current_release = f"release_{release_number}"
-        dl_dict[current_release] = {}
+class ParagraphCursor:
 
-        # We may find a region here, so change the current region and then start looping over tags
-        parsed_regions = parse_regions(tag, regions)
+    def __init__(self, paragraphs):
+        """Step forward through paragraph records
 
-        if len(parsed_regions) > 0:
+        If we run off the end of the page, this will give an
+        empty paragraph
 
-            # Parse out languages
-            parsed_languages = parse_language_tag(tag, languages)
+        Args:
+            paragraphs (iterable): Iterable of (text, links) records
+        """
 
-            # If we haven't found anything, use implied languages
-            if len(parsed_languages) == 0:
-                for region in parsed_regions:
-                    if region in implied_languages:
-                        parsed_languages.append(implied_languages[region])
+        self.paragraphs = iter(paragraphs)
 
-            # If we still don't have anything, just assign all languages here
-            if len(parsed_languages) == 0:
-                parsed_languages = ["All"]
+        self.text = ""
+        self.links = []
+        self.advance()
 
-            tag = tag.find_next("p")
+    def advance(self):
+        """Move onto the next paragraph"""
 
-        # Alternatively, we might find something that looks like a region title,
-        # but doesn't contain any useful info
+        self.text, self.links = next(self.paragraphs, ("", []))
 
-        elif any([n in tag.text for n in regionless_titles]):
 
-            parsed_regions = ["All"]
-            parsed_languages = ["All"]
-            tag = tag.find_next("p")
+class ReleaseScanner:
 
-        else:
-            parsed_regions = ["All"]
-            parsed_languages = ["All"]
+    def __init__(
+        self,
+        dl_sites,
+        dl_mappings,
+        regions=None,
+        languages=None,
+        regionless_titles=None,
+        implied_languages=None,
+    ):
+        """Turn a flattened page into a dictionary of releases
 
-        dl_dict[current_release]["regions"] = parsed_regions
-        dl_dict[current_release]["languages"] = parsed_languages
+        Everything that doesn't depend on the page is worked out
+        up front, and then the page is scanned in a single forward
+        pass over paragraphs
 
-        # We are within a region now, so search for "Base Game/Update/DLC" here.
-        # Keep looping until we don't find anything. Keep things in list form
-        # so that we can potentially have multiples within each region
-        still_hunting_dl = True
+        Args:
+            dl_sites (list): List of download sites in preference order
+            dl_mappings (dict): Dictionary of mappings for download types
+            regions (list): list of regions potentially parse. Defaults
+                to None, which will use an empty list
+            languages (dict): list of languages potentially parse. Defaults
+                to None, which will use an empty dict
+            regionless_titles (list): list of titles that have no region info.
+                Defaults to None, which will use an empty list
+            implied_languages (dict): Dictionary of mappings from regions
+                to implied languages. Defaults to None, which will use
+                an empty dict
+        """
 
-        while still_hunting_dl:
-            found_anything_dl = False
+        if regions is None:
+            regions = []
 
-            for dl_mapping in dl_mappings:
+        if regionless_titles is None:
+            regionless_titles = []
 
-                tag_no_brackets = tag.text.split("(")[0]
+        if implied_languages is None:
+            implied_languages = {}
 
-                tag_names = dl_mappings[dl_mapping]["tag_names"]
+        self.dl_sites = dl_sites
+        self.dl_mappings = dl_mappings
+        self.regions = regions
+        self.languages = languages
+        self.regionless_titles = regionless_titles
+        self.implied_languages = implied_languages
 
-                if any([n in tag_no_brackets for n in tag_names]):
+        # Matchers for regions and languages, which are shared between pages
+        self.region_matcher = get_region_matcher(regions)
+        self.language_matcher = None
+        if languages is not None:
+            self.language_matcher = get_language_matcher(languages)
 
-                    if dl_mapping in ["Base Game", "DLC", "Update"]:
-                        tag, parsed_dict = parse_dl_tags(
-                            tag,
-                            dict_key=dl_mapping.lower(),
-                            dl_sites=dl_sites,
-                            dl_mappings=dl_mappings,
-                        )
-                    else:
-                        raise ValueError(
-                            f"Name should contain one of: {', '.join(dl_mappings.keys())}. Got {tag.text}"
-                        )
+        # Tag names for each of the download types
+        self.tag_names = [
+            (dl_mapping, dl_mappings[dl_mapping]["tag_names"])
+            for dl_mapping in dl_mappings
+        ]
 
-                    # If we don't have an empty dictionary, add things in now
-                    if len(parsed_dict) > 0:
+        # Keys we'd expect to find in a useful release
+        self.dl_keys = []
+        for dl_mapping in dl_mappings:
+            self.dl_keys.extend(list(dl_mappings[dl_mapping]["dl_tags"].keys()))
 
-                        # Get out the key, and append to the full dictionary
-                        parsed_keys = list(parsed_dict.keys())
+    def scan(self, paragraphs):
+        """Scan through paragraphs, pulling out releases
 
-                        for parsed_key in parsed_keys:
-                            if parsed_key not in dl_dict[current_release]:
-                                dl_dict[current_release][parsed_key] = []
+        Args:
+            paragraphs (iterable): Iterable of (text, links) records,
+                from get_dl_paragraphs
+        """
 
-                            # Strip any extraneous whitespace
-                            parsed_dict[parsed_key]["full_name"] = parsed_dict[
-                                parsed_key
-                            ]["full_name"].strip()
+        dl_dict = {}
 
-                            dl_dict[current_release][parsed_key].append(
-                                parsed_dict[parsed_key]
-                            )
+        cursor = ParagraphCursor(paragraphs)
 
-                    found_anything_dl = True
+        # Keep looping over to keep finding regions
+        still_hunting = True
+        release_number = 1
 
-            # If we haven't found anything, jump out here
-            if not found_anything_dl:
-                still_hunting_dl = False
+        while still_hunting:
 
-        # If we don't have anything useful in here, delete the release and leave
-        dl_keys = []
-        for dl_mapping in dl_mappings:
-            dl_keys.extend(list(dl_mappings[dl_mapping]["dl_tags"].keys()))
+            current_release = f"release_{release_number}"
+            dl_dict[current_release] = {}
 
-        if not any([n in dl_dict[current_release] for n in dl_keys]):
-            del dl_dict[current_release]
-            still_hunting = False
+            # We may find a region here, so change the current region and then start looping over tags
+            parsed_regions = self.region_matcher.parse(cursor.text)
 
-        release_number += 1
+            if len(parsed_regions) > 0:
 
-    return dl_dict
+                # Parse out languages
+                parsed_languages = parse_language_tag(
+                    cursor.text, self.language_matcher
+                )
 
+                # If we haven't found anything, use implied languages
+                if len(parsed_languages) == 0:
+                    for region in parsed_regions:
+                        if region in self.implied_languages:
+                            parsed_languages.append(self.implied_languages[region])
 
-def parse_regions(tag, regions):
-    """Parse regions from tag
+                # If we still don't have anything, just assign all languages here
+                if len(parsed_languages) == 0:
+                    parsed_languages = ["All"]
 
-    Args:
-        tag (bs4.Tag): tag object to parse
-        regions (list): list of regions potentially parse
-    """
-    parsed_regions = []
+                cursor.advance()
 
-    for region in regions:
-        if region.lower() in tag.text.lower():
-            parsed_regions.append(region)
+            # Alternatively, we might find something that looks like a region title,
+            # but doesn't contain any useful info
 
-    return parsed_regions
+            elif any([n in cursor.text for n in self.regionless_titles]):
 
+                parsed_regions = ["All"]
+                parsed_languages = ["All"]
+                cursor.advance()
 
-def parse_language_tag(tag, languages=None):
-    """From a soup tag, find things in square brackets and parse as potential languages
+            else:
+                parsed_regions = ["All"]
+                parsed_languages = ["All"]
 
-    Args:
-        tag (bs4.Tag): tag object to parse
-        languages (dict): Dictionary of languages potentially parse
-    """
+            dl_dict[current_release]["regions"] = parsed_regions
+            dl_dict[current_release]["languages"] = parsed_languages
 
-    # Figure out if we have anything here. It should be between square brackets
-    t = tag.text
+            # We are within a region now, so search for "Base Game/Update/DLC" here.
+            # Keep looping until we don't find anything. Keep things in list form
+            # so that we can potentially have multiples within each region
+            still_hunting_dl = True
 
-    reg = re.findall(r"\[(.*?)\]", t)
+            while still_hunting_dl:
+                found_anything_dl = False
 
-    # Loop over everything, and if we match then return
-    parsed_languages = []
-    for r in reg:
-        parsed_languages = parse_languages(
-            r,
-            lang_dict=languages,
-        )
-        if len(parsed_languages) > 0:
-            break
+                for dl_mapping, tag_names in self.tag_names:
 
-    return parsed_languages
+                    tag_no_brackets = cursor.text.split("(")[0]
 
+                    if any([n in tag_no_brackets for n in tag_names]):
 
-def parse_dl_tags(
-    tag,
-    dict_key,
-    dl_sites,
-    dl_mappings,
-):
-    """Parse out links for games, updates, and DLC
+                        if dl_mapping in ["Base Game", "DLC", "Update"]:
+                            parsed_dict = self.scan_links(
+                                cursor,
+                                dict_key=dl_mapping.lower(),
+                            )
+                        else:
+                            raise ValueError(
+                                f"Name should contain one of: {', '.join(self.dl_mappings.keys())}. Got {cursor.text}"
+                            )
 
-    These can either be spread out over paragraphs or inline,
-    so we distinguish between those cases here
+                        # If we don't have an empty dictionary, add things in now
+                        for parsed_key in parsed_dict:
+                            if parsed_key not in dl_dict[current_release]:
+                                dl_dict[current_release][parsed_key] = []
 
-    Args:
-        tag (bs4.Tag): starting tag object
-        dict_key (str): key to distinguish different file types
-        dl_sites (list): list of DL sites to look for in links
-        dl_mappings (dict): Dictionary of names to map to download types
-    """
+                            # Strip any extraneous whitespace
+                            parsed_dict[parsed_key]["full_name"] = parsed_dict[
+                                parsed_key
+                            ]["full_name"].strip()
+
+                            dl_dict[current_release][parsed_key].append(
+                                parsed_dict[parsed_key]
+                            )
 
-    link_dict = {}
+                        found_anything_dl = True
 
-    t = tag.text
+                # If we haven't found anything, jump out here
+                if not found_anything_dl:
+                    still_hunting_dl = False
 
-    # Start by distinguishing whether we're a base game or something else
-    if dict_key == "base game":
-        if "NSP" in t and "XCI" not in t:
-            link_dict_key = "base_game_nsp"
-        elif "XCI" in t and "NSP" not in t:
-            link_dict_key = "base_game_xci"
-        elif "NSP" not in t and "XCI" not in t:
-            link_dict_key = "base_game_undefined"
-        elif "NSP" in t and "XCI" in t:
-            raise ValueError(f"Name {t} implies both NSP *and* XCI!")
+            # If we don't have anything useful in here, delete the release and leave
+            if not any([n in dl_dict[current_release] for n in self.dl_keys]):
+                del dl_dict[current_release]
+                still_hunting = False
+
+            release_number += 1
+
+        return dl_dict
+
+    def scan_links(
+        self,
+        cursor,
+        dict_key,
+    ):
+        """Parse out links for games, updates, and DLC
+
+        These can either be spread out over paragraphs or inline,
+        so we distinguish between those cases here. Will leave the
+        cursor at the next paragraph without any links
+
+        Args:
+            cursor (ParagraphCursor): Cursor at the name of the download
+            dict_key (str): key to distinguish different file types
+        """
+
+        link_dict = {}
+
+        t = cursor.text
+
+        # Start by distinguishing whether we're a base game or something else
+        if dict_key == "base game":
+            if "NSP" in t and "XCI" not in t:
+                link_dict_key = "base_game_nsp"
+            elif "XCI" in t and "NSP" not in t:
+                link_dict_key = "base_game_xci"
+            elif "NSP" not in t and "XCI" not in t:
+                link_dict_key = "base_game_undefined"
+            elif "NSP" in t and "XCI" in t:
+                raise ValueError(f"Name {t} implies both NSP *and* XCI!")
+            else:
+                raise ValueError(f"Unsure how to parse Base Game name: {t}")
         else:
-            raise ValueError(f"Unsure how to parse Base Game name: {t}")
-    else:
-        link_dict_key = copy.deepcopy(dict_key)
+            link_dict_key = dict_key
+
+        link_dict[link_dict_key] = {}
+        link_dict[link_dict_key]["full_name"] = t
 
-    link_dict[link_dict_key] = {}
-    link_dict[link_dict_key]["full_name"] = t
+        # Loop until we're no longer finding links
+        finding_links = True
+        while finding_links:
+            cursor.advance()
+            t = cursor.text
 
-    # Loop until we're no longer finding links
-    finding_links = True
-    while finding_links:
-        found_site = False
-        tag = tag.find_next("p")
-        t = tag.text
+            site = None
+            for dl_site in self.dl_sites:
+                if dl_site in t:
+                    site = dl_site
+                    break
 
-        site = None
-        for site in dl_sites:
-            if site in t:
-                link_dict[link_dict_key][site] = []
-                found_site = True
-                break
+            if site is None:
+                finding_links = False
+                continue
 
-        if found_site:
-            # Find all the hrefs
-            href = tag.find_all("a", href=True)
+            link_dict[link_dict_key][site] = []
 
             # There can be inline tags, where the link is the download site name
             found_inline = False
 
-            for h in href:
-                ht = h.text
+            for ht, h in cursor.links:
 
-                for inline_site in dl_sites:
+                for inline_site in self.dl_sites:
                     if inline_site in ht:
 
                         if inline_site not in link_dict[link_dict_key]:
                             link_dict[link_dict_key][inline_site] = []
 
-                        link_dict[link_dict_key][inline_site].append(h["href"])
+                        link_dict[link_dict_key][inline_site].append(h)
 
                         found_inline = True
                         break
 
             # Otherwise, parse out the text and go from there
-            if not found_inline:
+            if found_inline:
+                continue
 
-                for h in href:
-                    ht = h.text
+            for ht, h in cursor.links:
 
-                    # If there's some weird phantom link, skip
-                    if ht == "":
-                        continue
+                # If there's some weird phantom link, skip
+                if ht == "":
+                    continue
 
-                    # There's an edge case here where the "base game" can actually have everything in there
-                    found_all_in_one = False
+                # There's an edge case here where the "base game" can actually have everything in there
+                found_all_in_one = False
 
-                    for dl_mapping in dl_mappings:
+                for dl_mapping, tag_names in self.tag_names:
 
-                        tag_names = dl_mappings[dl_mapping]["tag_names"]
+                    if any([n in ht for n in tag_names]):
 
-                        if any([n in ht for n in tag_names]):
+                        if dl_mapping not in link_dict:
+                            link_dict[dl_mapping.lower()] = {}
+                            link_dict[dl_mapping.lower()]["full_name"] = ht
+                            link_dict[dl_mapping.lower()][site] = []
+                        link_dict[dl_mapping.lower()][site].append(h)
 
-                            if dl_mapping not in link_dict:
-                                link_dict[dl_mapping.lower()] = {}
-                                link_dict[dl_mapping.lower()]["full_name"] = ht
-                                link_dict[dl_mapping.lower()][site] = []
-                            link_dict[dl_mapping.lower()][site].append(h["href"])
+                        found_all_in_one = True
+                        break
 
-                            found_all_in_one = True
-                            break
+                # If we just have a link, put that in now
+                if not found_all_in_one:
+                    link_dict[link_dict_key][site].append(h)
 
-                    # If we just have a link, put that in now
-                    if not found_all_in_one:
-                        link_dict[link_dict_key][site].append(h["href"])
+        # Finally, hunt through to the next paragraph WITHOUT a link in
+        while len(cursor.links) > 0:
+            cursor.advance()
 
-        else:
-            finding_links = False
-
-    # Finally, hunt through to the next tag WITHOUT a link in
-    found_links = True
-    while found_links:
-        links = tag.find_all("a", href=True)
-        if len(links) == 0:
-            found_links = False
-        else:
-            tag = tag.find_next("p", href=False)
+        # If we only have a name in here, then clear out the dictionary and leave
+        if len(link_dict[link_dict_key]) == 1:
+            link_dict = {}
 
-    # If we only have a name in here, then clear out the dictionary and leave
-    if len(link_dict[link_dict_key]) == 1:
-        link_dict = {}
+        return link_dict
+
+
+def parse_language_tag(t, language_matcher=None):
+    """From paragraph text, find things in square brackets and parse as potential languages
+
+    Args:
+        t (str): text to parse
+        language_matcher (LanguageMatcher): Matcher for languages
+            potentially parse. Defaults to None
+    """
+
+    if language_matcher is None:
+        return []
+
+    # Figure out if we have anything here. It should be between square brackets
+    reg = re.findall(r"\[(.*?)\]", t)
 
-    return tag, link_dict
+    # Loop over everything, and if we match then return
+    parsed_languages = []
+    for r in reg:
+        parsed_languages = language_matcher.parse(r)
+        if len(parsed_languages) > 0:
+            break
+
+    return parsed_languages
 
 
 def RecaptchaV3():
@@ -399,6 +475,9 @@ def bypass_ouo(
     if n_retry >= max_retries:
         raise ValueError("Max retries exceeded!")
 
+    # This is slow to import, and only needed for the bypass
+    from curl_cffi import requests as cffi_requests
+
     if impersonate is None:
         impersonate = random.choice(["chrome", "safari", "edge"])
 
@@ -529,6 +608,9 @@ def bypass_1link(
     if n_retry >= max_retries:
         raise ValueError("Max retries exceeded!")
 
+    # This is slow to import, and only needed for the bypass
+    from curl_cffi import requests as cffi_requests
+
     if impersonate is None:
         impersonate = random.choice(["chrome", "safari", "edge"])
 
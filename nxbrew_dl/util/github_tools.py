@@ -1,11 +1,11 @@
-import requests
+from .http_tools import get_http_client
 
 
 def check_github_version():
     """Check NXBrew-dl version on GitHub. Returns version and associated URL"""
 
     url = "https://api.github.com/repos/bbtufty/nxbrew-dl/releases/latest"
-    r = requests.get(url)
+    r = get_http_client().get(url)
 
     json = r.json()
 
@@ -1,46 +1,185 @@
-import os
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlparse
 
-import requests
+import lxml.etree
+import lxml.html
 from bs4 import BeautifulSoup
 
-from .regex_tools import get_game_name, check_has_filetype, parse_languages
+from .cache_tools import get_http_cache
+from .http_tools import get_http_client
+from .regex_tools import TitleClassifier, parse_languages
 
 
-def get_html_page(
+HTML_PARSERS = [
+    "html.parser",
+    "lxml",
+    "lxml-xpath",
+]
+
+
+def parse_html(
+    content,
+    parser="html.parser",
+):
+    """Parse HTML content into a tree
+
+    For "html.parser" and "lxml", this is a BeautifulSoup object
+    using that parser. For "lxml-xpath", this skips bs4 entirely
+    and returns the raw lxml document
+
+    Args:
+        content (bytes): HTML content
+        parser (str): Parser backend to use. Should be one of
+            HTML_PARSERS. Defaults to "html.parser"
+    """
+
+    if parser not in HTML_PARSERS:
+        raise ValueError(
+            f"Parser should be one of {', '.join(HTML_PARSERS)}. Got {parser}"
+        )
+
+    if parser == "lxml-xpath":
+
+        # Without a declared encoding lxml will assume latin-1, whereas
+        # bs4 will sniff out UTF-8, so force that if it works
+        html_parser = None
+        try:
+            content.decode("utf-8")
+            html_parser = lxml.html.HTMLParser(encoding="utf-8")
+        except (AttributeError, UnicodeDecodeError):
+            pass
+
+        soup = lxml.html.document_fromstring(content, parser=html_parser)
+    else:
+        soup = BeautifulSoup(content, parser)
+
+    return soup
+
+
+def get_html_content(
     url,
     cache=False,
-    cache_filename="index.html",
+    cache_dir=None,
 ):
-    """Get an HTML page as a soup
+    """Get the raw content of an HTML page
 
     Args:
         url (string): URL
-        cache (bool): If True, will save the game index as a cache. Defaults to False
-        cache_filename (string): Filename to cache file to. Defaults to "index.html"
+        cache (bool): If True, will go through the on-disk HTTP cache,
+            revalidating any cached page. Defaults to False
+        cache_dir (string): Directory for the HTTP cache. Defaults to None,
+            which will use "http_cache" in the current directory
     """
 
     if not cache:
-        r = requests.get(url)
-        soup = BeautifulSoup(r.content, "html.parser")
+        r = get_http_client().get(url)
+        r = r.content
     else:
-        if not os.path.exists(cache_filename):
-            r = requests.get(url)
-            with open(cache_filename, mode="wb") as f:
-                f.write(r.content)
-            r = r.content
-        else:
-            with open(cache_filename, mode="rb") as f:
-                r = f.read()
-        soup = BeautifulSoup(r, "html.parser")
+        r = get_http_cache(cache_dir).get(url)
+
+    return r
+
+
+def get_html_page(
+    url,
+    cache=False,
+    cache_dir=None,
+    parser="html.parser",
+):
+    """Get an HTML page as a soup
+
+    Args:
+        url (string): URL
+        cache (bool): If True, will go through the on-disk HTTP cache,
+            revalidating any cached page. Defaults to False
+        cache_dir (string): Directory for the HTTP cache. Defaults to None,
+            which will use "http_cache" in the current directory
+        parser (str): Parser backend to use. Should be one of
+            HTML_PARSERS. Defaults to "html.parser"
+    """
+
+    r = get_html_content(
+        url,
+        cache=cache,
+        cache_dir=cache_dir,
+    )
+
+    soup = parse_html(r, parser=parser)
 
     return soup
 
 
+def is_lxml_tree(tag):
+    """Check whether a tag comes from the pure lxml backend
+
+    Args:
+        tag (bs4.Tag or lxml.html.HtmlElement): tag object to check
+    """
+
+    return isinstance(tag, lxml.html.HtmlElement)
+
+
+def find_all_tags(soup, name):
+    """Find all tags with a particular name
+
+    Args:
+        soup (bs4.Tag or lxml.html.HtmlElement): tree to search
+        name (str): Tag name
+    """
+
+    if is_lxml_tree(soup):
+        return list(soup.iterdescendants(name))
+
+    return soup.find_all(name)
+
+
+def get_tag_text(tag):
+    """Get all the text within a tag
+
+    Args:
+        tag (bs4.Tag or lxml.html.HtmlElement): tag object
+    """
+
+    if is_lxml_tree(tag):
+        return str(tag.text_content())
+
+    return tag.text
+
+
+def get_next_sibling_text(tag):
+    """Get the text of whatever directly follows a tag
+
+    Args:
+        tag (bs4.Tag or lxml.html.HtmlElement): tag object
+    """
+
+    if is_lxml_tree(tag):
+
+        # Trailing text comes first, otherwise it's the next element
+        if tag.tail is not None:
+            return str(tag.tail)
+        return get_tag_text(tag.getnext())
+
+    return tag.next_sibling.text
+
+
+def get_tag_links(tag):
+    """Get the text and URL for all links within a tag
+
+    Args:
+        tag (bs4.Tag or lxml.html.HtmlElement): tag object
+    """
+
+    if is_lxml_tree(tag):
+        return [(get_tag_text(h), str(h.get("href"))) for h in tag.xpath(".//a[@href]")]
+
+    return [(h.text, h["href"]) for h in tag.find_all("a", href=True)]
+
+
 def get_game_dict(
     general_config,
     regex_config,
     nxbrew_url,
+    cache=False,
 ):
     """Download the game index, and parse relevant info out of it
 
@@ -48,6 +187,8 @@ def get_game_dict(
         general_config (dict): General configuration
         regex_config (dict): Regex configuration
         nxbrew_url (string): NXBrew URL
+        cache (bool): If True, will go through the on-disk HTTP cache.
+            Defaults to False
     """
 
     game_dict = {}
@@ -55,64 +196,278 @@ def get_game_dict(
     url = urljoin(nxbrew_url, "Index/game-index/games/")
 
     # Load in the HTML
+    parser = general_config.get("html_parser", "html.parser")
     game_html = get_html_page(
         url,
-        cache_filename="game_index.html",
+        cache=cache,
+        parser=parser,
     )
-    index = game_html.find("div", {"id": "easyindex-index"})
 
-    nsp_xci_variations = regex_config["nsp_variations"] + regex_config["xci_variations"]
-    for item in index.find_all("li"):
+    if is_lxml_tree(game_html):
+        index = game_html.xpath("//div[@id='easyindex-index']")[0]
+    else:
+        index = game_html.find("div", {"id": "easyindex-index"})
+
+    # Pull out the long names and URLs first, so we can classify everything in one go
+    long_names = []
+    urls = []
+    seen_urls = set()
+    for item in find_all_tags(index, "li"):
 
-        # Get the long name, the short name, and the URL
-        long_name = item.text
+        # Get the long name and the URL
+        long_name = get_tag_text(item)
 
         # If there are any forbidden titles, skip them here
         if long_name in general_config["forbidden_titles"]:
             continue
 
-        short_name = get_game_name(long_name, nsp_xci_variations=nsp_xci_variations)
-        url = item.find("a").get("href")
+        if is_lxml_tree(item):
+            url = str(item.find(".//a").get("href"))
+        else:
+            url = item.find("a").get("href")
 
-        if url in game_dict:
+        if url in seen_urls:
             raise ValueError(f"Duplicate URLs found: {url}")
+        seen_urls.add(url)
+
+        long_names.append(long_name)
+        urls.append(url)
 
-        # Pull out whether NSP/XCI, and whether it has updates/DLCs
-        remaining_name = long_name.replace(short_name, "")
-        has_nsp = check_has_filetype(remaining_name, regex_config["nsp_variations"])
-        has_xci = check_has_filetype(remaining_name, regex_config["xci_variations"])
-        has_update = check_has_filetype(
-            remaining_name, regex_config["update_variations"]
+    # Get the short name, and whether NSP/XCI and whether it has updates/DLCs
+    classifier = TitleClassifier(regex_config)
+    title_dicts = classifier.classify_all(long_names)
+
+    for long_name, url, title_dict in zip(long_names, urls, title_dicts):
+        game_dict[url] = get_game_entry(
+            long_name=long_name,
+            url=url,
+            title_dict=title_dict,
         )
-        has_dlc = check_has_filetype(remaining_name, regex_config["dlc_variations"])
-
-        game_dict[url] = {
-            "long_name": long_name,
-            "short_name": short_name,
-            "url": url,
-            "has_nsp": has_nsp,
-            "has_xci": has_xci,
-            "has_update": has_update,
-            "has_dlc": has_dlc,
-        }
 
     return game_dict
 
 
+def get_game_entry(
+    long_name,
+    url,
+    title_dict,
+):
+    """Build the entry for a single game in the game index
+
+    Args:
+        long_name (str): Full title, as in the game index
+        url (str): URL for the game
+        title_dict (dict): Short name and filetype flags, from
+            a TitleClassifier
+    """
+
+    game_entry = {
+        "long_name": long_name,
+        "short_name": title_dict["short_name"],
+        "url": url,
+        "has_nsp": title_dict["has_nsp"],
+        "has_xci": title_dict["has_xci"],
+        "has_update": title_dict["has_update"],
+        "has_dlc": title_dict["has_dlc"],
+    }
+
+    return game_entry
+
+
+def get_url_path(url):
+    """Get the normalized path for a URL, for matching up URLs across domains
+
+    Args:
+        url (str): URL
+    """
+
+    return urlparse(url).path.rstrip("/")
+
+
+def get_game_dict_delta(
+    old_game_dict,
+    new_game_dict,
+):
+    """Find what's changed between two game dictionaries
+
+    Games are matched up by URL path, so a change of domain shows
+    up as a change rather than everything being removed and re-added
+
+    Args:
+        old_game_dict (dict): Previous game dictionary
+        new_game_dict (dict): New game dictionary
+    """
+
+    old_paths = {get_url_path(url): url for url in old_game_dict}
+    new_paths = {get_url_path(url): url for url in new_game_dict}
+
+    delta = {
+        "added": [],
+        "removed": [],
+        "changed": [],
+        "unchanged": [],
+    }
+
+    for path, url in new_paths.items():
+
+        if path not in old_paths:
+            delta["added"].append(url)
+            continue
+
+        # If anything about the game is different (renamed, re-flagged, moved), mark as changed
+        old_url = old_paths[path]
+        old_game = old_game_dict[old_url]
+        new_game = new_game_dict[url]
+
+        if any([old_game.get(key, None) != new_game[key] for key in new_game]):
+            delta["changed"].append((old_url, url))
+        else:
+            delta["unchanged"].append((old_url, url))
+
+    for path, url in old_paths.items():
+        if path not in new_paths:
+            delta["removed"].append(url)
+
+    return delta
+
+
+def open_game_index(
+    nxbrew_url,
+    cache=False,
+):
+    """Open the game index page, ready to be streamed
+
+    Args:
+        nxbrew_url (string): NXBrew URL
+        cache (bool): If True, will go through the on-disk HTTP cache.
+            Defaults to False
+    """
+
+    url = urljoin(nxbrew_url, "Index/game-index/games/")
+
+    if cache:
+        response = get_http_cache().open(url)
+    else:
+        response = get_http_client().get(url, stream=True)
+
+    return response
+
+
+def iter_game_index(
+    general_config,
+    regex_config,
+    nxbrew_url,
+    cache=False,
+    chunk_size=65536,
+    response=None,
+):
+    """Stream the game index, yielding each game as it's parsed
+
+    Rather than downloading the whole index and then building a
+    soup, this feeds the response into an incremental parser as it
+    arrives. Each <li> is thrown away once it's been parsed, so memory
+    stays flat however big the index gets. Entries match those from
+    get_game_dict
+
+    Args:
+        general_config (dict): General configuration
+        regex_config (dict): Regex configuration
+        nxbrew_url (string): NXBrew URL
+        cache (bool): If True, will go through the on-disk HTTP cache.
+            Defaults to False
+        chunk_size (int): Size of chunks to read from the response.
+            Defaults to 65536
+        response: Response for the index, if it's already been opened
+            with open_game_index. Defaults to None, which will open it
+            here
+    """
+
+    classifier = TitleClassifier(regex_config)
+    seen_urls = set()
+
+    if response is None:
+        response = open_game_index(nxbrew_url, cache=cache)
+
+    with response as r:
+
+        # Without a declared encoding lxml will assume latin-1,
+        # so default to UTF-8 here
+        encoding = "utf-8"
+        if "charset" in r.headers.get("content-type", ""):
+            encoding = r.encoding
+
+        html_parser = lxml.etree.HTMLPullParser(
+            events=("start", "end"),
+            encoding=encoding,
+        )
+
+        in_index = False
+        index_element = None
+
+        chunks = r.iter_content(chunk_size=chunk_size)
+        finished = False
+        while not finished:
+
+            chunk = next(chunks, None)
+            if chunk is None:
+                html_parser.close()
+                finished = True
+            else:
+                html_parser.feed(chunk)
+
+            for event, element in html_parser.read_events():
+
+                # Keep track of whether we're within the index
+                if element.tag == "div" and element.get("id") == "easyindex-index":
+                    if event == "start" and index_element is None:
+                        in_index = True
+                        index_element = element
+                    elif event == "end" and element is index_element:
+                        in_index = False
+                    continue
+
+                if not in_index or event != "end" or element.tag != "li":
+                    continue
+
+                # Get the long name and the URL
+                long_name = "".join(element.itertext())
+                item_url = element.find(".//a").get("href")
+
+                # Clear out the element and anything before it, so we don't keep the whole tree around
+                element.clear(keep_tail=True)
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+
+                # If there are any forbidden titles, skip them here
+                if long_name in general_config["forbidden_titles"]:
+                    continue
+
+                if item_url in seen_urls:
+                    raise ValueError(f"Duplicate URLs found: {item_url}")
+                seen_urls.add(item_url)
+
+                yield get_game_entry(
+                    long_name=long_name,
+                    url=item_url,
+                    title_dict=classifier.classify(long_name),
+                )
+
+
 def get_languages(soup, lang_dict):
     """Parse languages from a soup
 
     Args:
-        soup (bs4.BeautifulSoup): soup object to find languages in
+        soup (bs4.BeautifulSoup or lxml.html.HtmlElement): soup object
+            to find languages in
         lang_dict (dict): Dictionary of languages
     """
 
     # Parse out languages, find the <strong> tag with language in it,
     # and then find the next_sibling
-    strong_tag = soup.findAll("strong")
+    strong_tag = find_all_tags(soup, "strong")
     for s in strong_tag:
-        if "language" in s.text.lower():
-            lang_str = s.next_sibling.text
+        if "language" in get_tag_text(s).lower():
+            lang_str = get_next_sibling_text(s)
             langs = parse_languages(
                 lang_str,
                 lang_dict=lang_dict,
@@ -124,10 +479,15 @@ def get_thumb_url(soup):
     """Parse thumbnail URL from a soup
 
     Args:
-        soup (bs4.BeautifulSoup): soup object to find languages in
+        soup (bs4.BeautifulSoup or lxml.html.HtmlElement): soup object
+            to find thumbnail in
     """
 
-    img = soup.find("meta", {"property": "og:image"})
-    url = img["content"]
+    if is_lxml_tree(soup):
+        img = soup.xpath("//meta[@property='og:image']")[0]
+        url = str(img.get("content"))
+    else:
+        img = soup.find("meta", {"property": "og:image"})
+        url = img["content"]
 
     return url
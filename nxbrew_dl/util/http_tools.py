@@ -0,0 +1,150 @@
+import socket
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+
+# Default to a short connect timeout, but be patient with slow pages
+DEFAULT_HTTP_CONFIG = {
+    "connect_timeout": 10,
+    "read_timeout": 60,
+    "max_hosts": 10,
+    "max_connections_per_host": 8,
+}
+
+HTTP_CLIENT = None
+HTTP_CLIENT_LOCK = threading.Lock()
+
+
+class HTTPClient:
+
+    def __init__(
+        self,
+        http_config=None,
+    ):
+        """Pooled HTTP client, shared between all site requests
+
+        Connections are kept alive and reused, so a run over many
+        pages only pays for the TCP/TLS handshake once per host.
+        Compressed responses are asked for, and every request gets
+        a timeout unless one is given
+
+        Args:
+            http_config (dict): HTTP configuration. Defaults to None,
+                which will use DEFAULT_HTTP_CONFIG. Any missing keys
+                will also be taken from there
+        """
+
+        if http_config is None:
+            http_config = {}
+
+        self.http_config = dict(DEFAULT_HTTP_CONFIG)
+        self.http_config.update(http_config)
+
+        self.timeout = (
+            self.http_config["connect_timeout"],
+            self.http_config["read_timeout"],
+        )
+
+        # Limit connections per host, blocking rather than opening
+        # extra throwaway connections if we hit that limit
+        adapter = HTTPAdapter(
+            pool_connections=self.http_config["max_hosts"],
+            pool_maxsize=self.http_config["max_connections_per_host"],
+            pool_block=True,
+        )
+
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Accept-Encoding": ACCEPT_ENCODING})
+
+    def request(self, method, url, **kwargs):
+        """Make a request, using the default timeout if one isn't given
+
+        Args:
+            method (str): HTTP method
+            url (str): URL
+            **kwargs: Other arguments to pass to requests
+        """
+
+        kwargs.setdefault("timeout", self.timeout)
+
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        """Make a GET request
+
+        Args:
+            url (str): URL
+            **kwargs: Other arguments to pass to requests
+        """
+
+        return self.request("GET", url, **kwargs)
+
+    def close(self):
+        """Close all pooled connections"""
+
+        self.session.close()
+
+
+def get_http_client(http_config=None):
+    """Get the shared HTTP client
+
+    Args:
+        http_config (dict): HTTP configuration. Defaults to None, which
+            will use whatever the shared client already has. If this
+            differs from the current configuration, the shared client
+            will be rebuilt
+    """
+
+    global HTTP_CLIENT
+
+    with HTTP_CLIENT_LOCK:
+
+        if HTTP_CLIENT is None:
+            HTTP_CLIENT = HTTPClient(http_config)
+
+        elif http_config is not None:
+            new_http_config = dict(DEFAULT_HTTP_CONFIG)
+            new_http_config.update(http_config)
+
+            # Anything still using the old client can keep doing so
+            if new_http_config != HTTP_CLIENT.http_config:
+                HTTP_CLIENT = HTTPClient(http_config)
+
+    return HTTP_CLIENT
+
+
+def abort_response(response):
+    """Abort a streaming response from another thread, so a read in progress returns straight away
+
+    Closing a response waits for any read that's going on, which can
+    take as long as the read timeout. Shutting down the socket
+    underneath makes that read fail immediately instead. Returns
+    whether there was a connection to shut down
+
+    Args:
+        response (requests.Response): Response to abort. Responses from
+            the HTTP cache are fine too
+    """
+
+    # Responses from the HTTP cache wrap the live response, if there is one
+    if not isinstance(response, requests.Response):
+        response = getattr(response, "response", None)
+    if response is None:
+        return False
+
+    raw = getattr(response, "raw", None)
+    connection = getattr(raw, "_connection", None)
+    sock = getattr(connection, "sock", None)
+    if sock is None:
+        return False
+
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        return False
+
+    return True
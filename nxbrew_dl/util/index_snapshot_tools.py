@@ -0,0 +1,299 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+SNAPSHOT_MAGIC = b"NXBI"
+SNAPSHOT_VERSION = 1
+
+# Magic, version, padding, number of games, number of strings
+SNAPSHOT_HEADER = struct.Struct("<4sHHII")
+
+# Each game's flags are packed into a single byte
+SNAPSHOT_FLAGS = {
+    "has_nsp": 1,
+    "has_xci": 2,
+    "has_update": 4,
+    "has_dlc": 8,
+}
+
+# Strings stored for each game
+SNAPSHOT_STRING_KEYS = ["long_name", "short_name", "url"]
+
+# The first strings are the hashes for what the index was built from
+INDEX_HASH_STRING = 0
+CONFIG_HASH_STRING = 1
+
+
+def get_uint_array(buffer):
+    """Get an array of little-endian unsigned ints from a buffer
+
+    On little-endian machines, this is a view straight onto the buffer
+    rather than a copy
+
+    Args:
+        buffer (memoryview): Buffer to read from
+    """
+
+    if sys.byteorder == "little":
+        return buffer.cast("I")
+
+    values = array("I", buffer)
+    values.byteswap()
+
+    return values
+
+
+def save_index_snapshot(
+    game_dict,
+    snapshot_file,
+    index_hash="",
+    config_hash="",
+):
+    """Save the game index as a compact binary snapshot, atomically
+
+    The layout is a fixed header, then offsets into a string table,
+    the string IDs for each game, a byte of flags for each game, and
+    finally the string table itself. Everything's little-endian and
+    the arrays are aligned, so the file can be memory-mapped and read
+    without parsing
+
+    Args:
+        game_dict (dict): Game dictionary
+        snapshot_file (str): Path to the snapshot
+        index_hash (str): Hash of the index page this came from.
+            Defaults to ""
+        config_hash (str): Hash of the config used to parse the index.
+            Defaults to ""
+    """
+
+    strings = {}
+
+    def get_string_id(string):
+        if string not in strings:
+            strings[string] = len(strings)
+        return strings[string]
+
+    get_string_id(index_hash)
+    get_string_id(config_hash)
+
+    game_strings = array("I")
+    game_flags = array("B")
+
+    for game in game_dict.values():
+        for key in SNAPSHOT_STRING_KEYS:
+            game_strings.append(get_string_id(game[key]))
+
+        flags = 0
+        for key, flag in SNAPSHOT_FLAGS.items():
+            if game[key]:
+                flags |= flag
+        game_flags.append(flags)
+
+    # Pack the strings together, keeping track of where each one starts
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = array("I", [0])
+    for string in encoded:
+        offsets.append(offsets[-1] + len(string))
+
+    if sys.byteorder != "little":
+        offsets.byteswap()
+        game_strings.byteswap()
+
+    header = SNAPSHOT_HEADER.pack(
+        SNAPSHOT_MAGIC,
+        SNAPSHOT_VERSION,
+        0,
+        len(game_flags),
+        len(encoded),
+    )
+
+    tmp_file = f"{snapshot_file}.tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(header)
+        f.write(offsets.tobytes())
+        f.write(game_strings.tobytes())
+        f.write(game_flags.tobytes())
+        f.write(b"".join(encoded))
+    os.replace(tmp_file, snapshot_file)
+
+    return True
+
+
+class IndexSnapshot:
+
+    def __init__(
+        self,
+        snapshot_file,
+    ):
+        """Read-only view of a game index snapshot
+
+        The file is memory-mapped, and strings are only decoded as
+        they're asked for
+
+        Args:
+            snapshot_file (str): Path to the snapshot
+        """
+
+        self.snapshot_file = snapshot_file
+
+        with open(snapshot_file, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buffer = memoryview(self.mmap)
+
+        try:
+            self.read_header()
+        except ValueError:
+            self.close()
+            raise
+
+    def read_header(self):
+        """Read the header, and find where everything is"""
+
+        if len(self.buffer) < SNAPSHOT_HEADER.size:
+            raise ValueError(f"{self.snapshot_file} is too short to be a snapshot")
+
+        magic, version, _, n_games, n_strings = SNAPSHOT_HEADER.unpack_from(self.buffer)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{self.snapshot_file} is not a game index snapshot")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(
+                f"{self.snapshot_file} has version {version}, expected {SNAPSHOT_VERSION}"
+            )
+
+        self.n_games = n_games
+
+        n_keys = len(SNAPSHOT_STRING_KEYS)
+        table_size = 4 * (n_strings + 1) + 4 * n_keys * n_games + n_games
+        if len(self.buffer) < SNAPSHOT_HEADER.size + table_size:
+            raise ValueError(f"{self.snapshot_file} is truncated")
+
+        start = SNAPSHOT_HEADER.size
+        end = start + 4 * (n_strings + 1)
+        self.offsets = get_uint_array(self.buffer[start:end])
+
+        start = end
+        end = start + 4 * n_keys * n_games
+        self.game_strings = get_uint_array(self.buffer[start:end])
+
+        start = end
+        end = start + n_games
+        self.game_flags = self.buffer[start:end]
+
+        self.strings = self.buffer[end:]
+
+        if len(self.strings) != self.offsets[-1]:
+            raise ValueError(f"{self.snapshot_file} is truncated")
+
+        # Check everything points somewhere sensible, so a bad snapshot
+        # fails here rather than part way through reading it
+        offsets = self.offsets.tolist()
+        if offsets[0] != 0 or any(a > b for a, b in zip(offsets[:-1], offsets[1:])):
+            raise ValueError(f"{self.snapshot_file} has invalid string offsets")
+
+        if n_games > 0 and max(self.game_strings.tolist()) >= n_strings:
+            raise ValueError(f"{self.snapshot_file} has invalid string IDs")
+
+        return True
+
+    @property
+    def index_hash(self):
+        """Hash of the index page the snapshot was built from"""
+
+        return self.get_string(INDEX_HASH_STRING)
+
+    @property
+    def config_hash(self):
+        """Hash of the config used to parse the index"""
+
+        return self.get_string(CONFIG_HASH_STRING)
+
+    def get_string(self, string_id):
+        """Decode a string from the string table
+
+        Args:
+            string_id (int): ID of the string
+        """
+
+        start = self.offsets[string_id]
+        end = self.offsets[string_id + 1]
+
+        return str(self.strings[start:end], "utf-8")
+
+    def get_game(self, idx):
+        """Get the entry for a game, as in the game dictionary
+
+        Args:
+            idx (int): Index of the game
+        """
+
+        n_keys = len(SNAPSHOT_STRING_KEYS)
+
+        game = {}
+        for i, key in enumerate(SNAPSHOT_STRING_KEYS):
+            game[key] = self.get_string(self.game_strings[n_keys * idx + i])
+
+        flags = self.game_flags[idx]
+        for key, flag in SNAPSHOT_FLAGS.items():
+            game[key] = bool(flags & flag)
+
+        return game
+
+    def get_strings(self):
+        """Decode the whole string table in one go"""
+
+        offsets = self.offsets.tolist()
+        strings = bytes(self.strings)
+
+        return [
+            str(strings[start:end], "utf-8")
+            for start, end in zip(offsets[:-1], offsets[1:])
+        ]
+
+    def get_game_dict(self):
+        """Get the full game dictionary
+
+        This decodes everything at once, which is much quicker than
+        going game by game
+        """
+
+        strings = self.get_strings()
+        game_strings = self.game_strings.tolist()
+        n_keys = len(SNAPSHOT_STRING_KEYS)
+
+        game_dict = {}
+        for idx, flags in enumerate(self.game_flags.tolist()):
+            game = {}
+            for i, key in enumerate(SNAPSHOT_STRING_KEYS):
+                game[key] = strings[game_strings[n_keys * idx + i]]
+            for key, flag in SNAPSHOT_FLAGS.items():
+                game[key] = bool(flags & flag)
+            game_dict[game["url"]] = game
+
+        return game_dict
+
+    def close(self):
+        """Let go of the file"""
+
+        self.offsets = None
+        self.game_strings = None
+        self.game_flags = None
+        self.strings = None
+        self.buffer.release()
+        self.mmap.close()
+
+        return True
+
+    def __len__(self):
+        return self.n_games
+
+    def __iter__(self):
+        for idx in range(self.n_games):
+            yield self.get_game(idx)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
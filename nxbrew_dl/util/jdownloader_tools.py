@@ -0,0 +1,1038 @@
+import copy
+import time
+
+from .download_tools import bypass_ouo, bypass_1link
+
+# Lifecycle of a package, from waiting for a free slot to the package
+# being downloaded, extracted and cleaned up
+PACKAGE_QUEUED = "queued"
+PACKAGE_ADDED = "added"
+PACKAGE_ONLINE_CHECKED = "online-checked"
+PACKAGE_DOWNLOADING = "downloading"
+PACKAGE_EXTRACTING = "extracting"
+PACKAGE_DONE = "done"
+PACKAGE_FAILED = "failed"
+PACKAGE_STUCK = "stuck"
+
+DEFAULT_MAX_ACTIVE_PACKAGES = 3
+
+# Poll quickly while links are being grabbed, and back off during long downloads.
+# Packages that haven't made progress within the timeouts are reported as stuck.
+# Packages can take a moment to show up in the download list after being moved,
+# so give them a few polls before failing
+DEFAULT_POLL_CONFIG = {
+    "min_interval": 1,
+    "max_interval": 30,
+    "extract_interval": 2,
+    "checks_per_download": 10,
+    "grab_timeout": 300,
+    "stall_timeout": 900,
+    "settle_time": 5,
+    "find_polls": 3,
+}
+
+# Events are only used to wake up early, so skip anything that just reports progress
+JD_EVENT_SUBSCRIPTIONS = [".*"]
+JD_EVENT_EXCLUSIONS = [".*bytesLoaded.*", ".*speed.*", ".*eta.*"]
+
+# myjdapi gives up on any request after 3s (and on a direct connection, backs off
+# to the relay), so each listen has to come back well within that
+JD_EVENT_LISTEN_TIME = 2.5
+
+
+class JDPackage:
+
+    def __init__(
+        self,
+        package_name,
+        dl_dict,
+        out_dir,
+        dl_sites,
+        on_complete=None,
+    ):
+        """A package being downloaded through JDownloader
+
+        Args:
+            package_name (str): Name of package, which defines the
+                subdirectory and is used to find it in JDownloader
+            dl_dict (dict): Dictionary of download files
+            out_dir (str): Directory to save downloaded files
+            dl_sites (list): Download sites to try, in priority order
+            on_complete (callable): Function to call once the package
+                has been successfully downloaded. Defaults to None
+        """
+
+        self.package_name = package_name
+        self.dl_dict = dl_dict
+        self.out_dir = out_dir
+        self.on_complete = on_complete
+
+        # Sites we've still to try, in priority order. Skip anything without
+        # links, since that package would never show up
+        self.dl_sites = [
+            dl_site for dl_site in dl_sites if len(dl_dict.get(dl_site, [])) > 0
+        ]
+
+        self.state = PACKAGE_QUEUED
+        self.dl_site = None
+        self.dl_links = []
+        self.job_ids = []
+        self.package_id = None
+        self.finished_time = None
+        self.find_misses = 0
+
+        # For tracking how a package is getting on
+        self.progress = None
+        self.progress_time = time.time()
+        self.bytes_loaded = None
+        self.bytes_total = None
+        self.speed = None
+        self.speed_time = None
+
+    def set_state(self, state):
+        """Move the package on to a new state, which counts as progress
+
+        Args:
+            state (str): Lifecycle state
+        """
+
+        self.state = state
+        self.progress = None
+        self.progress_time = time.time()
+
+        return True
+
+    def update_progress(self, progress):
+        """Update the progress of the package, keeping track of when it last changed
+
+        Args:
+            progress: Anything that changes as the package progresses
+        """
+
+        if progress != self.progress:
+            self.progress = progress
+            self.progress_time = time.time()
+
+        return True
+
+
+class JDStateMirror:
+
+    def __init__(
+        self,
+        jd_device,
+    ):
+        """Local mirror of the JDownloader state for the packages we're tracking
+
+        Rather than pulling every package and link in JDownloader and
+        hunting through them by name, this asks for the links from our
+        own crawl jobs, and packages/links by UUID. Everything is kept
+        keyed by UUID, and refreshed in a single snapshot per poll that's
+        shared between all the active packages
+
+        Args:
+            jd_device (myjdapi.myjdapi.Jddevice): JDownloader device
+        """
+
+        self.jd_device = jd_device
+
+        self.linkgrabber_packages = {}
+        self.linkgrabber_links = {}
+        self.download_packages = {}
+        self.download_links = {}
+
+    def refresh(
+        self,
+        job_ids=None,
+        linkgrabber_names=None,
+        download_names=None,
+        download_package_ids=None,
+        extraction_package_ids=None,
+    ):
+        """Take a snapshot of the state, only asking for what we need
+
+        Args:
+            job_ids (list): Crawl job IDs for links in the linkgrabber.
+                Defaults to None
+            linkgrabber_names (list): Names of linkgrabber packages
+                we don't have crawl job IDs for. Defaults to None
+            download_names (list): Names of packages just moved to the
+                download list, which we don't have UUIDs for yet.
+                Defaults to None
+            download_package_ids (list): UUIDs of downloading packages.
+                Defaults to None
+            extraction_package_ids (list): UUIDs of packages to check
+                extraction for. Defaults to None
+        """
+
+        if job_ids or linkgrabber_names:
+            self.refresh_linkgrabber(
+                job_ids=job_ids,
+                linkgrabber_names=linkgrabber_names,
+            )
+
+        # The package ID changes when it moves to downloads so find it again.
+        # There's no way to filter by name, but this only happens once per package
+        if download_names:
+            package_list = self.jd_device.downloads.query_packages(
+                [{"maxResults": -1, "startAt": 0}]
+            )
+            for p in package_list:
+                if p["name"] in download_names:
+                    self.download_packages[p["uuid"]] = p
+
+        if download_package_ids:
+            package_list = self.jd_device.downloads.query_packages(
+                [
+                    {
+                        "packageUUIDs": download_package_ids,
+                        "status": True,
+                        "finished": True,
+                        "bytesLoaded": True,
+                        "bytesTotal": True,
+                        "speed": True,
+                        "eta": True,
+                        "maxResults": -1,
+                        "startAt": 0,
+                    }
+                ]
+            )
+            for p in package_list:
+                self.download_packages[p["uuid"]] = p
+
+        if extraction_package_ids:
+            link_list = self.jd_device.downloads.query_links(
+                [
+                    {
+                        "packageUUIDs": extraction_package_ids,
+                        "status": True,
+                        "extractionStatus": True,
+                        "finished": True,
+                        "maxResults": -1,
+                        "startAt": 0,
+                    }
+                ]
+            )
+
+            # Swap out the links for these packages
+            self.download_links = {
+                k: l
+                for k, l in self.download_links.items()
+                if l["packageUUID"] not in extraction_package_ids
+            }
+            for l in link_list:
+                self.download_links[l["uuid"]] = l
+
+        return True
+
+    def refresh_linkgrabber(
+        self,
+        job_ids=None,
+        linkgrabber_names=None,
+    ):
+        """Snapshot the linkgrabber links and packages for our crawl jobs
+
+        Args:
+            job_ids (list): Crawl job IDs for links in the linkgrabber.
+                Defaults to None
+            linkgrabber_names (list): Names of linkgrabber packages
+                we don't have crawl job IDs for. Defaults to None
+        """
+
+        link_list = []
+        if job_ids:
+            link_list = self.jd_device.linkgrabber.query_links(
+                [
+                    {
+                        "jobUUIDs": job_ids,
+                        "availability": True,
+                        "maxResults": -1,
+                        "startAt": 0,
+                    }
+                ]
+            )
+        package_ids = set([l["packageUUID"] for l in link_list])
+
+        # Without a crawl job, we have to find packages by name
+        if linkgrabber_names:
+            package_list = self.jd_device.linkgrabber.query_packages(
+                [{"maxResults": -1, "startAt": 0}]
+            )
+            named_package_ids = [
+                p["uuid"]
+                for p in package_list
+                if p["name"] in linkgrabber_names and p["uuid"] not in package_ids
+            ]
+
+            if len(named_package_ids) > 0:
+                link_list.extend(
+                    self.jd_device.linkgrabber.query_links(
+                        [
+                            {
+                                "packageUUIDs": named_package_ids,
+                                "availability": True,
+                                "maxResults": -1,
+                                "startAt": 0,
+                            }
+                        ]
+                    )
+                )
+                package_ids.update(named_package_ids)
+
+        package_list = []
+        if len(package_ids) > 0:
+            package_list = self.jd_device.linkgrabber.query_packages(
+                [
+                    {
+                        "packageUUIDs": list(package_ids),
+                        "childCount": True,
+                        "maxResults": -1,
+                        "startAt": 0,
+                    }
+                ]
+            )
+
+        self.linkgrabber_packages = {p["uuid"]: p for p in package_list}
+        self.linkgrabber_links = {l["uuid"]: l for l in link_list}
+
+        return True
+
+    def find_package(self, packages, name):
+        """Find a package by name in part of the mirror
+
+        Args:
+            packages (dict): Packages, keyed by UUID
+            name (str): Package name
+        """
+
+        for p in packages.values():
+            if p["name"] == name:
+                return p
+
+        return None
+
+    def get_links(self, links, package_id):
+        """Get the links for a package in part of the mirror
+
+        Args:
+            links (dict): Links, keyed by UUID
+            package_id (int): Package UUID
+        """
+
+        return [l for l in links.values() if l["packageUUID"] == package_id]
+
+    def forget(self, package_ids):
+        """Remove packages, and their links, from the mirror
+
+        Args:
+            package_ids (list): Package UUIDs to remove
+        """
+
+        for packages, links in [
+            (self.linkgrabber_packages, self.linkgrabber_links),
+            (self.download_packages, self.download_links),
+        ]:
+            for package_id in package_ids:
+                packages.pop(package_id, None)
+            for k in [k for k, l in links.items() if l["packageUUID"] in package_ids]:
+                links.pop(k)
+
+        return True
+
+
+class JDEventListener:
+
+    def __init__(
+        self,
+        jd_device,
+    ):
+        """Listen for events from JDownloader, to wake up early from a poll
+
+        This goes through the JDownloader events API if the device
+        gives us access to it. The events themselves aren't used, the
+        state still all comes from polling, but it means we can wait
+        longer between polls without missing things. If anything goes
+        wrong, this will just turn itself off and we go back to sleeping
+
+        Args:
+            jd_device (myjdapi.myjdapi.Jddevice): JDownloader device
+        """
+
+        self.jd_device = jd_device
+        self.available = hasattr(jd_device, "action")
+
+        self.subscription_id = None
+
+    def wait(self):
+        """Wait for events, for up to JD_EVENT_LISTEN_TIME. Returns True if anything happened
+
+        If we can't listen for events, this returns False straight away
+        and turns itself off
+        """
+
+        if not self.available:
+            return False
+
+        try:
+            if self.subscription_id is None:
+                response = self.jd_device.action(
+                    "/events/subscribe",
+                    [JD_EVENT_SUBSCRIPTIONS, JD_EVENT_EXCLUSIONS],
+                )
+                self.subscription_id = response["subscriptionid"]
+
+                # Listening will wait for up to the poll timeout
+                poll_timeout = int(JD_EVENT_LISTEN_TIME * 1000)
+                self.jd_device.action(
+                    "/events/changesubscriptiontimeouts",
+                    [self.subscription_id, poll_timeout, 60000],
+                )
+
+            events = self.jd_device.action("/events/listen", [self.subscription_id])
+
+        except Exception:
+            self.available = False
+            return False
+
+        return bool(events)
+
+    def close(self):
+        """Unsubscribe from events"""
+
+        if self.available and self.subscription_id is not None:
+            try:
+                self.jd_device.action("/events/unsubscribe", [self.subscription_id])
+            except Exception:
+                pass
+
+        self.subscription_id = None
+
+        return True
+
+
+class JDScheduler:
+
+    def __init__(
+        self,
+        jd_device,
+        general_config,
+        logger,
+        max_active=None,
+        poll_config=None,
+    ):
+        """Keep a number of packages downloading through JDownloader at once
+
+        Each package moves through its lifecycle (queued, added,
+        online-checked, downloading, extracting, done) as the status of every active
+        package is checked in a shared poll. Once a package has been
+        downloaded, its on_complete function is called, so anything tracking
+        downloads can be updated as they finish rather than in one go at the
+        end. Packages that can't be downloaded (e.g. every site is offline)
+        are failed, and don't call on_complete.
+
+        Polls are quick while links are being grabbed, and slow down
+        during downloads depending on how long they've got left. Packages
+        that stop making progress are reported as stuck and dropped,
+        rather than waiting on them forever
+
+        Args:
+            jd_device (myjdapi.myjdapi.Jddevice): JDownloader device
+            general_config (dict): General configuration
+            logger (logging.logger): Logger instance
+            max_active (int): Maximum number of packages to have active at
+                once. Defaults to None, which will use the value from the
+                general config
+            poll_config (dict): Polling configuration. Defaults to None,
+                which will use the value from the general config. Any
+                missing keys will be taken from DEFAULT_POLL_CONFIG
+        """
+
+        if max_active is None:
+            max_active = general_config.get(
+                "jd_max_active_packages", DEFAULT_MAX_ACTIVE_PACKAGES
+            )
+
+        self.jd_device = jd_device
+        self.logger = logger
+
+        self.dl_sites = [
+            dl_site
+            for dl_site in general_config["dl_sites"]
+            if dl_site not in general_config["dl_sites_no_jdownload"]
+        ]
+        self.dl_sites_no_jdownload = general_config["dl_sites_no_jdownload"]
+
+        if poll_config is None:
+            poll_config = general_config.get("jd_polling", {})
+
+        self.max_active = max(max_active, 1)
+        self.poll_config = dict(DEFAULT_POLL_CONFIG)
+        self.poll_config.update(poll_config)
+
+        self.packages = []
+        self.failed_packages = []
+        self.stuck_packages = []
+        self.jd_state = JDStateMirror(jd_device)
+        self.events = JDEventListener(jd_device)
+
+    def submit(
+        self,
+        package_name,
+        dl_dict,
+        out_dir,
+        on_complete=None,
+    ):
+        """Queue up a package, waiting until there's room for it
+
+        Packages with the same name can't be told apart in JDownloader,
+        so a package will stay queued while there's an active package
+        with the same name
+
+        Args:
+            package_name (str): Name of package
+            dl_dict (dict): Dictionary of download files
+            out_dir (str): Directory to save downloaded files
+            on_complete (callable): Function to call once the package
+                has been successfully downloaded. Defaults to None
+        """
+
+        package = JDPackage(
+            package_name=package_name,
+            dl_dict=dl_dict,
+            out_dir=out_dir,
+            dl_sites=self.dl_sites,
+            on_complete=on_complete,
+        )
+
+        for dl_site in self.dl_sites_no_jdownload:
+            if dl_site in dl_dict:
+                self.logger.info(f"JDownloader does not support {dl_site}, skipping")
+
+        # If there's nothing we can send to JDownloader, skip
+        if len(package.dl_sites) == 0:
+            self.logger.warning(
+                "\t\tNo links found for supported download sites. Will skip"
+            )
+            return None
+
+        while len(self.packages) >= self.max_active:
+            self.wait()
+
+        self.packages.append(package)
+        self.start_queued()
+
+        return package
+
+    def start_queued(self):
+        """Start any queued packages that don't clash with an active one"""
+
+        for package in self.get_packages(PACKAGE_QUEUED):
+
+            active_names = [
+                p.package_name for p in self.packages if p.state != PACKAGE_QUEUED
+            ]
+            if package.package_name in active_names:
+                continue
+
+            self.add_links(package)
+
+        return True
+
+    def add_links(
+        self,
+        package,
+    ):
+        """Add links for the next download site to try for a package
+
+        Args:
+            package (JDPackage): Package to add links for
+        """
+
+        package.dl_site = package.dl_sites.pop(0)
+        package.dl_links = package.dl_dict[package.dl_site]
+        package.job_ids = []
+        package.package_id = None
+        package.set_state(PACKAGE_ADDED)
+
+        self.logger.info(f"\t\t{package.package_name}: Trying {package.dl_site}:")
+
+        # If a link can't be bypassed or added, only this package should suffer,
+        # rather than whatever else is being submitted or polled
+        try:
+            final_links = []
+            for d in package.dl_links:
+
+                # Redact the link
+                self.logger.update_redact_filter(d)
+
+                self.logger.info(f"\t\t\tLink: {d}")
+                if "ouo" in d:
+                    self.logger.info(
+                        f"\t\t\t\t{d} detected as OUO shortened link. Will bypass"
+                    )
+                    d_final = bypass_ouo(d, logger=self.logger)
+                elif "1link" in d:
+                    self.logger.info(
+                        f"\t\t\t\t{d} detected as 1link shortened link. Will bypass"
+                    )
+                    d_final = bypass_1link(d, logger=self.logger)
+                else:
+                    d_final = copy.deepcopy(d)
+
+                # Redact the link
+                self.logger.update_redact_filter(d_final)
+
+                self.logger.info(f"\t\t\t\tAdding {d_final} to JDownloader")
+                final_links.append(d_final)
+
+            # Add all the links in one go, as a single crawl job
+            response = self.jd_device.linkgrabber.add_links(
+                [
+                    {
+                        "autostart": False,
+                        "links": "\n".join(final_links),
+                        "destinationFolder": package.out_dir,
+                        "packageName": package.package_name,
+                    }
+                ]
+            )
+        except Exception as e:
+            self.logger.warning(f"\t\t{package.package_name}: Could not add links: {e}")
+            self.complete(package, success=False)
+            return False
+
+        # If we get a crawl job back, we can use that to find the links later
+        if isinstance(response, dict) and "id" in response:
+            package.job_ids.append(response["id"])
+
+        return True
+
+    def wait(self):
+        """Wait for a bit, then poll
+
+        If we can listen for events we'll wake up early when something
+        happens, but never poll more often than the minimum interval.
+        Listens are kept short, so we listen a few times over a long wait
+        """
+
+        interval = self.get_poll_interval()
+
+        start_time = time.time()
+        end_time = start_time + interval
+
+        woken = False
+        while not woken and self.events.available:
+            if end_time - time.time() < JD_EVENT_LISTEN_TIME:
+                break
+            woken = self.events.wait()
+
+        if not woken:
+            remaining_time = end_time - time.time()
+            if remaining_time > 0:
+                time.sleep(remaining_time)
+
+        elapsed_time = time.time() - start_time
+        if elapsed_time < self.poll_config["min_interval"]:
+            time.sleep(self.poll_config["min_interval"] - elapsed_time)
+
+        self.poll()
+
+        return True
+
+    def get_poll_interval(self):
+        """Work out how long to wait before the next poll
+
+        While links are being grabbed and checked we poll quickly. While
+        downloading, we check a few times over the expected download
+        time, based on the size and the current speed
+        """
+
+        min_interval = self.poll_config["min_interval"]
+        max_interval = self.poll_config["max_interval"]
+
+        now = time.time()
+
+        intervals = []
+        for package in self.packages:
+
+            if package.state in [PACKAGE_ADDED, PACKAGE_ONLINE_CHECKED]:
+                intervals.append(min_interval)
+
+            elif package.state == PACKAGE_DOWNLOADING:
+                if (
+                    package.speed is None
+                    or package.speed <= 0
+                    or package.bytes_total is None
+                    or package.bytes_loaded is None
+                ):
+                    intervals.append(min_interval)
+                    continue
+
+                # Check a few times over the whole download, but don't sleep past
+                # when it should be finished
+                total_time = package.bytes_total / package.speed
+                remaining_time = (
+                    package.bytes_total - package.bytes_loaded
+                ) / package.speed
+                intervals.append(
+                    min(
+                        total_time / self.poll_config["checks_per_download"],
+                        remaining_time,
+                    )
+                )
+
+            elif package.state == PACKAGE_EXTRACTING:
+                if package.finished_time is None:
+                    intervals.append(self.poll_config["extract_interval"])
+                else:
+                    intervals.append(
+                        package.finished_time + self.poll_config["settle_time"] - now
+                    )
+
+            # Don't sleep through a package getting stuck
+            intervals.append(self.get_deadline(package) - now)
+
+        if len(intervals) == 0:
+            return min_interval
+
+        interval = min(intervals)
+        interval = min(max(interval, min_interval), max_interval)
+
+        return interval
+
+    def get_deadline(self, package):
+        """Get the time by which a package needs to have made some progress
+
+        Args:
+            package (JDPackage): Package to check
+        """
+
+        if package.state in [PACKAGE_ADDED, PACKAGE_ONLINE_CHECKED]:
+            timeout = self.poll_config["grab_timeout"]
+        else:
+            timeout = self.poll_config["stall_timeout"]
+
+        return package.progress_time + timeout
+
+    def check_stuck(self):
+        """Drop any packages that haven't made progress in time"""
+
+        now = time.time()
+
+        for package in self.packages:
+
+            # Packages that have already finished (one way or another) this poll
+            # aren't stuck
+            if package.state in [PACKAGE_QUEUED, PACKAGE_DONE, PACKAGE_FAILED]:
+                continue
+
+            if now < self.get_deadline(package):
+                continue
+
+            self.logger.warning(
+                f"\t\t{package.package_name}: No progress in "
+                f"{now - package.progress_time:.0f}s while {package.state}. "
+                f"Marking as stuck, and leaving in JDownloader"
+            )
+            package.state = PACKAGE_STUCK
+            self.stuck_packages.append(package)
+
+        return True
+
+    def wait_all(self):
+        """Wait until all packages are done, failed, or stuck"""
+
+        while len(self.packages) > 0:
+            self.wait()
+
+        self.events.close()
+
+        return True
+
+    def poll(self):
+        """Check the status of all active packages, moving them along as appropriate
+
+        This takes a single snapshot of the state for all the packages,
+        and then goes through the stages from last to first so each
+        package only moves along one stage per snapshot
+        """
+
+        added = self.get_packages(PACKAGE_ADDED)
+        extracting = self.get_packages(PACKAGE_EXTRACTING)
+
+        self.jd_state.refresh(
+            job_ids=[j for p in added for j in p.job_ids],
+            linkgrabber_names=[
+                p.package_name for p in added if len(p.job_ids) == 0
+            ],
+            download_names=[
+                p.package_name for p in self.get_packages(PACKAGE_ONLINE_CHECKED)
+            ],
+            download_package_ids=[
+                p.package_id for p in self.get_packages(PACKAGE_DOWNLOADING)
+            ],
+            extraction_package_ids=[
+                p.package_id for p in extracting if p.finished_time is None
+            ],
+        )
+
+        self.check_settled()
+        self.check_extracting()
+        self.check_downloading()
+        self.check_online()
+        self.check_added()
+        self.check_stuck()
+
+        # Only keep hold of things that are still going, and start up anything
+        # that was waiting on them
+        self.packages = [
+            p
+            for p in self.packages
+            if p.state not in [PACKAGE_DONE, PACKAGE_FAILED, PACKAGE_STUCK]
+        ]
+        self.start_queued()
+
+        return True
+
+    def get_packages(self, state):
+        """Get active packages at a particular point in their lifecycle
+
+        Args:
+            state (str): Lifecycle state
+        """
+
+        return [p for p in self.packages if p.state == state]
+
+    def check_added(self):
+        """Check whether added packages have all their links, and whether they're online
+
+        Offline packages are removed, and online ones moved to the download
+        list, in one call each for all the packages ready this poll
+        """
+
+        offline_packages = []
+        online_packages = []
+
+        for package in self.get_packages(PACKAGE_ADDED):
+
+            # Check that the package has been added, with all the links
+            p = self.jd_state.find_package(
+                self.jd_state.linkgrabber_packages, package.package_name
+            )
+            if p is None:
+                continue
+
+            package.update_progress(p.get("childCount", None))
+            if p.get("childCount", None) != len(package.dl_links):
+                continue
+            package.package_id = p["uuid"]
+
+            # Next up, we want to do a check that all the files are online and happy
+            link_list = self.jd_state.get_links(
+                self.jd_state.linkgrabber_links, package.package_id
+            )
+            any_offline = any([l.get("availability", None) != "ONLINE" for l in link_list])
+
+            if any_offline:
+                self.logger.warning(
+                    f"\t\t{package.package_name}: Link(s) offline, will remove "
+                    f"and try with another download client"
+                )
+                offline_packages.append(package)
+                continue
+
+            # Hooray! We've got stuff online. Start downloading
+            self.logger.info(
+                f"\t\t{package.package_name}: Success! Will download from {package.dl_site}"
+            )
+            self.logger.info(f"\t\t{package.package_name}: Starting download")
+            online_packages.append((package, [l["uuid"] for l in link_list]))
+
+        if len(offline_packages) > 0:
+            package_ids = [package.package_id for package in offline_packages]
+            self.jd_device.linkgrabber.remove_links(package_ids=package_ids)
+            self.jd_state.forget(package_ids)
+
+        if len(online_packages) > 0:
+            package_ids = [package.package_id for package, _ in online_packages]
+            self.jd_device.linkgrabber.move_to_downloadlist(
+                link_ids=[l for _, link_ids in online_packages for l in link_ids],
+                package_ids=package_ids,
+            )
+            self.jd_state.forget(package_ids)
+
+            for package, _ in online_packages:
+                package.set_state(PACKAGE_ONLINE_CHECKED)
+
+        # Only try the next site once the offline links are out of the way
+        for package in offline_packages:
+
+            # If we've run out of sites, there's nothing to download
+            if len(package.dl_sites) == 0:
+                self.logger.warning(
+                    f"\t\t{package.package_name}: Links offline for every download site"
+                )
+                self.complete(package, success=False)
+            else:
+                self.add_links(package)
+
+        return True
+
+    def check_online(self):
+        """Find packages that have been moved to the download list"""
+
+        for package in self.get_packages(PACKAGE_ONLINE_CHECKED):
+
+            package.package_id = None
+            p = self.jd_state.find_package(
+                self.jd_state.download_packages, package.package_name
+            )
+            if p is not None:
+                package.package_id = p["uuid"]
+
+            # The package might not have shown up yet, so give it a few polls.
+            # If it still isn't there, then we'll fail here, so warn and move on
+            if package.package_id is None:
+                package.find_misses += 1
+                if package.find_misses < self.poll_config["find_polls"]:
+                    continue
+
+                self.logger.warning(
+                    f"Did not find associated package with name {package.package_name}"
+                )
+                self.complete(package, success=False)
+                continue
+
+            package.set_state(PACKAGE_DOWNLOADING)
+
+        return True
+
+    def check_downloading(self):
+        """Check whether downloading packages have finished"""
+
+        now = time.time()
+
+        for package in self.get_packages(PACKAGE_DOWNLOADING):
+            status = self.jd_state.download_packages.get(package.package_id, {})
+
+            # Keep track of the speed, to know how often to check in
+            bytes_loaded = status.get("bytesLoaded", None)
+            if bytes_loaded is not None:
+                speed = status.get("speed", None)
+                if speed is None and package.bytes_loaded is not None:
+                    dt = now - package.speed_time
+                    if dt > 0:
+                        speed = (bytes_loaded - package.bytes_loaded) / dt
+                package.speed = speed
+                package.speed_time = now
+                package.bytes_loaded = bytes_loaded
+                package.bytes_total = status.get("bytesTotal", None)
+                package.update_progress(bytes_loaded)
+
+            if status.get("finished", False):
+                package.set_state(PACKAGE_EXTRACTING)
+
+        return True
+
+    def check_extracting(self):
+        """Check whether extraction is complete, only once everything is downloaded"""
+
+        for package in self.get_packages(PACKAGE_EXTRACTING):
+
+            if package.finished_time is not None:
+                continue
+
+            link_list = self.jd_state.get_links(
+                self.jd_state.download_links, package.package_id
+            )
+
+            # Wait until we've got a look at the links
+            if len(link_list) == 0:
+                continue
+
+            package.update_progress(
+                sorted([(l["uuid"], l.get("extractionStatus", None)) for l in link_list])
+            )
+
+            extracted = True
+            for status in link_list:
+                if "extractionStatus" in status:
+                    if status["extractionStatus"] != "SUCCESSFUL":
+                        extracted = False
+                        break
+
+            # Wait for a bit before cleaning up, just to ensure everything is good
+            if extracted:
+                package.finished_time = time.time()
+
+        return True
+
+    def check_settled(self):
+        """Clean up packages that have finished and had time to settle
+
+        Everything that's ready this poll is cleaned up in one call
+        """
+
+        now = time.time()
+
+        packages = [
+            p
+            for p in self.get_packages(PACKAGE_EXTRACTING)
+            if p.finished_time is not None
+            and now - p.finished_time >= self.poll_config["settle_time"]
+        ]
+
+        if len(packages) == 0:
+            return True
+
+        for package in packages:
+            self.logger.info(
+                f"\t\t{package.package_name}: Files successfully downloaded"
+            )
+
+        # And finally, cleanup
+        package_ids = [package.package_id for package in packages]
+        self.jd_device.downloads.cleanup(
+            action="DELETE_FINISHED",
+            mode="REMOVE_LINKS_ONLY",
+            selection_type="SELECTED",
+            package_ids=package_ids,
+        )
+        self.jd_state.forget(package_ids)
+
+        for package in packages:
+            self.logger.info(
+                f"\t\t{package.package_name}: Links removed from JDownloader"
+            )
+            self.complete(package)
+
+        return True
+
+    def complete(
+        self,
+        package,
+        success=True,
+    ):
+        """Mark a package as done, and let anything waiting on it know
+
+        If the package couldn't be downloaded, it's marked as failed
+        instead, and on_complete isn't called so nothing records it as
+        downloaded
+
+        Args:
+            package (JDPackage): Package that's done
+            success (bool): Whether the package was downloaded. Defaults
+                to True
+        """
+
+        if not success:
+            package.state = PACKAGE_FAILED
+            self.failed_packages.append(package)
+            return False
+
+        package.state = PACKAGE_DONE
+
+        if package.on_complete is not None:
+            package.on_complete()
+
+        return True
@@ -1,15 +1,73 @@
 import logging
 import os
-import re
 import sys
+import threading
 from logging.handlers import RotatingFileHandler
 
 import colorlog
-import logredactor
 
 DATE_FMT = "%Y-%m-%d %H:%M:%S"
 
 
+class RedactingFilter(logging.Filter):
+
+    def __init__(
+        self,
+        mask="[REDACTED]",
+    ):
+        """Mask out sensitive strings from log messages
+
+        Strings are matched literally, and each is only kept once. This
+        gets called for every message, and over a long run there can be
+        thousands of strings, so we just check each one is in the message
+        rather than running a regex for each.
+
+        Messages get logged from several threads, so the list of strings
+        is never changed in place. Adding a string swaps in a new list
+
+        Args:
+            mask (str): What to replace the strings with. Defaults to
+                "[REDACTED]"
+        """
+
+        super().__init__()
+
+        self.mask = mask
+        self.strings = []
+        self.lock = threading.Lock()
+
+    def add(self, string):
+        """Add a string to redact
+
+        Args:
+            string (str): String to redact
+        """
+
+        with self.lock:
+            if string == "" or string in self.strings:
+                return False
+
+            # Go longest first, so a string that contains another is masked in full
+            self.strings = sorted(self.strings + [string], key=len, reverse=True)
+
+        return True
+
+    def filter(self, record):
+
+        message = record.getMessage()
+
+        redacted = message
+        for string in self.strings:
+            if string in redacted:
+                redacted = redacted.replace(string, self.mask)
+
+        if redacted != message:
+            record.msg = redacted
+            record.args = ()
+
+        return True
+
+
 class NXBrewLogger(logging.Logger):
 
     def __init__(
@@ -42,8 +100,7 @@ class NXBrewLogger(logging.Logger):
         self.log_dir = log_dir
         self.max_logs = max_logs
 
-        self.redact_patterns = []
-        self.redact_filter = None
+        self.redact_filter = RedactingFilter(mask="[REDACTED]")
 
         # Initialise the logger
         self.propagate = False
@@ -64,6 +121,9 @@ class NXBrewLogger(logging.Logger):
         self.addHandler(self.console_handler)
         self.addHandler(self.file_handler)
 
+        # Only redact what goes to file
+        self.file_handler.addFilter(self.redact_filter)
+
     def get_file_logger(
         self,
     ):
@@ -122,25 +182,50 @@ class NXBrewLogger(logging.Logger):
         self,
         redact_pattern,
     ):
-        """Update the redact patterns, update the redact filter
+        """Add a string to be redacted from the log file
 
         Args:
-            redact_pattern (str): The regex pattern to redact.
-                Any special regex characters are automatically
-                escaped so this should be input as a literal
-                string
+            redact_pattern (str): The string to redact. This is
+                matched literally
         """
 
-        # Update redact patterns
-        self.redact_patterns.append(re.compile(re.escape(redact_pattern)))
+        self.redact_filter.add(redact_pattern)
 
-        # Remove the filter if it already exists
-        if self.redact_filter is not None:
-            self.handlers[1].removeFilter(self.redact_filter)
 
-        # Create the new filter and add it, but only to the file handler
-        self.redact_filter = logredactor.RedactingFilter(
-            patterns=self.redact_patterns,
-            default_mask="[REDACTED]",
-        )
-        self.handlers[1].addFilter(self.redact_filter)
+class BufferedLogger:
+
+    def __init__(self):
+        """Hold on to log messages, to be replayed later
+
+        Useful for work done in the background, so its output
+        doesn't get mixed in with whatever's currently running
+        """
+
+        self.records = []
+
+    def debug(self, msg):
+        self.records.append(("debug", msg))
+
+    def info(self, msg):
+        self.records.append(("info", msg))
+
+    def warning(self, msg):
+        self.records.append(("warning", msg))
+
+    def error(self, msg):
+        self.records.append(("error", msg))
+
+    def update_redact_filter(self, redact_pattern):
+        self.records.append(("update_redact_filter", redact_pattern))
+
+    def replay(self, logger):
+        """Send all the held messages on to a logger, in order
+
+        Args:
+            logger (NXBrewLogger): Logger to replay to
+        """
+
+        for method, msg in self.records:
+            getattr(logger, method)(msg)
+
+        self.records = []
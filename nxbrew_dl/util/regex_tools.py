@@ -1,14 +1,17 @@
+import functools
 import re
 
+# How many strings to remember matches for
+MATCHER_MEMO_SIZE = 4096
 
-def get_game_name(
-    f,
-    nsp_xci_variations,
-):
-    """Get game name, which is normally up to "Switch NSP", but there are some edge cases
+LANGUAGE_MATCHERS = {}
+REGION_MATCHERS = {}
+
+
+def get_game_name_regex(nsp_xci_variations):
+    """Build the regex string used to pull the game name out of a title
 
     Args:
-        f (str): Name
         nsp_xci_variations (list): List of potential NSP/XCI name variations
     """
 
@@ -32,6 +35,22 @@ def get_game_name(
         ")"
     )
 
+    return regex_str
+
+
+def get_game_name(
+    f,
+    nsp_xci_variations,
+):
+    """Get game name, which is normally up to "Switch NSP", but there are some edge cases
+
+    Args:
+        f (str): Name
+        nsp_xci_variations (list): List of potential NSP/XCI name variations
+    """
+
+    regex_str = get_game_name_regex(nsp_xci_variations)
+
     reg = re.findall(regex_str, f)
 
     # If we find something, then pull that out
@@ -62,44 +81,251 @@ def check_has_filetype(
         return False
 
 
-def parse_languages(
-    f,
-    lang_dict=None,
-):
-    """Parse languages out of a string
+class TitleClassifier:
+
+    def __init__(
+        self,
+        regex_config,
+    ):
+        """Classify game titles from the index
+
+        All the regexes are compiled once up front, so classifying a
+        full index doesn't rebuild and recompile them for every title.
+        The results match those from get_game_name and check_has_filetype
+
+        Args:
+            regex_config (dict): Regex configuration
+        """
+
+        nsp_xci_variations = (
+            regex_config["nsp_variations"] + regex_config["xci_variations"]
+        )
+        self.game_name_regex = re.compile(get_game_name_regex(nsp_xci_variations))
+
+        # Filetype flags, in the order they're returned
+        self.filetype_regexes = {
+            "has_nsp": re.compile("|".join(regex_config["nsp_variations"])),
+            "has_xci": re.compile("|".join(regex_config["xci_variations"])),
+            "has_update": re.compile("|".join(regex_config["update_variations"])),
+            "has_dlc": re.compile("|".join(regex_config["dlc_variations"])),
+        }
+
+    def get_game_name(self, f):
+        """Get game name from a long title
+
+        Args:
+            f (str): Name
+        """
+
+        reg = self.game_name_regex.match(f)
+
+        # If we find something, then pull that out
+        if reg is not None:
+            f = reg.group(0)
+
+        return f
+
+    def classify(self, long_name):
+        """Get the short name and NSP/XCI/update/DLC flags for a title
+
+        Args:
+            long_name (str): Full title, as in the game index
+        """
+
+        short_name = self.get_game_name(long_name)
+
+        # Pull out whether NSP/XCI, and whether it has updates/DLCs
+        remaining_name = long_name.replace(short_name, "")
+
+        title_dict = {
+            "short_name": short_name,
+        }
+        for key, regex in self.filetype_regexes.items():
+            title_dict[key] = regex.search(remaining_name) is not None
+
+        return title_dict
+
+    def classify_all(self, long_names):
+        """Classify a list of titles in a single pass
+
+        Args:
+            long_names (list): List of full titles
+        """
+
+        return [self.classify(long_name) for long_name in long_names]
+
+
+class LanguageMatcher:
+
+    def __init__(
+        self,
+        lang_dict=None,
+        memo_size=MATCHER_MEMO_SIZE,
+    ):
+        """Match languages in comma-separated strings
+
+        Every language (short or long form) goes into a single regex as
+        an optional lookahead with a named group, so one match tells us
+        all the languages a token starts with. Results for each token are
+        memoized, since the same few strings turn up on most pages. The
+        results match those from the original per-language re.match loop
+
+        Args:
+            lang_dict (dict): Dictionary of languages. Defaults to None
+            memo_size (int): Number of tokens to memoize. Defaults to 4096
+        """
+
+        if lang_dict is None:
+            lang_dict = {}
+
+        self.long_langs = list(lang_dict.keys())
+
+        regex_str = ""
+        for i, long_lang in enumerate(self.long_langs):
+            regex_str += f"(?:(?=(?P<l{i}>(?:{lang_dict[long_lang]})|(?:{long_lang}))))?"
+
+        self.regex = re.compile(regex_str)
+
+        # Some of the languages have groups of their own, so look up where ours are
+        self.group_indices = [
+            self.regex.groupindex[f"l{i}"] for i in range(len(self.long_langs))
+        ]
+
+        self.parse_token = functools.lru_cache(maxsize=memo_size)(
+            self._parse_token
+        )
+
+    def _parse_token(self, fs):
+        """Get the languages for a single (stripped) token
+
+        Args:
+            fs (str): Token to match
+        """
+
+        reg = self.regex.match(fs)
+
+        langs = tuple(
+            long_lang
+            for long_lang, g in zip(self.long_langs, self.group_indices)
+            if reg.group(g) is not None
+        )
+
+        return langs
+
+    def parse(self, f):
+        """Parse languages out of a string
+
+        Args:
+            f (str): String pattern to match
+        """
+
+        langs = []
+        for fs in f.split(","):
+            langs.extend(self.parse_token(fs.strip()))
+
+        return langs
+
+
+class RegionMatcher:
+
+    def __init__(
+        self,
+        regions=None,
+        memo_size=MATCHER_MEMO_SIZE,
+    ):
+        """Find regions mentioned in some text
+
+        This is a case-insensitive substring search, as in the original
+        loop, but all regions are searched for in a single regex with a
+        named group each, and results are memoized
+
+        Args:
+            regions (list): List of regions. Defaults to None
+            memo_size (int): Number of strings to memoize. Defaults to 4096
+        """
+
+        if regions is None:
+            regions = []
+
+        self.regions = list(regions)
+
+        regex_str = ""
+        for i, region in enumerate(self.regions):
+            regex_str += f"(?:(?=.*?(?P<r{i}>{re.escape(region.lower())})))?"
+
+        self.regex = re.compile(regex_str, flags=re.DOTALL)
+
+        self.parse_lowered = functools.lru_cache(maxsize=memo_size)(
+            self._parse_lowered
+        )
+
+    def _parse_lowered(self, t):
+        """Get the regions for some already lower-cased text
+
+        Args:
+            t (str): Text to search
+        """
+
+        reg = self.regex.match(t)
+
+        regions = tuple(
+            region
+            for region, g in zip(self.regions, reg.groups())
+            if g is not None
+        )
+
+        return regions
+
+    def parse(self, t):
+        """Parse regions out of some text
+
+        Args:
+            t (str): Text to search
+        """
+
+        return list(self.parse_lowered(t.lower()))
+
+
+def get_language_matcher(lang_dict):
+    """Get a shared language matcher for a dictionary of languages
 
     Args:
-        f (str): String pattern to match
         lang_dict (dict): Dictionary of languages
     """
 
-    if lang_dict is None:
-        return []
+    key = tuple(lang_dict.items())
+    if key not in LANGUAGE_MATCHERS:
+        LANGUAGE_MATCHERS[key] = LanguageMatcher(lang_dict)
+
+    return LANGUAGE_MATCHERS[key]
+
 
-    long_langs = list(lang_dict.keys())
-    short_langs = [lang_dict[l] for l in long_langs]
+def get_region_matcher(regions):
+    """Get a shared region matcher for a list of regions
 
-    f_split = f.split(",")
+    Args:
+        regions (list): List of regions
+    """
 
-    langs = []
-    for fs in f_split:
+    key = tuple(regions)
+    if key not in REGION_MATCHERS:
+        REGION_MATCHERS[key] = RegionMatcher(regions)
 
-        # Strip any leading whitespace
-        fs = fs.strip()
+    return REGION_MATCHERS[key]
 
-        for i, short_lang in enumerate(short_langs):
 
-            # Do a first pass where we check against short languages
-            short_match = re.match(short_lang, fs, flags=re.NOFLAG)
-            if short_match:
-                langs.append(long_langs[i])
+def parse_languages(
+    f,
+    lang_dict=None,
+):
+    """Parse languages out of a string
 
-                # If we do have a short match, move on
-                continue
+    Args:
+        f (str): String pattern to match
+        lang_dict (dict): Dictionary of languages
+    """
 
-            # Do a first pass where we check against short languages
-            long_match = re.match(long_langs[i], fs, flags=re.NOFLAG)
-            if long_match:
-                langs.append(long_langs[i])
+    if lang_dict is None:
+        return []
 
-    return langs
+    return get_language_matcher(lang_dict).parse(f)
@@ -0,0 +1,169 @@
+from collections import Counter
+
+
+def get_trigrams(text):
+    """Get the set of trigrams in a piece of text
+
+    Args:
+        text (str): Text to split up
+    """
+
+    return set(text[i : i + 3] for i in range(len(text) - 2))
+
+
+class SearchIndex:
+
+    def __init__(
+        self,
+        min_similarity=0.5,
+    ):
+        """Search index for game names
+
+        Names are lower-cased once, as they're added, and each trigram
+        points to the names that contain it. A search only needs to
+        check the names that contain every trigram in the search text.
+        If nothing matches exactly, we fall back to the names that
+        share the most trigrams, so small typos still find something.
+
+        The trigrams are only worked out when we first search, so
+        filling the index doesn't slow down loading the table
+
+        Args:
+            min_similarity (float): Fraction of the search's trigrams a
+                name needs for a fuzzy match. Defaults to 0.5
+        """
+
+        self.min_similarity = min_similarity
+
+        self.keys = []
+        self.names = []
+        self.trigrams = {}
+
+        # How many names have gone into the trigrams so far
+        self.n_indexed = 0
+
+        # Bumped on every change, so anything holding on to results
+        # knows when they're stale
+        self.version = 0
+
+    def clear(self):
+        """Remove everything from the index"""
+
+        self.keys = []
+        self.names = []
+        self.trigrams = {}
+        self.n_indexed = 0
+
+        self.version += 1
+
+        return True
+
+    def add(self, key, name):
+        """Add a name to the index
+
+        Args:
+            key: Key to return for matches, e.g. the URL path
+            name (str): Name to search on
+        """
+
+        self.keys.append(key)
+        self.names.append(name.lower())
+
+        self.version += 1
+
+        return True
+
+    def update_trigrams(self):
+        """Add any new names into the trigrams"""
+
+        trigrams = self.trigrams
+
+        for idx in range(self.n_indexed, len(self.names)):
+            for trigram in get_trigrams(self.names[idx]):
+                posting = trigrams.get(trigram, None)
+                if posting is None:
+                    trigrams[trigram] = [idx]
+                else:
+                    posting.append(idx)
+
+        self.n_indexed = len(self.names)
+
+        return True
+
+    def search(
+        self,
+        text,
+        fuzzy=True,
+    ):
+        """Find the keys for names matching the search text
+
+        Args:
+            text (str): Text to search for
+            fuzzy (bool): Whether to fall back to fuzzy matching if
+                nothing matches exactly. Defaults to True
+        """
+
+        text = text.lower()
+
+        if len(text) == 0:
+            return set(self.keys)
+
+        # Too short for trigrams, so just check everything
+        query_trigrams = get_trigrams(text)
+        if len(query_trigrams) == 0:
+            return set(
+                self.keys[idx] for idx, name in enumerate(self.names) if text in name
+            )
+
+        self.update_trigrams()
+
+        # If any trigram isn't in the index, nothing can match exactly
+        postings = [self.trigrams.get(trigram, []) for trigram in query_trigrams]
+        postings.sort(key=len)
+
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            if len(candidates) == 0:
+                break
+            candidates.intersection_update(posting)
+
+        matches = set(
+            self.keys[idx] for idx in candidates if text in self.names[idx]
+        )
+
+        if len(matches) > 0 or not fuzzy:
+            return matches
+
+        return self.fuzzy_search(query_trigrams)
+
+    def fuzzy_search(self, query_trigrams):
+        """Find the keys for the names sharing the most of the search's trigrams
+
+        Args:
+            query_trigrams (set): Trigrams in the search text
+        """
+
+        # Very short searches would match far too much
+        if len(query_trigrams) < 2:
+            return set()
+
+        counts = Counter()
+        for trigram in query_trigrams:
+            counts.update(self.trigrams.get(trigram, []))
+
+        if len(counts) == 0:
+            return set()
+
+        # Keep the closest names, allowing for one more trigram lost to
+        # a typo, so long as they're close enough
+        min_count = max(
+            max(counts.values()) - 1,
+            self.min_similarity * len(query_trigrams),
+        )
+
+        return set(
+            self.keys[idx] for idx, count in counts.items() if count >= min_count
+        )
+
+    def __len__(self):
+        return len(self.keys)
@@ -0,0 +1,401 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from .cache_tools import get_content_hash
+from .html_tools import get_url_path
+from .io_tools import load_json, save_json
+
+DEFAULT_USER_CACHE_DB = "cache.db"
+DEFAULT_USER_CACHE_JSON = "cache.json"
+
+
+class UserCache:
+
+    def __init__(
+        self,
+        db_file=None,
+        json_file=None,
+    ):
+        """Cache of what's been downloaded, for each game
+
+        Entries are stored in SQLite (in WAL mode), one row per game,
+        so each change is a small atomic write rather than rewriting
+        everything. Reads and writes are safe across threads, and
+        snapshot() gives a consistent copy of everything for the GUI.
+
+        The cache.json is kept for compatibility. It's imported if it's
+        new or has been changed since we last saw it, and exported at
+        the end of a run. An index of URL paths is kept alongside, so
+        games can be found even if the site has changed domain
+
+        Args:
+            db_file (str): Path to the SQLite database. Defaults to None,
+                which will use "cache.db" in the current directory
+            json_file (str): Path to the JSON cache. Defaults to None,
+                which will use "cache.json" in the current directory
+        """
+
+        if db_file is None:
+            db_file = os.path.join(os.getcwd(), DEFAULT_USER_CACHE_DB)
+        if json_file is None:
+            json_file = os.path.join(os.getcwd(), DEFAULT_USER_CACHE_JSON)
+
+        self.db_file = db_file
+        self.json_file = json_file
+
+        self.lock = threading.RLock()
+
+        # We handle transactions ourselves, and share the connection between
+        # threads behind the lock
+        self.db = sqlite3.connect(
+            self.db_file,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+
+        with self.transaction():
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS games "
+                "(url TEXT PRIMARY KEY, name TEXT, entry TEXT NOT NULL)"
+            )
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+            )
+
+        self.url_paths = {}
+        self.load_url_paths()
+
+        self.sync_json()
+
+    @contextmanager
+    def transaction(self):
+        """Run everything inside as a single transaction"""
+
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.db
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                self.load_url_paths()
+                raise
+            self.db.execute("COMMIT")
+
+    def load_url_paths(self):
+        """Build the index of URL paths from what's in the database"""
+
+        with self.lock:
+            rows = self.db.execute("SELECT url FROM games").fetchall()
+            self.url_paths = {get_url_path(row[0]): row[0] for row in rows}
+
+        return True
+
+    def find_url(self, url):
+        """Find the URL in the cache for a game, matching by URL path
+
+        Args:
+            url (str): URL for the game, possibly on a different domain
+        """
+
+        with self.lock:
+            cache_url = self.url_paths.get(get_url_path(url), None)
+
+        return cache_url
+
+    def sync_json(self):
+        """Pick up the JSON cache, if it's new to us or has been changed elsewhere"""
+
+        if not os.path.exists(self.json_file):
+            return False
+
+        if self.get_json_hash() == self.get_meta("json_hash"):
+            return False
+
+        self.import_json(self.json_file)
+
+        return True
+
+    def get_meta(self, key):
+        """Get a value from the metadata table
+
+        Args:
+            key (str): Metadata key
+        """
+
+        with self.lock:
+            row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+
+        if row is None:
+            return None
+
+        return row[0]
+
+    def set_meta(self, key, value):
+        """Set a value in the metadata table
+
+        Args:
+            key (str): Metadata key
+            value (str): Metadata value
+        """
+
+        with self.transaction() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                (key, value),
+            )
+
+        return True
+
+    def get_json_hash(self):
+        """Get the hash of the JSON cache"""
+
+        with open(self.json_file, "rb") as f:
+            content = f.read()
+
+        return get_content_hash(content)
+
+    def get(self, url, default=None):
+        """Get a copy of the entry for a game
+
+        Args:
+            url (str): URL for the game
+            default: What to return if the game isn't in the cache.
+                Defaults to None
+        """
+
+        with self.lock:
+            row = self.db.execute(
+                "SELECT entry FROM games WHERE url = ?", (url,)
+            ).fetchone()
+
+        if row is None:
+            return default
+
+        return json.loads(row[0])
+
+    def put(self, url, entry):
+        """Add or replace the entry for a game
+
+        Args:
+            url (str): URL for the game
+            entry (dict): Cache entry, with at least a name
+        """
+
+        with self.transaction() as db:
+            self.write_entry(db, url, entry)
+
+        return True
+
+    def write_entry(self, db, url, entry):
+        """Write out an entry, within a transaction
+
+        Args:
+            db (sqlite3.Connection): Database connection
+            url (str): URL for the game
+            entry (dict): Cache entry, with at least a name
+        """
+
+        db.execute(
+            "INSERT OR REPLACE INTO games (url, name, entry) VALUES (?, ?, ?)",
+            (url, entry.get("name", None), json.dumps(entry, ensure_ascii=False)),
+        )
+        self.url_paths[get_url_path(url)] = url
+
+        return True
+
+    def update(self, url, func):
+        """Atomically update the entry for a game
+
+        Args:
+            url (str): URL for the game
+            func (callable): Function that takes the current entry (or
+                None if there isn't one), and returns the new entry.
+                If it returns None, nothing is written
+        """
+
+        with self.transaction() as db:
+            row = db.execute("SELECT entry FROM games WHERE url = ?", (url,)).fetchone()
+
+            entry = None
+            if row is not None:
+                entry = json.loads(row[0])
+
+            entry = func(entry)
+            if entry is not None:
+                self.write_entry(db, url, entry)
+
+        return entry
+
+    def move(self, old_url, new_url):
+        """Move a game to a new URL
+
+        Args:
+            old_url (str): Current URL for the game
+            new_url (str): New URL for the game
+        """
+
+        with self.transaction() as db:
+            db.execute("DELETE FROM games WHERE url = ?", (new_url,))
+            db.execute("UPDATE games SET url = ? WHERE url = ?", (new_url, old_url))
+
+            if self.url_paths.get(get_url_path(old_url), None) == old_url:
+                self.url_paths.pop(get_url_path(old_url))
+            self.url_paths[get_url_path(new_url)] = new_url
+
+        return True
+
+    def remove(self, url):
+        """Remove a game from the cache
+
+        Args:
+            url (str): URL for the game
+        """
+
+        with self.transaction() as db:
+            db.execute("DELETE FROM games WHERE url = ?", (url,))
+
+            if self.url_paths.get(get_url_path(url), None) == url:
+                self.url_paths.pop(get_url_path(url))
+
+        return True
+
+    def add_download(self, url, dl_key, full_name):
+        """Record a downloaded file for a game
+
+        If the game isn't in the cache (e.g. it's been removed while
+        downloading), nothing is recorded
+
+        Args:
+            url (str): URL for the game
+            dl_key (str): Download key, e.g. base_game_nsp
+            full_name (str): Full name of the downloaded file
+        """
+
+        def add(entry):
+
+            if entry is None:
+                return None
+
+            entry.setdefault(dl_key, [])
+            if full_name not in entry[dl_key]:
+                entry[dl_key].append(full_name)
+            return entry
+
+        return self.update(url, add)
+
+    def remove_dl_key(self, dl_key):
+        """Remove a download key from every game
+
+        Args:
+            dl_key (str): Download key, e.g. dlc
+        """
+
+        with self.transaction() as db:
+            rows = db.execute("SELECT url, entry FROM games").fetchall()
+
+            for url, entry in rows:
+                entry = json.loads(entry)
+                if dl_key in entry:
+                    entry.pop(dl_key)
+                    self.write_entry(db, url, entry)
+
+        return True
+
+    def snapshot(self):
+        """Get a consistent copy of the whole cache, sorted by name"""
+
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT url, entry FROM games ORDER BY name, url"
+            ).fetchall()
+
+        return {url: json.loads(entry) for url, entry in rows}
+
+    def import_json(self, json_file):
+        """Replace the cache with the contents of a JSON cache
+
+        Args:
+            json_file (str): Path to the JSON cache
+        """
+
+        data = load_json(json_file)
+
+        with self.transaction() as db:
+            db.execute("DELETE FROM games")
+            self.url_paths = {}
+            for url, entry in data.items():
+                self.write_entry(db, url, entry)
+
+        if os.path.abspath(json_file) == os.path.abspath(self.json_file):
+            self.set_meta("json_hash", self.get_json_hash())
+
+        return True
+
+    def export_json(self, json_file=None):
+        """Save the cache out as JSON, atomically
+
+        Args:
+            json_file (str): Path to the JSON cache. Defaults to None,
+                which will use the one for this cache
+        """
+
+        if json_file is None:
+            json_file = self.json_file
+
+        data = self.snapshot()
+
+        tmp_file = f"{json_file}.tmp"
+        save_json(data, tmp_file, sort_key="name")
+        os.replace(tmp_file, json_file)
+
+        # Keep track of this, so we don't import our own export
+        if os.path.abspath(json_file) == os.path.abspath(self.json_file):
+            self.set_meta("json_hash", self.get_json_hash())
+
+        return True
+
+    def get_url_paths(self):
+        """Get all the URL paths in the cache"""
+
+        with self.lock:
+            url_paths = set(self.url_paths)
+
+        return url_paths
+
+    def urls(self):
+        """Get all the URLs in the cache"""
+
+        with self.lock:
+            rows = self.db.execute("SELECT url FROM games").fetchall()
+
+        return [row[0] for row in rows]
+
+    def __contains__(self, url):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT 1 FROM games WHERE url = ?", (url,)
+            ).fetchone()
+
+        return row is not None
+
+    def __iter__(self):
+        return iter(self.urls())
+
+    def __len__(self):
+        with self.lock:
+            row = self.db.execute("SELECT COUNT(*) FROM games").fetchone()
+
+        return row[0]
+
+    def close(self):
+        """Close the database"""
+
+        with self.lock:
+            self.db.close()
+
+        return True
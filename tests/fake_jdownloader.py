@@ -0,0 +1,614 @@
+import heapq
+import itertools
+import re
+import threading
+import time
+from collections import Counter
+
+# Fields that are always returned by queries, whatever is asked for
+LINKGRABBER_LINK_FIELDS = ["uuid", "name", "packageUUID"]
+DOWNLOAD_LINK_FIELDS = ["uuid", "name", "packageUUID"]
+PACKAGE_FIELDS = ["uuid", "name"]
+
+
+class FakeJDDevice:
+
+    def __init__(
+        self,
+        download_time=1,
+        extraction_time=0.5,
+        grab_delay=0.1,
+        max_downloads=3,
+        link_size=100 * 1024 * 1024,
+        offline_links=None,
+        stalled_links=None,
+        clock=None,
+    ):
+        """Local stand-in for a MyJDownloader device
+
+        This implements the linkgrabber and downloads calls that NXBrew
+        makes, so everything can be run end-to-end without an account
+        or a running JDownloader. Links appear in the linkgrabber one
+        at a time, download a few at once, and then extract. Links can
+        be marked as offline, or as stalled (so they never finish).
+        Every call is counted in .calls, to keep an eye on how chatty
+        things are
+
+        Args:
+            download_time (float): Time (in seconds) to download a link.
+                Defaults to 1
+            extraction_time (float): Time (in seconds) to extract a
+                link once it's downloaded. Defaults to 0.5. If None,
+                links won't report any extraction status
+            grab_delay (float): Time (in seconds) for each link to show up
+                in the linkgrabber. Defaults to 0.1
+            max_downloads (int): Maximum number of links downloading at
+                once. Defaults to 3, same as JDownloader
+            link_size (int): Size (in bytes) of each link. Defaults to 100MB
+            offline_links (list): Regex patterns for links that will
+                show up as offline. Defaults to None
+            stalled_links (list): Regex patterns for links that will
+                never finish downloading. Defaults to None
+            clock (callable): Function returning the current time (in
+                seconds). Defaults to None, which will use time.monotonic
+        """
+
+        if offline_links is None:
+            offline_links = []
+        if stalled_links is None:
+            stalled_links = []
+        if clock is None:
+            clock = time.monotonic
+
+        self.download_time = download_time
+        self.extraction_time = extraction_time
+        self.grab_delay = grab_delay
+        self.link_size = link_size
+        self.offline_links = [re.compile(p) for p in offline_links]
+        self.stalled_links = [re.compile(p) for p in stalled_links]
+        self.clock = clock
+
+        self.lock = threading.RLock()
+        self.calls = Counter()
+        self.ids = itertools.count(1)
+
+        self.packages = {}
+        self.links = {}
+
+        # When each download slot is next free
+        self.download_slots = [0.0] * max(max_downloads, 1)
+
+        self.linkgrabber = FakeLinkgrabber(self)
+        self.downloads = FakeDownloads(self)
+
+    def new_id(self):
+        """Get a new ID, for packages, links and jobs"""
+
+        return next(self.ids)
+
+    def add_links(self, query):
+        """Add links to the linkgrabber
+
+        Args:
+            query (dict): JDownloader AddLinksQuery
+        """
+
+        now = self.clock()
+
+        job_id = self.new_id()
+        package_name = query.get("packageName", None)
+        folder = query.get("destinationFolder", None)
+
+        # Links for the same package name and folder end up in the same package
+        package = None
+        for p in self.packages.values():
+            if p["where"] == "linkgrabber" and (p["name"], p["folder"]) == (
+                package_name,
+                folder,
+            ):
+                package = p
+                break
+        if package is None:
+            package = {
+                "uuid": self.new_id(),
+                "name": package_name,
+                "folder": folder,
+                "where": "linkgrabber",
+            }
+            self.packages[package["uuid"]] = package
+
+        urls = (query.get("links", None) or "").split()
+
+        for i, url in enumerate(urls):
+
+            offline = any(p.search(url) for p in self.offline_links)
+            stalled = any(p.search(url) for p in self.stalled_links)
+
+            link = {
+                "uuid": self.new_id(),
+                "name": url.rstrip("/").split("/")[-1],
+                "url": url,
+                "packageUUID": package["uuid"],
+                "jobUUID": job_id,
+                "where": "linkgrabber",
+                "visible_time": now + self.grab_delay * (i + 1),
+                "availability": "OFFLINE" if offline else "ONLINE",
+                "stalled": stalled,
+                "start_time": None,
+                "finish_time": None,
+            }
+            self.links[link["uuid"]] = link
+
+        return {"id": job_id}
+
+    def get_links(self, where, package_ids=None, job_ids=None, link_ids=None):
+        """Get links in a list, optionally filtered
+
+        Args:
+            where (str): Either "linkgrabber" or "downloads"
+            package_ids (list): Package UUIDs to filter to. Defaults to None
+            job_ids (list): Job UUIDs to filter to. Defaults to None
+            link_ids (list): Link UUIDs to filter to. Defaults to None
+        """
+
+        now = self.clock()
+
+        links = []
+        for link in self.links.values():
+            if link["where"] != where:
+                continue
+            if where == "linkgrabber" and link["visible_time"] > now:
+                continue
+            if package_ids and link["packageUUID"] not in package_ids:
+                continue
+            if job_ids and link["jobUUID"] not in job_ids:
+                continue
+            if link_ids and link["uuid"] not in link_ids:
+                continue
+            links.append(link)
+
+        return links
+
+    def get_packages(self, where, package_ids=None):
+        """Get packages in a list that have visible links, optionally filtered
+
+        Args:
+            where (str): Either "linkgrabber" or "downloads"
+            package_ids (list): Package UUIDs to filter to. Defaults to None
+        """
+
+        links = self.get_links(where, package_ids=package_ids)
+
+        packages = {}
+        for link in links:
+            packages.setdefault(link["packageUUID"], []).append(link)
+
+        return [(self.packages[p], package_links) for p, package_links in packages.items()]
+
+    def start_download(self, link, now):
+        """Slot a link into the download queue
+
+        Args:
+            link (dict): Link to download
+            now (float): Current time
+        """
+
+        slot_time = heapq.heappop(self.download_slots)
+        link["start_time"] = max(now, slot_time)
+
+        # Stalled links will never finish, but don't hold up everything else
+        if link["stalled"]:
+            heapq.heappush(self.download_slots, slot_time)
+            return True
+
+        link["finish_time"] = link["start_time"] + self.download_time
+        heapq.heappush(self.download_slots, link["finish_time"])
+
+        return True
+
+    def get_link_status(self, link):
+        """Get the current download status of a link
+
+        Args:
+            link (dict): Link to get status for
+        """
+
+        now = self.clock()
+
+        if link["stalled"] or now < link["start_time"]:
+            bytes_loaded = 0
+        elif link["finish_time"] <= now:
+            bytes_loaded = self.link_size
+        else:
+            fraction = (now - link["start_time"]) / self.download_time
+            bytes_loaded = int(fraction * self.link_size)
+
+        finished = link["finish_time"] is not None and link["finish_time"] <= now
+        running = not finished and not link["stalled"] and link["start_time"] <= now
+
+        if running:
+            speed = self.link_size / self.download_time
+            eta = link["finish_time"] - now
+        else:
+            speed = 0
+            eta = 0
+
+        if finished:
+            status = "Finished"
+        elif running:
+            status = "Downloading"
+        else:
+            status = "Waiting"
+
+        link_status = {
+            "bytesLoaded": bytes_loaded,
+            "bytesTotal": self.link_size,
+            "finished": finished,
+            "running": running,
+            "speed": speed,
+            "eta": eta,
+            "status": status,
+            "url": link["url"],
+        }
+
+        if self.extraction_time is not None and finished:
+            if now < link["finish_time"] + self.extraction_time:
+                link_status["extractionStatus"] = "RUNNING"
+            else:
+                link_status["extractionStatus"] = "SUCCESSFUL"
+
+        return link_status
+
+
+class FakeLinkgrabber:
+
+    def __init__(
+        self,
+        device,
+    ):
+        """Fake linkgrabber, see FakeJDDevice
+
+        Args:
+            device (FakeJDDevice): Device this belongs to
+        """
+
+        self.device = device
+
+    def add_links(self, params):
+        """Add links to the linkgrabber
+
+        Args:
+            params (list): List containing a single AddLinksQuery
+        """
+
+        with self.device.lock:
+            self.device.calls["linkgrabber.add_links"] += 1
+            response = self.device.add_links(params[0])
+
+        return response
+
+    def query_links(self, params):
+        """Query links in the linkgrabber
+
+        Args:
+            params (list): List containing a single CrawledLinkQuery
+        """
+
+        query = params[0]
+
+        with self.device.lock:
+            self.device.calls["linkgrabber.query_links"] += 1
+            links = self.device.get_links(
+                "linkgrabber",
+                package_ids=query.get("packageUUIDs", None),
+                job_ids=query.get("jobUUIDs", None),
+            )
+
+            response = []
+            for link in links:
+                link_status = {k: link[k] for k in LINKGRABBER_LINK_FIELDS}
+                for k in ["availability", "url"]:
+                    if query.get(k, False):
+                        link_status[k] = link[k]
+                response.append(link_status)
+
+        return apply_limits(response, query)
+
+    def query_packages(self, params):
+        """Query packages in the linkgrabber
+
+        Args:
+            params (list): List containing a single CrawledPackageQuery
+        """
+
+        query = params[0]
+
+        with self.device.lock:
+            self.device.calls["linkgrabber.query_packages"] += 1
+            packages = self.device.get_packages(
+                "linkgrabber",
+                package_ids=query.get("packageUUIDs", None),
+            )
+
+            response = []
+            for package, links in packages:
+                package_status = {k: package[k] for k in PACKAGE_FIELDS}
+                if query.get("childCount", False):
+                    package_status["childCount"] = len(links)
+                if query.get("saveTo", False):
+                    package_status["saveTo"] = package["folder"]
+                response.append(package_status)
+
+        return apply_limits(response, query)
+
+    def remove_links(self, link_ids=None, package_ids=None):
+        """Remove links from the linkgrabber
+
+        Args:
+            link_ids (list): Link UUIDs to remove. Defaults to None
+            package_ids (list): Package UUIDs to remove. Defaults to None
+        """
+
+        with self.device.lock:
+            self.device.calls["linkgrabber.remove_links"] += 1
+            remove_links(
+                self.device,
+                where="linkgrabber",
+                link_ids=link_ids,
+                package_ids=package_ids,
+            )
+
+        return True
+
+    def move_to_downloadlist(self, link_ids=None, package_ids=None):
+        """Move links from the linkgrabber to the download list, and start them
+
+        Args:
+            link_ids (list): Link UUIDs to move. Defaults to None
+            package_ids (list): Package UUIDs to move. Defaults to None
+        """
+
+        with self.device.lock:
+            self.device.calls["linkgrabber.move_to_downloadlist"] += 1
+
+            now = self.device.clock()
+
+            links = []
+            for link in self.device.links.values():
+                if link["where"] != "linkgrabber":
+                    continue
+                if (link_ids and link["uuid"] in link_ids) or (
+                    package_ids and link["packageUUID"] in package_ids
+                ):
+                    links.append(link)
+
+            # Moved packages get a new ID in the download list
+            new_package_ids = {}
+            for link in links:
+                old_package = self.device.packages[link["packageUUID"]]
+                if old_package["uuid"] not in new_package_ids:
+                    new_package = dict(old_package)
+                    new_package["uuid"] = self.device.new_id()
+                    new_package["where"] = "downloads"
+                    self.device.packages[new_package["uuid"]] = new_package
+                    new_package_ids[old_package["uuid"]] = new_package["uuid"]
+
+                link["packageUUID"] = new_package_ids[old_package["uuid"]]
+                link["where"] = "downloads"
+                self.device.start_download(link, now)
+
+            remove_empty_packages(self.device)
+
+        return True
+
+
+class FakeDownloads:
+
+    def __init__(
+        self,
+        device,
+    ):
+        """Fake download list, see FakeJDDevice
+
+        Args:
+            device (FakeJDDevice): Device this belongs to
+        """
+
+        self.device = device
+
+    def query_links(self, params):
+        """Query links in the download list
+
+        Args:
+            params (list): List containing a single LinkQuery
+        """
+
+        query = params[0]
+
+        with self.device.lock:
+            self.device.calls["downloads.query_links"] += 1
+            links = self.device.get_links(
+                "downloads",
+                package_ids=query.get("packageUUIDs", None),
+                job_ids=query.get("jobUUIDs", None),
+            )
+
+            response = []
+            for link in links:
+                link_status = {k: link[k] for k in DOWNLOAD_LINK_FIELDS}
+                for k, v in self.device.get_link_status(link).items():
+                    if query.get(k, False):
+                        link_status[k] = v
+                response.append(link_status)
+
+        return apply_limits(response, query)
+
+    def query_packages(self, params):
+        """Query packages in the download list
+
+        Args:
+            params (list): List containing a single PackageQuery
+        """
+
+        query = params[0]
+
+        with self.device.lock:
+            self.device.calls["downloads.query_packages"] += 1
+            packages = self.device.get_packages(
+                "downloads",
+                package_ids=query.get("packageUUIDs", None),
+            )
+
+            response = []
+            for package, links in packages:
+                link_statuses = [self.device.get_link_status(l) for l in links]
+
+                finished = all(l["finished"] for l in link_statuses)
+                running = any(l["running"] for l in link_statuses)
+                bytes_loaded = sum(l["bytesLoaded"] for l in link_statuses)
+                bytes_total = sum(l["bytesTotal"] for l in link_statuses)
+
+                package_status = {
+                    "childCount": len(links),
+                    "finished": finished,
+                    "running": running,
+                    "bytesLoaded": bytes_loaded,
+                    "bytesTotal": bytes_total,
+                    "speed": sum(l["speed"] for l in link_statuses),
+                    "eta": max(l["eta"] for l in link_statuses),
+                    "status": "Finished" if finished else "Downloading",
+                    "saveTo": package["folder"],
+                }
+
+                package_response = {k: package[k] for k in PACKAGE_FIELDS}
+                for k, v in package_status.items():
+                    if query.get(k, False):
+                        package_response[k] = v
+                response.append(package_response)
+
+        return apply_limits(response, query)
+
+    def remove_links(self, link_ids=None, package_ids=None):
+        """Remove links from the download list
+
+        Args:
+            link_ids (list): Link UUIDs to remove. Defaults to None
+            package_ids (list): Package UUIDs to remove. Defaults to None
+        """
+
+        with self.device.lock:
+            self.device.calls["downloads.remove_links"] += 1
+            remove_links(
+                self.device,
+                where="downloads",
+                link_ids=link_ids,
+                package_ids=package_ids,
+            )
+
+        return True
+
+    def cleanup(
+        self,
+        action,
+        mode,
+        selection_type,
+        link_ids=None,
+        package_ids=None,
+    ):
+        """Clean up links in the download list
+
+        Only removes links (no files are ever written). Supports the
+        DELETE_ALL and DELETE_FINISHED actions
+
+        Args:
+            action (str): Cleanup action
+            mode (str): Cleanup mode
+            selection_type (str): Selection type. SELECTED will use
+                the link and package IDs, ALL will use everything
+            link_ids (list): Link UUIDs to clean up. Defaults to None
+            package_ids (list): Package UUIDs to clean up. Defaults to None
+        """
+
+        with self.device.lock:
+            self.device.calls["downloads.cleanup"] += 1
+
+            if selection_type == "ALL":
+                links = self.device.get_links("downloads")
+            else:
+                links = []
+                for link in self.device.get_links("downloads"):
+                    if (link_ids and link["uuid"] in link_ids) or (
+                        package_ids and link["packageUUID"] in package_ids
+                    ):
+                        links.append(link)
+
+            if action == "DELETE_FINISHED":
+                links = [
+                    l for l in links if self.device.get_link_status(l)["finished"]
+                ]
+            elif action != "DELETE_ALL":
+                raise ValueError(f"Cleanup action {action} not supported")
+
+            remove_links(
+                self.device,
+                where="downloads",
+                link_ids=[l["uuid"] for l in links],
+            )
+
+        return True
+
+
+def remove_links(device, where, link_ids=None, package_ids=None):
+    """Remove links from a list on a fake device, and any packages left empty
+
+    Args:
+        device (FakeJDDevice): Device to remove links from
+        where (str): Either "linkgrabber" or "downloads"
+        link_ids (list): Link UUIDs to remove. Defaults to None
+        package_ids (list): Package UUIDs to remove. Defaults to None
+    """
+
+    for link in list(device.links.values()):
+        if link["where"] != where:
+            continue
+        if (link_ids and link["uuid"] in link_ids) or (
+            package_ids and link["packageUUID"] in package_ids
+        ):
+            device.links.pop(link["uuid"])
+
+    remove_empty_packages(device)
+
+    return True
+
+
+def remove_empty_packages(device):
+    """Remove any packages without links on a fake device
+
+    Args:
+        device (FakeJDDevice): Device to clean up
+    """
+
+    package_ids = set(l["packageUUID"] for l in device.links.values())
+    for package_id in list(device.packages.keys()):
+        if package_id not in package_ids:
+            device.packages.pop(package_id)
+
+    return True
+
+
+def apply_limits(response, query):
+    """Apply the startAt and maxResults limits from a query
+
+    Args:
+        response (list): Full query response
+        query (dict): Query
+    """
+
+    start_at = query.get("startAt", 0)
+    max_results = query.get("maxResults", -1)
+
+    response = response[start_at:]
+    if max_results >= 0:
+        response = response[:max_results]
+
+    return response
@@ -0,0 +1,53 @@
+import json
+import os
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Nothing the CLI needs before it's got something to do
+HEAVY_MODULES = [
+    "PySide6",
+    "myjdapi",
+    "lxml",
+    "bs4",
+    "numpy",
+]
+
+
+def get_imported(code, cwd=None):
+    """Run some code in a fresh interpreter, and get which heavy modules it imported"""
+
+    code = (
+        f"import json, sys\n"
+        f"{code}\n"
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    )
+
+    # Make sure we pick up this copy of the package, wherever we run from
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [REPO_DIR] + [p for p in env.get("PYTHONPATH", "").split(os.pathsep) if p]
+    )
+
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        cwd=cwd,
+        env=env,
+        check=True,
+    )
+
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_cli_import_is_lean():
+
+    assert get_imported("import nxbrew_dl.cli") == []
+
+
+def test_cli_without_config_is_lean(tmp_path):
+
+    code = "from nxbrew_dl.cli import run_cli\nassert run_cli([]) == 1"
+    assert get_imported(code, cwd=tmp_path) == []
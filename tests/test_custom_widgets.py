@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtCore import QPersistentModelIndex, Qt
+from PySide6.QtWidgets import QApplication
+
+from nxbrew_dl.gui.custom_widgets import GameTableModel, FLAG_CHECKED
+
+
+def get_game(name, has_dlc=False):
+    return {
+        "long_name": name,
+        "url": f"https://nxbrew.test/{name.lower()}/",
+        "has_nsp": True,
+        "has_xci": False,
+        "has_update": False,
+        "has_dlc": has_dlc,
+    }
+
+
+@pytest.fixture(scope="module")
+def app():
+    app = QApplication.instance()
+    if app is None:
+        app = QApplication([])
+    return app
+
+
+def test_apply_changes(app):
+
+    model = GameTableModel()
+    model.set_games(
+        [get_game(name) for name in ["Delta", "Alpha", "Echo", "Charlie"]],
+        checked_paths={"/echo"},
+    )
+    model.sort(0, Qt.SortOrder.AscendingOrder)
+    assert model.names == ["Alpha", "Charlie", "Delta", "Echo"]
+
+    # Something holding on to a row, like the selection
+    echo = QPersistentModelIndex(model.index(3, 0))
+
+    signals = {"reset": 0, "removed": [], "inserted": [], "changed": []}
+    model.modelReset.connect(lambda: signals.update(reset=signals["reset"] + 1))
+    model.rowsRemoved.connect(
+        lambda parent, first, last: signals["removed"].append((first, last))
+    )
+    model.rowsInserted.connect(
+        lambda parent, first, last: signals["inserted"].append((first, last))
+    )
+    model.dataChanged.connect(
+        lambda top_left, bottom_right, roles=None: signals["changed"].append(
+            top_left.row()
+        )
+    )
+
+    model.apply_changes(
+        added=[get_game("Bravo")],
+        removed=[get_game("Alpha")["url"], get_game("Charlie")["url"]],
+        changed=[get_game("Echo", has_dlc=True)],
+        checked_paths={"/bravo"},
+    )
+
+    # Only the rows that changed are touched, and the table stays sorted
+    assert signals["reset"] == 0
+    assert signals["removed"] == [(0, 1)]
+    assert signals["inserted"] == [(2, 2)]
+    assert signals["changed"] == [1]
+    assert model.names == ["Bravo", "Delta", "Echo"]
+
+    # Anything holding on to a row still points at the same game, and changed
+    # games keep whether they're checked
+    assert echo.row() == 2
+    assert model.data(model.index(2, 5)) == "Yes"
+    assert model.game_flags[2] & FLAG_CHECKED
+    assert model.get_checked_paths() == {"/bravo", "/echo"}
+
+    # Searching picks up the changes
+    assert model.search_index.search("alpha", fuzzy=False) == set()
+    assert model.search_index.search("bravo", fuzzy=False) == {"/bravo"}
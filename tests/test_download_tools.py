@@ -0,0 +1,82 @@
+import json
+import os
+
+import pytest
+
+import nxbrew_dl
+from nxbrew_dl.util import load_yml, parse_html, get_dl_dict
+from nxbrew_dl.util.download_tools import ReleaseScanner
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+# Each page has the get_dl_dict output from before the single-pass scanner
+GAME_PAGES = [
+    "single_release",
+    "multi_region",
+    "regionless",
+]
+
+
+@pytest.fixture
+def general_config():
+    return load_yml(
+        os.path.join(os.path.dirname(nxbrew_dl.__file__), "configs", "general.yml")
+    )
+
+
+def get_dl_kwargs(general_config):
+    return {
+        "dl_sites": general_config["dl_sites"],
+        "dl_mappings": general_config["dl_mappings"],
+        "regions": general_config["regions"],
+        "languages": general_config["languages"],
+        "regionless_titles": general_config["regionless_titles"],
+        "implied_languages": general_config["implied_languages"],
+    }
+
+
+@pytest.mark.parametrize("page", GAME_PAGES)
+def test_get_dl_dict(general_config, page):
+
+    with open(os.path.join(DATA_DIR, f"{page}.html"), "rb") as f:
+        content = f.read()
+    with open(os.path.join(DATA_DIR, f"{page}.json"), "r", encoding="utf-8") as f:
+        expected = json.load(f)
+
+    soup = parse_html(content, parser=general_config["html_parser"])
+    dl_dict = get_dl_dict(soup, **get_dl_kwargs(general_config))
+
+    assert dl_dict == expected
+
+
+def test_scan_to_end_of_page(general_config):
+
+    # Links right up to the end of the page, with nothing after them
+    scanner = ReleaseScanner(**get_dl_kwargs(general_config))
+    dl_dict = scanner.scan(
+        [
+            ("Base Game NSP (Size: 1 GB)", []),
+            ("1Fichier: Download", [("Download", "https://1fichier.test/?base")]),
+        ]
+    )
+
+    assert dl_dict == {
+        "release_1": {
+            "regions": ["All"],
+            "languages": ["All"],
+            "base_game_nsp": [
+                {
+                    "full_name": "Base Game NSP (Size: 1 GB)",
+                    "1Fichier": ["https://1fichier.test/?base"],
+                }
+            ],
+        }
+    }
+
+
+def test_no_download_links(general_config):
+
+    soup = parse_html(b"<html><body><p>Nothing here</p></body></html>")
+
+    with pytest.raises(ValueError):
+        get_dl_dict(soup, **get_dl_kwargs(general_config))
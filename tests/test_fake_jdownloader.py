@@ -0,0 +1,179 @@
+from fake_jdownloader import FakeJDDevice
+
+LINK_SIZE = 100
+
+
+class Clock:
+
+    def __init__(self):
+        """Clock that only moves when told to"""
+
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def get_jd_device(clock, grab_delay=1, **kwargs):
+    return FakeJDDevice(
+        download_time=10,
+        extraction_time=5,
+        grab_delay=grab_delay,
+        link_size=LINK_SIZE,
+        clock=clock,
+        **kwargs,
+    )
+
+
+def add_links(jd_device, links, package_name="Game"):
+    return jd_device.linkgrabber.add_links(
+        [
+            {
+                "autostart": False,
+                "links": "\n".join(links),
+                "destinationFolder": "downloads",
+                "packageName": package_name,
+            }
+        ]
+    )
+
+
+def query_linkgrabber(jd_device, job_id):
+    links = jd_device.linkgrabber.query_links(
+        [{"jobUUIDs": [job_id], "availability": True, "maxResults": -1, "startAt": 0}]
+    )
+    packages = jd_device.linkgrabber.query_packages(
+        [{"childCount": True, "maxResults": -1, "startAt": 0}]
+    )
+
+    return links, packages
+
+
+def query_downloads(jd_device):
+    return jd_device.downloads.query_links(
+        [
+            {
+                "bytesLoaded": True,
+                "finished": True,
+                "extractionStatus": True,
+                "maxResults": -1,
+                "startAt": 0,
+            }
+        ]
+    )
+
+
+def test_links_grabbed():
+    clock = Clock()
+    jd_device = get_jd_device(clock, offline_links=["dead"])
+
+    response = add_links(
+        jd_device,
+        ["https://site-a.test/1", "https://dead.test/2"],
+    )
+
+    # Links show up one at a time
+    links, packages = query_linkgrabber(jd_device, response["id"])
+    assert links == []
+    assert packages == []
+
+    clock.now = 1
+    links, packages = query_linkgrabber(jd_device, response["id"])
+    assert [l["availability"] for l in links] == ["ONLINE"]
+    assert [(p["name"], p["childCount"]) for p in packages] == [("Game", 1)]
+
+    clock.now = 2
+    links, packages = query_linkgrabber(jd_device, response["id"])
+    assert [l["availability"] for l in links] == ["ONLINE", "OFFLINE"]
+    assert [(p["name"], p["childCount"]) for p in packages] == [("Game", 2)]
+
+    # Removing every link takes the package with it
+    jd_device.linkgrabber.remove_links(package_ids=[packages[0]["uuid"]])
+    links, packages = query_linkgrabber(jd_device, response["id"])
+    assert links == []
+    assert packages == []
+
+    assert jd_device.calls["linkgrabber.add_links"] == 1
+    assert jd_device.calls["linkgrabber.query_links"] == 4
+
+
+def test_download_and_extract():
+    clock = Clock()
+    jd_device = get_jd_device(clock, max_downloads=1)
+
+    response = add_links(jd_device, ["https://site-a.test/1", "https://site-a.test/2"])
+    clock.now = 2
+    links, packages = query_linkgrabber(jd_device, response["id"])
+
+    jd_device.linkgrabber.move_to_downloadlist(
+        link_ids=[l["uuid"] for l in links],
+        package_ids=[packages[0]["uuid"]],
+    )
+
+    # The package gets a new ID in the download list
+    download_packages = jd_device.downloads.query_packages(
+        [{"maxResults": -1, "startAt": 0}]
+    )
+    assert [p["name"] for p in download_packages] == ["Game"]
+    assert download_packages[0]["uuid"] != packages[0]["uuid"]
+
+    # Only one link downloads at a time
+    clock.now = 7
+    statuses = query_downloads(jd_device)
+    assert [l["bytesLoaded"] for l in statuses] == [LINK_SIZE // 2, 0]
+
+    clock.now = 12
+    statuses = query_downloads(jd_device)
+    assert [l["finished"] for l in statuses] == [True, False]
+    assert statuses[0]["extractionStatus"] == "RUNNING"
+    assert "extractionStatus" not in statuses[1]
+
+    clock.now = 27
+    statuses = query_downloads(jd_device)
+    assert [l["extractionStatus"] for l in statuses] == ["SUCCESSFUL", "SUCCESSFUL"]
+
+    jd_device.downloads.cleanup(
+        action="DELETE_FINISHED",
+        mode="REMOVE_LINKS_ONLY",
+        selection_type="SELECTED",
+        package_ids=[download_packages[0]["uuid"]],
+    )
+    assert query_downloads(jd_device) == []
+    assert jd_device.packages == {}
+
+
+def test_stalled_link():
+    clock = Clock()
+    jd_device = get_jd_device(clock, max_downloads=1, stalled_links=["stuck"])
+
+    response = add_links(jd_device, ["https://stuck.test/1", "https://site-a.test/2"])
+    clock.now = 2
+    links, packages = query_linkgrabber(jd_device, response["id"])
+    jd_device.linkgrabber.move_to_downloadlist(package_ids=[packages[0]["uuid"]])
+
+    # The stalled link never finishes, but doesn't hold up the other one
+    clock.now = 1000
+    statuses = query_downloads(jd_device)
+    assert [(l["bytesLoaded"], l["finished"]) for l in statuses] == [
+        (0, False),
+        (LINK_SIZE, True),
+    ]
+
+    # Finished cleanups leave the stalled link in place
+    jd_device.downloads.cleanup(
+        action="DELETE_FINISHED",
+        mode="REMOVE_LINKS_ONLY",
+        selection_type="ALL",
+    )
+    assert len(query_downloads(jd_device)) == 1
+
+
+def test_query_limits():
+    clock = Clock()
+    jd_device = get_jd_device(clock, grab_delay=0)
+
+    for i in range(5):
+        add_links(jd_device, [f"https://site-a.test/{i}"], package_name=f"Game {i}")
+
+    packages = jd_device.linkgrabber.query_packages([{"startAt": 1, "maxResults": 2}])
+    assert [p["name"] for p in packages] == ["Game 1", "Game 2"]
@@ -0,0 +1,138 @@
+import os
+
+import pytest
+
+import nxbrew_dl
+import nxbrew_dl.util.html_tools as html_tools
+from nxbrew_dl.util import (
+    load_yml,
+    parse_html,
+    get_dl_dict,
+    get_languages,
+    get_thumb_url,
+    iter_game_index,
+)
+
+HTML_PARSERS = html_tools.HTML_PARSERS
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+GAME_PAGES = [
+    "single_release.html",
+    "multi_region.html",
+    "regionless.html",
+]
+
+
+def load_config(name):
+    return load_yml(
+        os.path.join(os.path.dirname(nxbrew_dl.__file__), "configs", f"{name}.yml")
+    )
+
+
+def load_page(name):
+    with open(os.path.join(DATA_DIR, name), "rb") as f:
+        content = f.read()
+    return content
+
+
+def parse_game_page(content, parser, general_config):
+    """Parse a game page in the same way as NXBrew"""
+
+    soup = parse_html(content, parser=parser)
+
+    return (
+        get_languages(soup, general_config["languages"]),
+        get_thumb_url(soup),
+        get_dl_dict(
+            soup,
+            dl_sites=general_config["dl_sites"],
+            dl_mappings=general_config["dl_mappings"],
+            regions=general_config["regions"],
+            languages=general_config["languages"],
+            regionless_titles=general_config["regionless_titles"],
+            implied_languages=general_config["implied_languages"],
+        ),
+    )
+
+
+class FakeResponse:
+
+    def __init__(self, content):
+        """Stands in for a streamed response for the game index"""
+
+        self.content = content
+        self.headers = {"content-type": "text/html"}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+    def iter_content(self, chunk_size=1):
+
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i : i + chunk_size]
+
+
+@pytest.mark.parametrize("page", GAME_PAGES)
+def test_game_page_parsers_match(page):
+
+    general_config = load_config("general")
+    content = load_page(page)
+
+    parsed = {
+        parser: parse_game_page(content, parser, general_config)
+        for parser in HTML_PARSERS
+    }
+
+    # Make sure we're actually comparing something
+    langs, thumb_url, dl_dict = parsed["html.parser"]
+    assert len(langs) > 0
+    assert len(dl_dict) > 0
+
+    for parser in HTML_PARSERS:
+        assert parsed[parser] == parsed["html.parser"], parser
+
+
+def test_game_index_parsers_match(monkeypatch):
+
+    general_config = load_config("general")
+    regex_config = load_config("regex")
+    content = load_page("game_index.html")
+
+    monkeypatch.setattr(
+        html_tools,
+        "get_html_content",
+        lambda url, cache=False, cache_dir=None: content,
+    )
+
+    game_dicts = {}
+    for parser in HTML_PARSERS:
+        game_dicts[parser] = html_tools.get_game_dict(
+            general_config=dict(general_config, html_parser=parser),
+            regex_config=regex_config,
+            nxbrew_url="https://nxbrew.test/",
+        )
+
+    # Everything in the index bar the forbidden title, and nothing from outside it
+    game_dict = game_dicts["html.parser"]
+    assert len(game_dict) == 11
+    assert "https://nxbrew.test/latest-raw-game-updates/" not in game_dict
+    assert "https://nxbrew.test/dmca/" not in game_dict
+
+    for parser in HTML_PARSERS:
+        assert game_dicts[parser] == game_dict, parser
+
+    # Streaming the index, in small chunks, gives the same games in the same order
+    games = list(
+        iter_game_index(
+            general_config=general_config,
+            regex_config=regex_config,
+            nxbrew_url="https://nxbrew.test/",
+            chunk_size=64,
+            response=FakeResponse(content),
+        )
+    )
+    assert games == list(game_dict.values())
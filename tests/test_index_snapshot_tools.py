@@ -0,0 +1,86 @@
+import struct
+
+import pytest
+
+from nxbrew_dl.util import IndexSnapshot, save_index_snapshot
+from nxbrew_dl.util.index_snapshot_tools import SNAPSHOT_HEADER
+
+
+def get_game_dict(n_games=3):
+    game_dict = {}
+    for i in range(n_games):
+        url = f"https://nxbrew.test/game-{i}/"
+        game_dict[url] = {
+            "long_name": f"Game {i} Switch NSP + Update",
+            "short_name": f"Game {i}",
+            "url": url,
+            "has_nsp": True,
+            "has_xci": i % 2 == 0,
+            "has_update": True,
+            "has_dlc": False,
+        }
+    return game_dict
+
+
+@pytest.fixture
+def snapshot_file(tmp_path):
+    snapshot_file = str(tmp_path / "game_index.snapshot")
+    save_index_snapshot(
+        get_game_dict(),
+        snapshot_file,
+        index_hash="index",
+        config_hash="config",
+    )
+    return snapshot_file
+
+
+def get_string_table_start():
+    """Where the string offsets start, and how many strings there are"""
+
+    # Two hashes, then long and short names and the URL for each game
+    n_strings = 2 + 3 * 3
+
+    return SNAPSHOT_HEADER.size, n_strings
+
+
+def patch_file(snapshot_file, offset, data):
+    with open(snapshot_file, "r+b") as f:
+        f.seek(offset)
+        f.write(data)
+
+
+def test_round_trip(snapshot_file):
+    with IndexSnapshot(snapshot_file) as snapshot:
+        assert snapshot.get_game_dict() == get_game_dict()
+        assert list(snapshot) == list(get_game_dict().values())
+        assert snapshot.index_hash == "index"
+        assert snapshot.config_hash == "config"
+
+
+def test_bad_string_id(snapshot_file):
+    start, n_strings = get_string_table_start()
+
+    # Point the first game's name past the end of the string table
+    game_strings_start = start + 4 * (n_strings + 1)
+    patch_file(snapshot_file, game_strings_start, struct.pack("<I", n_strings + 10))
+
+    with pytest.raises(ValueError):
+        IndexSnapshot(snapshot_file)
+
+
+def test_bad_offsets(snapshot_file):
+    start, n_strings = get_string_table_start()
+
+    # Make the offsets go backwards, without changing the total length
+    patch_file(snapshot_file, start + 4, struct.pack("<I", 10**6))
+
+    with pytest.raises(ValueError):
+        IndexSnapshot(snapshot_file)
+
+
+def test_truncated(snapshot_file):
+    with open(snapshot_file, "r+b") as f:
+        f.truncate(SNAPSHOT_HEADER.size + 10)
+
+    with pytest.raises(ValueError):
+        IndexSnapshot(snapshot_file)
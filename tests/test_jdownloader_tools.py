@@ -0,0 +1,227 @@
+import pytest
+
+from nxbrew_dl.util import JDScheduler, NXBrewLogger
+from nxbrew_dl.util import jdownloader_tools
+
+from fake_jdownloader import FakeJDDevice
+
+GENERAL_CONFIG = {
+    "dl_sites": ["SiteA", "SiteB"],
+    "dl_sites_no_jdownload": [],
+}
+
+POLL_CONFIG = {
+    "min_interval": 0.01,
+    "max_interval": 0.05,
+    "extract_interval": 0.01,
+    "grab_timeout": 10,
+    "stall_timeout": 10,
+    "settle_time": 0,
+    "find_polls": 3,
+}
+
+
+@pytest.fixture
+def logger(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return NXBrewLogger(log_level="DEBUG")
+
+
+def get_scheduler(jd_device, logger, poll_config=None):
+    if poll_config is None:
+        poll_config = POLL_CONFIG
+
+    return JDScheduler(
+        jd_device=jd_device,
+        general_config=GENERAL_CONFIG,
+        logger=logger,
+        poll_config=poll_config,
+    )
+
+
+def run_package(jd_device, logger, dl_dict, poll_config=None):
+    """Push a single package through the scheduler, returning it and any completions"""
+
+    scheduler = get_scheduler(jd_device, logger, poll_config=poll_config)
+
+    completed = []
+    package = scheduler.submit(
+        package_name="Game",
+        dl_dict=dl_dict,
+        out_dir="downloads",
+        on_complete=lambda: completed.append("Game"),
+    )
+    scheduler.wait_all()
+
+    return scheduler, package, completed
+
+
+def test_package_downloaded(logger):
+    jd_device = FakeJDDevice(download_time=0.01, extraction_time=0.01, grab_delay=0)
+
+    scheduler, package, completed = run_package(
+        jd_device,
+        logger,
+        {"full_name": "Base Game", "SiteA": ["https://site-a.test/1"]},
+    )
+
+    assert completed == ["Game"]
+    assert package.state == "done"
+    assert scheduler.failed_packages == []
+
+
+def test_falls_back_to_next_site(logger):
+    jd_device = FakeJDDevice(
+        download_time=0.01,
+        extraction_time=0.01,
+        grab_delay=0,
+        offline_links=["site-a"],
+    )
+
+    scheduler, package, completed = run_package(
+        jd_device,
+        logger,
+        {
+            "full_name": "Base Game",
+            "SiteA": ["https://site-a.test/1"],
+            "SiteB": ["https://site-b.test/1"],
+        },
+    )
+
+    assert completed == ["Game"]
+    assert package.dl_site == "SiteB"
+
+
+def test_all_links_offline(logger):
+    jd_device = FakeJDDevice(
+        download_time=0.01,
+        extraction_time=0.01,
+        grab_delay=0,
+        offline_links=["dead"],
+    )
+
+    scheduler, package, completed = run_package(
+        jd_device,
+        logger,
+        {
+            "full_name": "Base Game",
+            "SiteA": ["https://dead.test/1"],
+            "SiteB": ["https://dead.test/2"],
+        },
+    )
+
+    # Nothing was downloaded, so nothing should be told it was
+    assert completed == []
+    assert package.state == "failed"
+    assert scheduler.failed_packages == [package]
+    assert scheduler.packages == []
+
+
+def test_failed_not_stuck(logger):
+    jd_device = FakeJDDevice(
+        download_time=0.01,
+        extraction_time=0.01,
+        grab_delay=0,
+        offline_links=["dead"],
+    )
+
+    # The package is failed while grabbing links, but past any stall deadline
+    scheduler, package, completed = run_package(
+        jd_device,
+        logger,
+        {"full_name": "Base Game", "SiteA": ["https://dead.test/1"]},
+        poll_config=dict(POLL_CONFIG, stall_timeout=0),
+    )
+
+    assert package.state == "failed"
+    assert scheduler.failed_packages == [package]
+    assert scheduler.stuck_packages == []
+
+
+def hide_download_packages(jd_device, n_queries):
+    """Have the download list look empty for the first few queries"""
+
+    query_packages = jd_device.downloads.query_packages
+    queries = []
+
+    def delayed_query_packages(params):
+        queries.append(params)
+        if len(queries) <= n_queries:
+            return []
+        return query_packages(params)
+
+    jd_device.downloads.query_packages = delayed_query_packages
+
+    return queries
+
+
+def test_found_after_move_delay(logger):
+    jd_device = FakeJDDevice(download_time=0.01, extraction_time=0.01, grab_delay=0)
+    hide_download_packages(jd_device, n_queries=POLL_CONFIG["find_polls"] - 1)
+
+    scheduler, package, completed = run_package(
+        jd_device,
+        logger,
+        {"full_name": "Base Game", "SiteA": ["https://site-a.test/1"]},
+    )
+
+    assert completed == ["Game"]
+    assert scheduler.failed_packages == []
+
+
+def test_never_found_after_move(logger):
+    jd_device = FakeJDDevice(download_time=0.01, extraction_time=0.01, grab_delay=0)
+    queries = hide_download_packages(jd_device, n_queries=100)
+
+    scheduler, package, completed = run_package(
+        jd_device,
+        logger,
+        {"full_name": "Base Game", "SiteA": ["https://site-a.test/1"]},
+    )
+
+    assert completed == []
+    assert scheduler.failed_packages == [package]
+    assert len(queries) == POLL_CONFIG["find_polls"]
+
+
+def test_bypass_error_only_fails_package(logger, monkeypatch):
+    def bypass_ouo(url, logger=None):
+        raise ValueError("Max retries exceeded!")
+
+    monkeypatch.setattr(jdownloader_tools, "bypass_ouo", bypass_ouo)
+
+    jd_device = FakeJDDevice(
+        download_time=0.05,
+        extraction_time=0.01,
+        grab_delay=0,
+        offline_links=["dead"],
+    )
+    scheduler = get_scheduler(jd_device, logger)
+
+    dl_dicts = {
+        "Good": {"full_name": "Good", "SiteA": ["https://site-a.test/1"]},
+        # Fails while being submitted
+        "Bad": {"full_name": "Bad", "SiteA": ["https://ouo.test/1"]},
+        # Fails during a poll, when falling back to the next site
+        "Fallback": {
+            "full_name": "Fallback",
+            "SiteA": ["https://dead.test/1"],
+            "SiteB": ["https://ouo.test/2"],
+        },
+    }
+
+    completed = []
+    packages = {}
+    for name, dl_dict in dl_dicts.items():
+        packages[name] = scheduler.submit(
+            package_name=name,
+            dl_dict=dl_dict,
+            out_dir="downloads",
+            on_complete=lambda name=name: completed.append(name),
+        )
+    scheduler.wait_all()
+
+    assert completed == ["Good"]
+    assert scheduler.failed_packages == [packages["Bad"], packages["Fallback"]]
+    assert packages["Fallback"].dl_site == "SiteB"
+    assert scheduler.stuck_packages == []
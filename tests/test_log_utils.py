@@ -0,0 +1,44 @@
+import logging
+
+from nxbrew_dl.util.log_utils import RedactingFilter
+
+
+def get_record(msg, *args):
+    return logging.LogRecord("test", logging.INFO, __file__, 0, msg, args, None)
+
+
+def test_redact():
+
+    redact_filter = RedactingFilter(mask="[REDACTED]")
+    redact_filter.add("https://example.test/a")
+    redact_filter.add("https://example.test/a/b")
+
+    # The longer string is masked in full, rather than leaving part of it behind
+    record = get_record(
+        "Links: %s, %s",
+        "https://example.test/a/b",
+        "https://example.test/a",
+    )
+    redact_filter.filter(record)
+    assert record.getMessage() == "Links: [REDACTED], [REDACTED]"
+
+    record = get_record("Nothing to see here")
+    redact_filter.filter(record)
+    assert record.getMessage() == "Nothing to see here"
+
+
+def test_add_swaps_list():
+
+    redact_filter = RedactingFilter()
+    assert redact_filter.add("secret")
+
+    # Anything already looping over the strings keeps a complete list
+    strings = redact_filter.strings
+    assert redact_filter.add("another secret")
+    assert strings == ["secret"]
+    assert redact_filter.strings == ["another secret", "secret"]
+
+    # Each string is only kept once
+    assert not redact_filter.add("secret")
+    assert not redact_filter.add("")
+    assert redact_filter.strings == ["another secret", "secret"]
@@ -0,0 +1,143 @@
+import copy
+import os
+
+import pytest
+
+import nxbrew_dl
+from nxbrew_dl.nxbrew_dl import NXBrew
+from nxbrew_dl.util import NXBrewLogger, UserCache, load_yml
+
+from fake_jdownloader import FakeJDDevice
+
+URL = "https://nxbrew.test/game/"
+NAME = "Game"
+
+# Thumbnail URL, languages and releases, as from parse_game_page
+GAME_PAGE = (
+    "https://nxbrew.test/thumb.png",
+    ["English"],
+    {
+        "release_0": {
+            "regions": ["USA"],
+            "languages": ["English"],
+            "base_game_nsp": [
+                {
+                    "full_name": "Base Game",
+                    "1Fichier": ["https://1fichier.test/1"],
+                }
+            ],
+        }
+    },
+)
+
+
+@pytest.fixture
+def user_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    # Serve up the same game page every time
+    monkeypatch.setattr(
+        NXBrew,
+        "parse_game_page",
+        lambda self, url, logger=None: copy.deepcopy(GAME_PAGE),
+    )
+
+    user_cache = UserCache()
+    user_cache.update(URL, lambda entry: {"name": NAME})
+
+    yield user_cache
+
+    user_cache.close()
+
+
+def get_nxbrew(user_cache, jd_device=None, **kwargs):
+    """Set up NXBrew for the test game, with any user config overridden"""
+
+    general_config = load_yml(
+        os.path.join(os.path.dirname(nxbrew_dl.__file__), "configs", "general.yml")
+    )
+    general_config["jd_polling"] = {
+        "min_interval": 0.01,
+        "max_interval": 0.05,
+        "extract_interval": 0.01,
+        "settle_time": 0,
+    }
+
+    user_config = {
+        "download_dir": "downloads",
+        "regions": ["USA"],
+        "languages": ["English"],
+        "prefer_filetype": "NSP",
+        "download_update": True,
+        "download_dlc": True,
+        "dry_run": False,
+    }
+    user_config.update(copy.deepcopy(kwargs))
+
+    return NXBrew(
+        to_download={NAME: URL},
+        general_config=general_config,
+        user_config=user_config,
+        user_cache=user_cache,
+        logger=NXBrewLogger(log_level="DEBUG"),
+        jd_device=jd_device,
+    )
+
+
+def get_jd_device(**kwargs):
+    return FakeJDDevice(
+        download_time=0.01,
+        extraction_time=0.01,
+        grab_delay=0,
+        **kwargs,
+    )
+
+
+@pytest.mark.parametrize(
+    "unsuitable",
+    [
+        {"languages": ["Japanese"]},
+        {"regions": ["Japan"]},
+    ],
+)
+def test_prefs_change_invalidates_nothing_suitable(user_cache, unsuitable):
+
+    # Nothing suitable, so we remember that until something changes
+    nx = get_nxbrew(user_cache, **unsuitable)
+    assert nx.resolve_game(URL) is None
+    fingerprint = user_cache.get(URL)["fingerprint"]
+
+    # Same preferences, same fingerprint, so it'll be skipped
+    nx = get_nxbrew(user_cache, **unsuitable)
+    thumb_url, langs, dl_dict = GAME_PAGE
+    assert nx.get_fingerprint(langs, dl_dict) == fingerprint
+
+    # Once the preferences change, the game gets looked at again
+    nx = get_nxbrew(user_cache)
+    resolved = nx.resolve_game(URL)
+    assert resolved is not None
+    assert resolved[2] != fingerprint
+
+
+def test_failed_download_not_fingerprinted(user_cache):
+
+    # Every link is offline, so nothing gets downloaded
+    nx = get_nxbrew(user_cache, jd_device=get_jd_device(offline_links=["1fichier"]))
+    assert nx.run() == [NAME]
+
+    entry = user_cache.get(URL)
+    assert "fingerprint" not in entry
+    assert entry.get("base_game_nsp", []) == []
+
+    # So next time, it's tried again
+    nx = get_nxbrew(user_cache, jd_device=get_jd_device())
+    assert nx.run() == []
+
+    entry = user_cache.get(URL)
+    assert entry["base_game_nsp"] == ["Base Game"]
+    assert "fingerprint" in entry
+
+    # And now it's downloaded, it's skipped without touching JDownloader
+    nx = get_nxbrew(user_cache)
+    nx.run()
+    assert nx.jd_scheduler is None
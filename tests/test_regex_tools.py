@@ -0,0 +1,144 @@
+import os
+import re
+
+import pytest
+
+import nxbrew_dl
+from nxbrew_dl.util import load_yml, parse_html
+from nxbrew_dl.util.download_tools import get_dl_paragraphs
+from nxbrew_dl.util.regex_tools import (
+    LanguageMatcher,
+    RegionMatcher,
+    get_language_matcher,
+    get_region_matcher,
+)
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+# Strings as they turn up on game pages, in release titles and language lines
+LANGUAGE_STRINGS = [
+    "English, Japanese",
+    "En,Fr-CA,Es-XL",
+    "En,Fr,De,It,Es",
+    "Zh-Hant, Ko",
+    "Zh-Hans,Zh-Hant,Ja,Ko",
+    "English, French, German, Italian, Spanish, Japanese, Chinese, Korean",
+    "English, Chinese (Simplified), Chinese (Traditional), Korean",
+    "En-GB, Fr-FR, Es-ES, Pt-BR, Pt-PT",
+    "Es-MX, Es-XL, Es",
+    "Ja",
+    "JP",
+    "EN",
+    "Multi-Language",
+    "",
+    "Eng, Fre, Ger",
+    "Nl, Ru, Pl, Sv, No, Da, Fi, Cs, Hu, Tr, El, Ar, He, Th, Uk",
+]
+
+REGION_STRINGS = [
+    "USA [En,Fr-CA,Es-XL]",
+    "Europe [En,Fr,De,It,Es]",
+    "EUR",
+    "Japan",
+    "JPN",
+    "Asia [Zh-Hant, Ko]",
+    "USA/EUR",
+    "UAS",
+    "Korea [Ko]",
+    "Hong Kong, Taiwan",
+    "Chinese Taiwan",
+    "usa",
+    "Full Game",
+    "Base Game NSP (Size: 5 GB)",
+    "Update v1.0.2 (Size: 150 MB)",
+    "",
+]
+
+
+def old_parse_languages(f, lang_dict):
+    """The original per-language loop"""
+
+    long_langs = list(lang_dict.keys())
+    short_langs = [lang_dict[l] for l in long_langs]
+
+    langs = []
+    for fs in f.split(","):
+        fs = fs.strip()
+        for i, short_lang in enumerate(short_langs):
+            if re.match(short_lang, fs):
+                langs.append(long_langs[i])
+                continue
+            if re.match(long_langs[i], fs):
+                langs.append(long_langs[i])
+
+    return langs
+
+
+def old_parse_regions(t, regions):
+    """The original per-region loop"""
+
+    return [region for region in regions if region.lower() in t.lower()]
+
+
+@pytest.fixture
+def general_config():
+    return load_yml(
+        os.path.join(os.path.dirname(nxbrew_dl.__file__), "configs", "general.yml")
+    )
+
+
+@pytest.fixture
+def page_strings():
+    """Every paragraph in the download links of the saved game pages"""
+
+    strings = []
+    for page in ["single_release", "multi_region", "regionless"]:
+        with open(os.path.join(DATA_DIR, f"{page}.html"), "rb") as f:
+            soup = parse_html(f.read())
+        strings.extend([text for text, links in get_dl_paragraphs(soup)])
+
+    return strings
+
+
+def test_language_matcher(general_config, page_strings):
+
+    lang_dict = general_config["languages"]
+    matcher = get_language_matcher(lang_dict)
+
+    # Anything in square brackets on the pages, too
+    strings = list(LANGUAGE_STRINGS)
+    for page_string in page_strings:
+        strings.extend(re.findall(r"\[(.*?)\]", page_string))
+
+    for string in strings:
+        assert matcher.parse(string) == old_parse_languages(string, lang_dict), string
+
+    # Memoizing shouldn't change anything
+    unmemoized = LanguageMatcher(lang_dict, memo_size=0)
+    for string in strings:
+        assert unmemoized.parse(string) == matcher.parse(string), string
+
+
+def test_region_matcher(general_config, page_strings):
+
+    regions = list(general_config["regions"])
+    matcher = get_region_matcher(regions)
+
+    unmemoized = RegionMatcher(regions, memo_size=0)
+    for string in REGION_STRINGS + page_strings:
+        assert matcher.parse(string) == old_parse_regions(string, regions), string
+        assert unmemoized.parse(string) == matcher.parse(string), string
+
+
+def test_matcher_results_are_copies(general_config):
+
+    # Releases add to the languages they get back, which mustn't leak into the memo
+    matcher = get_language_matcher(general_config["languages"])
+    langs = matcher.parse("En, Ja")
+    langs.append("Korean")
+    assert matcher.parse("En, Ja") == ["English", "Japanese"]
+
+    matcher = get_region_matcher(list(general_config["regions"]))
+    regions = matcher.parse("USA/Europe")
+    regions.append("Japan")
+    assert matcher.parse("USA/Europe") == ["USA", "Europe"]
@@ -0,0 +1,111 @@
+import copy
+import os
+
+import pytest
+
+import nxbrew_dl
+from nxbrew_dl.nxbrew_dl import NXBrew, SyncDaemon
+from nxbrew_dl.util import (
+    NXBrewLogger,
+    UserCache,
+    get_url_path,
+    load_yml,
+)
+
+from fake_jdownloader import FakeJDDevice
+
+URL = "https://nxbrew.test/game/"
+NAME = "Game"
+
+GAME_PAGE = (
+    "https://nxbrew.test/thumb.png",
+    ["English"],
+    {
+        "release_0": {
+            "regions": ["USA"],
+            "languages": ["English"],
+            "base_game_nsp": [
+                {
+                    "full_name": "Base Game",
+                    "1Fichier": ["https://1fichier.test/1"],
+                }
+            ],
+        }
+    },
+)
+
+
+@pytest.fixture
+def user_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    monkeypatch.setattr(
+        NXBrew,
+        "parse_game_page",
+        lambda self, url, logger=None: copy.deepcopy(GAME_PAGE),
+    )
+
+    user_cache = UserCache()
+    user_cache.update(URL, lambda entry: {"name": NAME})
+
+    yield user_cache
+
+    user_cache.close()
+
+
+def get_daemon(user_cache, jd_device):
+    """Set up a daemon that always sees the test game, with the same page"""
+
+    general_config = load_yml(
+        os.path.join(os.path.dirname(nxbrew_dl.__file__), "configs", "general.yml")
+    )
+    general_config["jd_polling"] = {
+        "min_interval": 0.01,
+        "max_interval": 0.05,
+        "extract_interval": 0.01,
+        "settle_time": 0,
+    }
+
+    user_config = {
+        "download_dir": "downloads",
+        "regions": ["USA"],
+        "languages": ["English"],
+        "prefer_filetype": "NSP",
+        "download_update": True,
+        "download_dlc": True,
+        "dry_run": False,
+    }
+
+    daemon = SyncDaemon(
+        general_config=general_config,
+        user_config=user_config,
+        user_cache=user_cache,
+        logger=NXBrewLogger(log_level="DEBUG"),
+        jd_device=jd_device,
+    )
+    daemon.index_trusted = True
+    daemon.get_selected_games = lambda: {NAME: URL}
+    daemon.check_pages = lambda to_download: ({get_url_path(URL): "page"}, {})
+
+    return daemon
+
+
+def test_failed_game_checked_again(user_cache):
+
+    jd_device = FakeJDDevice(
+        download_time=0.01,
+        extraction_time=0.01,
+        grab_delay=0,
+        offline_links=["1fichier"],
+    )
+    daemon = get_daemon(user_cache, jd_device)
+
+    # The download fails, so even though the page hasn't changed it's tried again
+    assert daemon.sync() == 1
+    assert daemon.sync() == 1
+
+    # Once it's downloaded, an unchanged page is left alone
+    jd_device.offline_links = []
+    assert daemon.sync() == 1
+    assert user_cache.get(URL)["base_game_nsp"] == ["Base Game"]
+    assert daemon.sync() == 0
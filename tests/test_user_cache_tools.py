@@ -0,0 +1,32 @@
+from nxbrew_dl.util import UserCache
+
+URL = "https://nxbrew.test/game/"
+
+
+def get_user_cache(tmp_path):
+    return UserCache(
+        db_file=str(tmp_path / "cache.db"),
+        json_file=str(tmp_path / "cache.json"),
+    )
+
+
+def test_add_download(tmp_path):
+    user_cache = get_user_cache(tmp_path)
+    user_cache.put(URL, {"name": "Game"})
+
+    user_cache.add_download(URL, "base_game_nsp", "Game [NSP]")
+    user_cache.add_download(URL, "base_game_nsp", "Game [NSP]")
+
+    assert user_cache.get(URL) == {"name": "Game", "base_game_nsp": ["Game [NSP]"]}
+
+
+def test_add_download_removed_game(tmp_path):
+    user_cache = get_user_cache(tmp_path)
+    user_cache.put(URL, {"name": "Game"})
+
+    # The game can go away while it's downloading
+    user_cache.remove(URL)
+
+    assert user_cache.add_download(URL, "base_game_nsp", "Game [NSP]") is None
+    assert URL not in user_cache
+    assert len(user_cache) == 0